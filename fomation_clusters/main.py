@@ -14,7 +14,8 @@ if __name__ == '__main__':
 
     print('Loading Match...')
     df = load_data(path)
-    breaks = df['time'][(df['time'] - df['time'].shift()) > datetime.timedelta(0, 0, 40000)]
+    # the first frame of every period after the kick-off
+    breaks = df['time'].iloc[[period['first_frame'] for period in df.attrs['periods'][1:]]]
 
     # flip player coordinates at halftime, make players play in the same direction
     df_players = correct_player_cordinates(df, breaks)
@@ -32,10 +33,11 @@ if __name__ == '__main__':
 
     windows_formations = {key: list(map(window_to_formation, windows_coords[key])) 
                             for key in windows_coords.keys()}
-    dist_matrices = {key: compute_distance_matrix_extended(windows_formations[key])[0] 
-                        for key in windows_formations.keys()} # index 0 is the distance matrix
-    dict_rowcols = {key: compute_distance_matrix_extended(windows_formations[key])[2]
+    # distances, scale factors & assignments of all pairs of windows in one call per key
+    distance_results = {key: compute_distance_matrix_extended(windows_formations[key], processes=None)
                         for key in windows_formations.keys()}
+    dist_matrices = {key: result[0] for key, result in distance_results.items()} # index 0 is the distance matrix
+    dict_rowcols = {key: result[2] for key, result in distance_results.items()}
 
     print('Clustering...')
     # cluster graphs
@@ -1,6 +1,8 @@
 import numpy as np
 import scipy
 import matplotlib.pyplot as plt
+import multiprocess as mp
+from multiprocess import shared_memory
 from scipy.optimize import linear_sum_assignment
 from scipy.cluster.hierarchy import fcluster, dendrogram, linkage
 
@@ -55,14 +57,15 @@ def ternary_search_extended(f, left, right, absolute_precision):
 def wasserstein_distance_vectorized(m1, m2, C1, C2):
     # https://de.wikipedia.org/wiki/Wasserstein-Metrik#Normalverteilung gives:
     # W^2 = ||m1-m2||^2 + Tr[C1] + Tr[C2] - 2Tr[Sqrt(C1C2)]
+    # the leading axes are broadcast, e.g. (11, 11) player pairs or (pairs, 11, 11) for a batch of formations
     C1C2 = np.matmul(C1, C2)
-    a = C1C2[:,:,0,0]
-    b = C1C2[:,:,0,1]
-    c = C1C2[:,:,1,0]
-    d = C1C2[:,:,1,1]
+    a = C1C2[...,0,0]
+    b = C1C2[...,0,1]
+    c = C1C2[...,1,0]
+    d = C1C2[...,1,1]
     t1 = 0.5*(a + d)
     t2 = (0.25*(a - d)**2 + b*c)**0.5
-    return np.maximum(0, np.sum((m1-m2)**2, axis=-1) + C1[:,:,0,0] + C1[:,:,1,1] + C2[:,:,0,0] + C2[:,:,1,1] - 2*((t1+t2)**0.5 + (t1-t2)**0.5))**0.5
+    return np.maximum(0, np.sum((m1-m2)**2, axis=-1) + C1[...,0,0] + C1[...,1,1] + C2[...,0,0] + C2[...,1,1] - 2*((t1+t2)**0.5 + (t1-t2)**0.5))**0.5
 
 
 def formation_distance_extended_vectorized(a, b):    
@@ -100,21 +103,156 @@ def formation_distance_extended_vectorized(a, b):
     return min_dist, argmin_k, min_row_ind, min_col_ind
 
 
-def compute_distance_matrix_extended(formations):
+def stack_formations(formations):
+    # (n, 11, 2) means moved such that the center of mass is at the center, (n, 11, 2, 2) covariances
+    mus = np.array([formation[0] for formation in formations], dtype=np.float64).reshape(-1, 11, 2)
+    covs = np.array([formation[1] for formation in formations], dtype=np.float64).reshape(-1, 11, 2, 2)
+    return mus - np.mean(mus, axis=1, keepdims=True), covs
+
+
+def formation_distances_batched(mus, covs, rows, cols, batch_size=2048):
+    """
+    the same as formation_distance_extended_vectorized, for many pairs of formations at once:
+    the 11x11 Wasserstein cost tensors of a whole batch of pairs are computed in one go and the
+    ternary search over the scale factor runs for all pairs of the batch in lockstep
+    (the search interval shrinks the same way for every pair)
+    mus, covs: see stack_formations
+    rows, cols: the indices of the two formations of every pair
+    returns the distances, scale factors (log2 k) and assignments (the col_ind of the
+    linear_sum_assignment, row_ind is always 0..10) of all pairs
+    """
+    n_pairs = len(rows)
+    dists = np.zeros(n_pairs)
+    ks = np.zeros(n_pairs)
+    assignments = np.zeros((n_pairs, 11), dtype=np.int64)
+
+    for start in range(0, n_pairs, batch_size):
+        batch = slice(start, min(start + batch_size, n_pairs))
+        # (pairs, 11, 1, ...) against (pairs, 1, 11, ...) broadcasts to all player pairs
+        mus_a, covs_a = mus[rows[batch]][:, :, None], covs[rows[batch]][:, :, None]
+        mus_b, covs_b = mus[cols[batch]][:, None], covs[cols[batch]][:, None]
+
+        def dist_extended(log_k, return_assignments=False):
+            k = (2**log_k)[:, None, None, None]
+            W = wasserstein_distance_vectorized(k*mus_a, 1/k*mus_b, k[..., None]**2*covs_a, 1/k[..., None]**2*covs_b)
+            col_ind = np.array([linear_sum_assignment(w)[1] for w in W], dtype=np.int64).reshape(-1, 11)
+            if return_assignments:
+                return col_ind
+            return np.take_along_axis(W, col_ind[:, :, None], axis=2).sum(axis=(1, 2))
+
+        # ternary_search_extended(dist_extended, -0.3, 0.3, 0.05) for every pair of the batch
+        n = batch.stop - batch.start
+        left, right = np.full(n, -0.3), np.full(n, 0.3)
+        while abs(right[0] - left[0]) >= 0.05:
+            left_third = left + (right - left) / 3
+            right_third = right - (right - left) / 3
+            f_left = dist_extended(left_third)
+            f_right = dist_extended(right_third)
+            move_left = f_left > f_right
+            left = np.where(move_left, left_third, left)
+            right = np.where(move_left, right, right_third)
+        take_left = f_left < f_right
+        dists[batch] = np.where(take_left, f_left, f_right)
+        ks[batch] = np.where(take_left, left, right)
+        assignments[batch] = dist_extended(ks[batch], return_assignments=True)
+    return dists, ks, assignments
+
+
+def pair_indices(n, start, stop):
+    # the (row, col) indices of the pairs start..stop-1 of the upper triangle of an (n, n) matrix,
+    # ordered row by row like np.triu_indices(n, 1)
+    row_starts = np.concatenate([[0], np.cumsum(np.arange(n - 1, 0, -1))])
+    pairs = np.arange(start, stop)
+    rows = np.searchsorted(row_starts, pairs, side='right') - 1
+    cols = pairs - row_starts[rows] + rows + 1
+    return rows, cols
+
+
+def _share(arrays):
+    # copies the arrays into shared memory, returns the blocks & the spec the workers attach with
+    blocks, spec = [], {}
+    for name, values in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        blocks.append(block)
+        spec[name] = (block.name, values.shape, values.dtype.str)
+    return blocks, spec
+
+
+def _distance_worker(args):
+    # computes the pairs start..stop-1 on the shared formations, writes them into the shared results
+    spec, n, start, stop, batch_size = args
+    blocks = {name: shared_memory.SharedMemory(name=block) for name, (block, _, _) in spec.items()}
+    try:
+        arrays = {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+                  for name, (_, shape, dtype) in spec.items()}
+        rows, cols = pair_indices(n, start, stop)
+        d, k, col_ind = formation_distances_batched(arrays['mus'], arrays['covs'], rows, cols, batch_size)
+        arrays['dists'][rows, cols] = d
+        arrays['dists'][cols, rows] = d
+        arrays['ks'][rows, cols] = k
+        arrays['ks'][cols, rows] = k
+        arrays['assignments'][start:stop] = col_ind
+        del arrays
+    finally:
+        for block in blocks.values():
+            block.close()
+    return stop - start
+
+
+def compute_distance_matrix_extended(formations, batch_size=2048, processes=1, chunk_size=None, progress=False):
+    """
+    the distances, scale factors and Wasserstein assignments between all pairs of formations
+    (see formation_distance_extended_vectorized), computed in batches of pairs (see formation_distances_batched)
+    with processes > 1 (None: one per core), the upper triangle is split into chunks of chunk_size pairs
+    which are computed by a process pool, the workers read the formations from shared memory and write
+    into shared result matrices. progress: print the number of finished pairs after every chunk
+    returns the (n, n) distance matrix, the (n, n) matrix of the scale factors and the assignments as a list
+    whose entry i holds [row_ind, col_ind] of the pairs (i, i+1), (i, i+2), ...
+    """
     n = len(formations)
     k_matrix = np.zeros((n,n))
-    row_col_matrix = []
     dists = np.zeros((n, n))
+    if n < 2:
+        return dists, k_matrix, [[] for _ in range(n)]
 
+    mus, covs = stack_formations(formations)
+    n_pairs = n * (n - 1) // 2
+    processes = processes or mp.cpu_count()
+    if processes == 1:
+        rows, cols = np.triu_indices(n, 1)
+        d, k, col_ind = formation_distances_batched(mus, covs, rows, cols, batch_size)
+        dists[rows, cols] = d
+        dists[cols, rows] = d
+        k_matrix[rows, cols] = k
+        k_matrix[cols, rows] = k
+    else:
+        # every pair costs the same, chunks of equal size are balanced - a few chunks per process
+        # keep all of them busy until the end
+        chunk_size = chunk_size or max(1, -(-n_pairs // (processes * 8)))
+        blocks, spec = _share({'mus': mus, 'covs': covs, 'dists': dists, 'ks': k_matrix,
+                               'assignments': np.zeros((n_pairs, 11), dtype=np.int64)})
+        try:
+            tasks = [(spec, n, start, min(start + chunk_size, n_pairs), batch_size)
+                     for start in range(0, n_pairs, chunk_size)]
+            done = 0
+            with mp.Pool(min(processes, len(tasks))) as pool:
+                for count in pool.imap_unordered(_distance_worker, tasks):
+                    done += count
+                    if progress:
+                        print(f'{done}/{n_pairs} pairs of formations')
+            results = {name: np.ndarray(shape, dtype=dtype, buffer=block.buf).copy()
+                       for block, (name, (_, shape, dtype)) in zip(blocks, spec.items())}
+            dists, k_matrix, col_ind = results['dists'], results['ks'], results['assignments']
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    # the pairs of row i are contiguous in the upper triangle
+    row_col_matrix = []
+    starts = np.concatenate([[0], np.cumsum(np.arange(n - 1, 0, -1))])
     for i in range(n):
-        row_cols_col = []
-        for j in range(i+1,n):
-            d, k, row_ass, col_ass = formation_distance_extended_vectorized(formations[i], formations[j])
-            k_matrix[i][j] = k
-            k_matrix[j][i] = k
-            row_cols_col.append([row_ass, col_ass])
-            dists[i][j] = d
-            dists[j][i] = d
-        row_col_matrix.append(row_cols_col)
-        
-    return dists, k_matrix, row_col_matrix
\ No newline at end of file
+        row_col_matrix.append([[np.arange(11), col_ind[p]] for p in range(starts[i], starts[i] + n - 1 - i)])
+
+    return dists, k_matrix, row_col_matrix
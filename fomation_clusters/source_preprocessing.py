@@ -1,103 +1,36 @@
+import os
+import sys
 import pandas as pd
-import datetime
-import xml.etree.ElementTree as et
 import numpy as np
 
-#----------------------------------------------------------------------------
-# Created By: Danny Camenisch (dcamenisch)
-# Created Date: 10/03/2022
-# version ='1.1'
-# ---------------------------------------------------------------------------
-""" 
-Simple module to convert a xml file containing data in TRACAB format to a Match object
-"""
-# ---------------------------------------------------------------------------
-
-class Match:
-    def __init__(self, filePath):
-        match = et.parse(filePath).getroot()[0]
-
-        self.matchID      = int(match.attrib['id'])
-        self.matchNr      = int(match.attrib['matchNumber'])
-        self.date         = match.attrib['dateMatch']
-        self.stadiumID    = int(match[1].attrib['id'])
-        self.stadiumName  = match[1].attrib['name']
-        self.pitchLength  = int(match[1].attrib['pitchLength'])
-        self.pitchWidth   = int(match[1].attrib['pitchWidth'])
-        self.phases       = [Phase(phase) for phase in match[2]]
-        self.frames       = [Frame(frame) for frame in match[3]]
-
-        self.removeExcessFrames()
-        
-    def removeExcessFrames(self):
-        keep = []
-        for frame in self.frames:
-            for phase in self.phases:
-                if frame.time >= phase.start and frame.time <= phase.end:
-                    keep.append(frame)
-                    break
-
-        self.frames = keep
-
-
-class Phase:
-    def __init__(self, phase):
-        self.start       = phase.attrib['start']
-        self.end         = phase.attrib['end']
-        self.leftTeamID  = int(phase.attrib['leftTeamID'])
-        
-class Frame:
-    def __init__(self, frame):
-        self.time            = frame.attrib['utc']
-        self.ballInPlay      = frame.attrib['isBallInPlay']
-        self.ballPossession  = frame.attrib['ballPossession']
-        self.trackingObjs    = [TrackingObj(obj) for obj in frame[0]]
-    
-class TrackingObj:
-    def __init__(self, obj):
-        self.type      = obj.attrib['type']
-        self.id        = obj.attrib['id']
-        self.x         = int(obj.attrib['x'])
-        self.y         = int(obj.attrib['y'])
-        self.sampling  = obj.attrib['sampling']
+# the tracking modules live in <repo>/utils and import each other script-style, make them importable
+# no matter where main.py is started from
+UTILS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils')
+if UTILS_DIR not in sys.path:
+    sys.path.append(UTILS_DIR)
 
+from match import MatchStream
+from frame_store import FrameStore
+from ingest_cache import cached
+from periods import segment
 
+
+@cached('load_data')
 def load_data(path):
-    # import match as m  # Danny's Match object, catches the frames sampled during the actual game
-    match = Match(path)
-    framedict = dict()
-
-    for index, frame in enumerate(match.frames):
-        # time is stored as datetime objects - makes it easier to do operations/comparisons on it
-        time = frame.time.replace('Z', '').replace('T', ' ')
-        columns = dict()
-        if '.' not in time: # turns out that for some games there are frames for which milliseconds are dropped 
-            time += '.0'    # in such case we add them artificially, so that the string format matches
-        columns['time'] = datetime.datetime.strptime(time, '%Y-%m-%d %H:%M:%S.%f')
-        columns['ball_possession'] = frame.ballPossession
-        columns['ball_in_play'] = frame.ballInPlay
-
-        for i, obj in enumerate(frame.trackingObjs):
-            if obj.type == '7':
-                for key, value in obj.__dict__.items():
-                    columns["ball_" + key] = int(value)
-            else:
-                # Each player with id Q, who played during the match gets their own columns:
-                # "playerQ_type", "playerQ_id"*, "playerQ_x", "playerQ_y" with the respective data.
-                # In case the player got subbed on/off at some point, the entries corresponding to
-                # the time the player was off the pitch have value <null>
-                for key, value in obj.__dict__.items():
-                    #  *since we encode players' IDs in the columns' names, you might  want to avoid
-                    #   some data redundancy and skip the ID columns, depending on the application
-                    # if key == 'id':
-                    #     continue
-
-                    columns["player" + str(obj.id) + "_" + key] = int(value)
-
-        framedict[index] = columns
-
-    # convert into pandas dataframe & export as parquet file
-    df = pd.DataFrame.from_dict(framedict, orient='index')
+    # Danny's Match object, catches the frames sampled during the actual game.
+    # The frames are streamed from the file instead of keeping the whole xml tree in memory
+    match = MatchStream(path, removeExcess=False)
+    # Each player with id Q, who played during the match gets their own columns:
+    # "playerQ_type", "playerQ_id", "playerQ_x", "playerQ_y", "playerQ_sampling" with the respective data.
+    # In case the player got subbed on/off at some point, the entries corresponding to
+    # the time the player was off the pitch have value <null>
+    store = FrameStore.from_frames(match)
+    store.keep_phases(match.phases)  # only keep the frames sampled during the actual game
+
+    # convert into pandas dataframe
+    df = store.to_dataframe(prefix='player', frame_info=True)
+    # first/last frame & wall-clock bounds of the halves (and extra time), see utils/periods.py
+    df.attrs['periods'] = segment(store.times_ns(), store.phase, match.phases)
     return df
 
 
@@ -178,7 +111,7 @@ def get_sg_window_coords(df, df_players, phases, ball_possessions, breaks):
         phase_lengths = phases.value_counts(sort=False) # update phase lengths
 
         w = {key: [] for key in ball_possessions.unique()}
-        for index, value in phases.iteritems(): 
+        for index, value in phases.items(): 
             w[phase_possessions[value]].append(index)
 
         # append windows globally for all phase splits
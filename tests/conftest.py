@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules in utils/ import each other script-style (see utils/utils.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils'))
@@ -0,0 +1,54 @@
+import numpy as np
+
+from cleaning import clean, UNRELIABLE
+from kinematics import Kinematics
+
+
+def _walk(n_frames=25 * 60, players=3, seed=0):
+    # players running at 2-5 m/s with some curvature, positions in cm at 25 Hz
+    rng = np.random.default_rng(seed)
+    times = np.datetime64('2021-06-20T16:00:00', 'ns') + np.arange(n_frames) * np.timedelta64(40, 'ms')
+    t = np.arange(n_frames)[:, None] / 25
+    speed = rng.uniform(2, 5, players)
+    x = 100 * speed * t + 300 * np.sin(t / 7)
+    y = 300 * np.cos(t / 5 + np.arange(players))
+    return times, x, y
+
+
+def _distance(times, x, y, sampling, **kwargs):
+    x, y, summary = clean(times, x, y, sampling, list(range(x.shape[1])), **kwargs)
+    kin = Kinematics.from_positions(times, x, y, list(range(x.shape[1])))
+    return np.nansum(kin.dist, axis=0), summary
+
+
+def test_single_unreliable_sample_keeps_distance():
+    times, x, y = _walk()
+    sampling = np.zeros(x.shape)
+    reference, _ = _distance(times, x, y, sampling)
+
+    sampling[700, 1] = UNRELIABLE
+    distance, summary = _distance(times, x, y, sampling)
+    np.testing.assert_allclose(distance, reference, rtol=1e-3)
+    assert summary.loc[1, 'unreliable'] == 1 and summary.loc[1, 'bridged'] == 1
+    assert summary.loc[0, 'unreliable'] == 0
+
+
+def test_unbridged_unreliable_sample_is_left_out():
+    times, x, y = _walk()
+    sampling = np.zeros(x.shape)
+    sampling[700, 1] = UNRELIABLE
+    distance, summary = _distance(times, x, y, sampling, bridge=False)
+    reference, _ = _distance(times, x, y, np.zeros(x.shape))
+    assert distance[1] < reference[1]
+    np.testing.assert_allclose(distance[[0, 2]], reference[[0, 2]])
+    assert summary.loc[1, 'valid'] == len(times) - 1
+
+
+def test_max_gap_interpolates_short_gaps_only():
+    times, x, y = _walk()
+    x[100:103, 0] = np.nan  # 4 frames between the samples around it = 0.16 s
+    x[200:300, 0] = np.nan  # 4 s
+    x2, _, summary = clean(times, x, y, np.zeros(x.shape), [0, 1, 2], max_gap=0.5)
+    assert not np.isnan(x2[100:103, 0]).any()
+    assert np.isnan(x2[200:300, 0]).all()
+    assert summary.loc[0, 'interpolated'] == 3
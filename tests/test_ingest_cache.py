@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from ingest_cache import IngestCache
+
+
+def _convert(path):
+    # stands in for utils.convert_tracking: the attrs carry int keys, numpy ints and nested tables
+    df = pd.DataFrame({'time': pd.date_range('2021-06-20 16:00', periods=3, freq='40ms'), '1_x': [0., 1., 2.]})
+    df.attrs['match_id'] = 3788766
+    df.attrs['home_team'] = np.int64(66)
+    df.attrs['away_team'] = 144
+    df.attrs['player_map'] = {1: 'Donnarumma', 250012939: 'Bale'}
+    df.attrs['periods'] = [{'period': 1, 'first_frame': 0, 'last_frame': 2, 'start': np.int64(1624204800000000000)}]
+    return df
+
+
+def test_hit_returns_the_attrs_of_a_miss(tmp_path):
+    source = tmp_path / 'match.xml'
+    source.write_text('<frames/>')
+    cache = IngestCache(str(tmp_path / 'cache'))
+
+    miss = cache.get_or_convert(str(source), 'test', _convert)
+    hit = cache.get_or_convert(str(source), 'test', _convert)
+
+    assert hit.attrs == miss.attrs
+    assert list(hit.attrs['player_map']) == [1, 250012939]
+    for attrs in (miss.attrs, hit.attrs):
+        assert type(attrs['match_id']) is int
+        assert type(attrs['home_team']) is int
+        assert type(attrs['periods'][0]['start']) is int
+    pd.testing.assert_frame_equal(hit, miss)
+
+
+def test_string_keys_round_trip(tmp_path):
+    source = tmp_path / 'match.xml'
+    source.write_text('<frames/>')
+    cache = IngestCache(str(tmp_path / 'cache'))
+    df = pd.DataFrame({'a': [1]})
+    df.attrs = {'names': {'66': 'ITA'}, 'mins': {250012939: 90.5}, 'start': pd.Timestamp('2021-06-20 16:00')}
+    cache.put(str(source), 'test', df)
+
+    attrs = cache.get(str(source), 'test').attrs
+    assert attrs['names'] == {'66': 'ITA'}
+    assert attrs['mins'] == {250012939: 90.5}
+    assert attrs['start'] == '2021-06-20 16:00:00'
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from live import MatchTail
+
+HEADER = '''<?xml version="1.0" encoding="utf-8"?>
+<TracabData>
+<match id="3788766" matchNumber="7" dateMatch="2021-06-20T16:00:00Z">
+<competition id="1" name="EURO"/>
+<stadium id="5" name="Olimpico" pitchLength="10500" pitchWidth="6800"/>
+<phases>
+<phase start="2021-06-20T16:00:00Z" end="2021-06-20T16:00:10Z" leftTeamID="66"/>
+</phases>
+<frames>
+'''
+FOOTER = '</frames>\n</match>\n</TracabData>\n'
+
+
+def _tracab(n_frames=200, seed=0):
+    # a short match at 25 Hz: the ball and two players of each team
+    rng = random.Random(seed)
+    frames = []
+    for i in range(n_frames):
+        objs = '<obj type="7" id="0" x="0" y="0" sampling="0"/>'
+        for team, players in ((0, (100, 101)), (1, (200, 201))):
+            for p in players:
+                objs += f'<obj type="{team}" id="{p}" x="{rng.randint(-5000, 5000)}" y="{rng.randint(-3000, 3000)}" sampling="0"/>'
+        frames.append(f'<frame utc="2021-06-20T16:00:{i // 25:02d}.{i % 25 * 40:03d}Z" isBallInPlay="1" '
+                      f'ballPossession="Home"><objs>{objs}</objs></frame>\n')
+    return (HEADER + ''.join(frames) + FOOTER).encode()
+
+
+def test_poll_reads_a_growing_file(tmp_path):
+    path = tmp_path / 'live.xml'
+    data = _tracab()
+    closed = data.index(b'</frames>') + len(b'</frames>')
+    path.write_bytes(b'')
+    tail = MatchTail(str(path))
+    slices = []
+    tail.subscribe(lambda store, rows: slices.append(rows))
+
+    rng = random.Random(1)
+    written = 0
+    while written < len(data):
+        written = min(written + rng.randint(1, 3000), len(data))
+        path.write_bytes(data[:written])
+        tail.poll()
+        assert tail.finished == (written >= closed)
+
+    assert tail.ready
+    assert tail.store.n_frames == 200
+    # the subscribers saw every row exactly once, in order
+    assert slices[0].start == 0
+    assert all(a.stop == b.start for a, b in zip(slices, slices[1:]))
+    assert slices[-1].stop == 200
+    assert all(s.stop > s.start for s in slices)
+
+
+def test_poll_raises_if_the_file_shrinks(tmp_path):
+    path = tmp_path / 'live.xml'
+    data = _tracab(n_frames=50)
+    path.write_bytes(data[:len(data) // 2])
+    tail = MatchTail(str(path))
+    tail.poll()
+
+    path.write_bytes(data[:len(data) // 4])
+    with pytest.raises(ValueError):
+        tail.poll()
@@ -0,0 +1,71 @@
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from match_catalog import MatchCatalog
+
+# player.py scrapes the squads from uefa.com when it's imported, running_reformat uses it for its examples
+sys.modules.setdefault('player', types.ModuleType('player'))
+sys.modules['player'].getPlayerInfos = getattr(sys.modules['player'], 'getPlayerInfos', lambda team: [])
+import running_reformat  # noqa: E402
+
+# player id -> speed [m/s], 1 & 2 play for the home team (66), 3 for the away team (144)
+SPEEDS = {1: 2.0, 2: 3.0, 3: 4.0}
+HALF = 120  # seconds
+START = np.datetime64('2021-06-20T16:00:00', 'ns')
+
+
+def _match(path, match_id=3788766):
+    # two halves of two minutes at 25 Hz, every player runs along the x axis at a constant speed
+    frames = []
+    periods = []
+    for period, kickoff in enumerate([START, START + np.timedelta64(17 * 60, 's')]):
+        t = np.arange(HALF * 25 + 1) / 25
+        first = sum(len(f) for f in frames)
+        frames.append(kickoff + (t * 1e9).astype('timedelta64[ns]'))
+        periods.append({'period': period + 1, 'first_frame': first, 'last_frame': first + len(t) - 1,
+                        'start': int(frames[-1][0].astype(np.int64)), 'end': int(frames[-1][-1].astype(np.int64))})
+    times = np.concatenate(frames)
+    seconds = (times - START).astype(np.int64) / 1e9
+    df = pd.DataFrame({'time': times})
+    for p, speed in SPEEDS.items():
+        # back and forth between the goal line and the halfway line, in cm
+        lap = 100 * speed * seconds % 10000
+        df[f'{p}_x'] = np.where(lap < 5000, lap, 10000 - lap)
+        df[f'{p}_y'] = 0.0
+        df[f'{p}_sampling'] = 0.0
+    df.attrs = {'match_id': match_id, 'home_team': 66, 'away_team': 144, 'periods': periods}
+    df.to_parquet(path, index=False)
+    return path
+
+
+def test_dists_tournament_keeps_int_ids(tmp_path):
+    _match(str(tmp_path / 'ita-wal.parquet'))
+    catalog = MatchCatalog.build(str(tmp_path), pattern='*.parquet')
+
+    df = running_reformat.distsTournament(66, [1, 2, 4], catalog, processes=1)
+    assert list(df.index) == [1, 2, 4]
+    distances = df['66 - 144']
+    # 4 minutes of play
+    assert distances[1] == pytest.approx(2.0 * 240 / 1000, rel=0.05)
+    assert distances[2] == pytest.approx(3.0 * 240 / 1000, rel=0.05)
+    assert np.isnan(distances[4])
+
+    by_str = running_reformat.distsTournament(66, ['1', '2'], catalog, processes=1)
+    assert list(by_str['66 - 144']) == pytest.approx(list(distances[[1, 2]]))
+
+
+def test_min_to_min_splits_the_teams_with_int_ids(tmp_path):
+    path = _match(str(tmp_path / 'ita-wal.parquet'))
+
+    df = running_reformat.minToMin([1, 2], [3], path)
+    assert list(df.columns) == ['total_A', 'total_B']
+    assert len(df) == 4
+    assert df['total_A'].iloc[-1] == pytest.approx((2.0 + 3.0) * 240 / 1000, rel=0.05)
+    assert df['total_B'].iloc[-1] == pytest.approx(4.0 * 240 / 1000, rel=0.05)
+    # one minute of play per bin
+    assert df['total_A'].iloc[0] == pytest.approx((2.0 + 3.0) * 60 / 1000, rel=0.05)
+    assert df.equals(running_reformat.minToMin(['1', '2'], ['3'], path))
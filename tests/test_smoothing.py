@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from smoothing import smooth, FILTERS
+
+TIMES = np.datetime64('2021-06-20T16:00:00', 'ns') + np.arange(500) * np.timedelta64(40, 'ms')
+
+
+def _signal(seed=0):
+    rng = np.random.default_rng(seed)
+    values = np.cumsum(rng.normal(size=(len(TIMES), 4)), axis=0)
+    values[100:140, 1] = np.nan  # a gap
+    values[:50, 2] = np.nan  # a player coming on
+    values[rng.random(values.shape) < 0.02] = np.nan
+    return values
+
+
+@pytest.mark.parametrize('method', list(FILTERS))
+def test_gaps_stay_gaps(method):
+    values = _signal()
+    smoothed = smooth(values, TIMES, method)
+    assert smoothed.shape == values.shape
+    assert np.array_equal(np.isnan(smoothed), np.isnan(values))
+
+
+@pytest.mark.parametrize('method', list(FILTERS))
+def test_constant_signal_is_unchanged(method):
+    values = np.full((len(TIMES), 3), 250.0)
+    values[200:230, 0] = np.nan
+    smoothed = smooth(values, TIMES, method)
+    assert np.allclose(smoothed[~np.isnan(values)], 250.0)
+    assert np.isnan(smoothed[200:230, 0]).all()
+
+
+def _kalman_reference(z, dts, q, r):
+    # filter & smoother of a single column, one frame at a time
+    n = len(z)
+    xs, ps, x_preds, p_preds = [None] * n, [None] * n, [None] * n, [None] * n
+    x, p = None, None
+    for i in range(n):
+        f = np.array([[1, dts[i]], [0, 1]])
+        if x is not None:
+            g = np.array([dts[i] ** 2 / 2, dts[i]])
+            x, p = f @ x, f @ p @ f.T + q * np.outer(g, g)
+        x_preds[i], p_preds[i] = x, p
+        if not np.isnan(z[i]):
+            if x is None:
+                x, p = np.array([z[i], 0.0]), np.diag([r, 100 * r])
+            else:
+                k = p[:, 0] / (p[0, 0] + r)
+                x, p = x + k * (z[i] - x[0]), p - np.outer(k, p[0])
+        xs[i], ps[i] = x, p
+    smoothed = np.full(n, np.nan)
+    s = xs[-1]
+    smoothed[-1] = np.nan if s is None else s[0]
+    for i in range(n - 2, -1, -1):
+        if xs[i] is None:
+            break
+        f = np.array([[1, dts[i + 1]], [0, 1]])
+        c = ps[i] @ f.T @ np.linalg.inv(p_preds[i + 1])
+        s = xs[i] + c @ (s - x_preds[i + 1])
+        smoothed[i] = s[0]
+    return np.where(np.isnan(z), np.nan, smoothed)
+
+
+@pytest.mark.parametrize('q, r', [(1.0, 1.0), (0.3, 4.0)])
+def test_kalman_matches_a_frame_by_frame_filter(q, r):
+    values = _signal(1)
+    times = TIMES.copy()
+    times[300:] += np.timedelta64(15, 'm')  # half time
+    dts = np.zeros(len(times))
+    dts[1:] = np.diff(times).astype(np.int64) / 1e9
+    smoothed = smooth(values, times, 'kalman', process_noise=q, measurement_noise=r, block=64)
+    for col in range(values.shape[1]):
+        expected = _kalman_reference(values[:, col], dts, q, r)
+        # the covariances predicted over the break are huge, i.e. the smoother gains are ill-conditioned there
+        assert np.allclose(smoothed[:, col], expected, equal_nan=True, rtol=0, atol=1e-6)
@@ -0,0 +1,123 @@
+"""
+Cleaning of the coordinates of a match: frames x players arrays, NaN where a player is not on the pitch.
+
+Unreliable samples (TRACAB sampling flag 2) are masked for the affected player only instead of dropping
+the whole frame for everybody. The masked samples are then bridged by linear interpolation between the
+player's reliable samples before and after them - the player moves along the straight line between the
+two, just like the displacement over the dropped frames did before. Other short gaps (e.g. frames where
+a player wasn't tracked) can be interpolated the same way.
+"""
+import numpy as np
+import pandas as pd
+
+from running_metrics import runs
+
+# TRACAB sampling flag of an unreliable sample
+UNRELIABLE = 2
+# unreliable samples are bridged up to this many seconds, longer gaps are ignored by the kinematics anyway
+BRIDGE_GAP = 5 * 60
+
+
+def mask_unreliable(x, y, sampling):
+    """
+    @param x: frames x players array of x coordinates
+    @param y: frames x players array of y coordinates
+    @param sampling: frames x players array of TRACAB sampling flags
+    @return: (x, y, unreliable) - copies of the coordinates with NaN at the unreliable samples and
+    the boolean mask of these samples
+    """
+    unreliable = np.asarray(sampling) == UNRELIABLE
+    x = np.where(unreliable, np.nan, x)
+    y = np.where(unreliable, np.nan, y)
+    return x, y, unreliable
+
+
+def gaps(missing):
+    """
+    runs of missing values in every column which lie between two present values
+    @param missing: frames x players boolean array
+    @return: (player, start, stop) - column, first frame and frame after the last frame of every gap
+    """
+    player, start, stop = runs(missing)
+    inner = (start > 0) & (stop < missing.shape[0])
+    return player[inner], start[inner], stop[inner]
+
+
+def interpolate_gaps(times, x, y, max_gap=0.5, missing=None):
+    """
+    linear interpolation of the coordinates within short gaps, all gaps of all players at once
+    @param times: datetime64 array of the frames
+    @param x: frames x players array of x coordinates, NaN where missing
+    @param y: frames x players array of y coordinates
+    @param max_gap: only gaps of at most this many seconds (between the samples around them) are filled
+    @param missing: frames x players mask of the values which may be filled, by default all NaN values
+    @return: (x, y, filled) - the interpolated coordinates and the boolean mask of the filled values
+    """
+    times = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+    absent = np.isnan(x) | np.isnan(y)
+    missing = absent if missing is None else missing & absent
+    player, start, stop = gaps(missing)
+    # only gaps with samples on both sides, which aren't too long
+    keep = ~absent[start - 1, player] & ~absent[stop, player] if len(player) else np.zeros(0, dtype=bool)
+    keep &= times[stop] - times[start - 1] <= max_gap * 1e9
+    player, start, stop = player[keep], start[keep], stop[keep]
+
+    # every missing cell of a short gap, with the samples before & after its gap
+    lengths = stop - start
+    cols = np.repeat(player, lengths)
+    lefts = np.repeat(start - 1, lengths)
+    rights = np.repeat(stop, lengths)
+    rows = lefts + 1 + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    weight = (times[rows] - times[lefts]) / (times[rights] - times[lefts])
+
+    x, y = x.copy(), y.copy()
+    for values in (x, y):
+        values[rows, cols] = values[lefts, cols] + weight * (values[rights, cols] - values[lefts, cols])
+    filled = np.zeros(missing.shape, dtype=bool)
+    filled[rows, cols] = True
+    return x, y, filled
+
+
+def clean(times, x, y, sampling, players, max_gap=None, bridge=True):
+    """
+    masks the unreliable samples and bridges them (see interpolate_gaps with BRIDGE_GAP), if :param max_gap
+    is given, all other gaps of at most max_gap seconds are interpolated as well
+    @param players: the player ids of the columns
+    @param bridge: if False, the unreliable samples are left out (NaN) - the distance covered across them is lost
+    @return: (x, y, summary) - the cleaned coordinates and the quality summary (see quality_summary)
+    """
+    tracked = ~(np.isnan(x) | np.isnan(y))
+    x, y, unreliable = mask_unreliable(x, y, sampling)
+    bridged = np.zeros(tracked.shape, dtype=bool)
+    filled = np.zeros(tracked.shape, dtype=bool)
+    if bridge:
+        x, y, bridged = interpolate_gaps(times, x, y, BRIDGE_GAP, missing=unreliable)
+    if max_gap is not None:
+        x, y, filled = interpolate_gaps(times, x, y, max_gap)
+    return x, y, quality_summary(players, tracked, unreliable & tracked, bridged, filled, ~np.isnan(x))
+
+
+def quality_summary(players, tracked, unreliable, bridged, filled, valid):
+    """
+    @param players: the player ids of the columns
+    @param tracked: frames x players mask of the frames with coordinates
+    @param unreliable: mask of the tracked frames with an unreliable sample
+    @param bridged: mask of the unreliable samples replaced by interpolation
+    @param filled: mask of the other frames filled by interpolation
+    @param valid: mask of the frames with coordinates after the cleaning
+    @return: dataframe indexed by player with the columns
+        frames (frames with coordinates), unreliable (of which flagged as unreliable),
+        bridged (unreliable samples interpolated), interpolated (other frames filled by interpolation),
+        valid (frames with coordinates after the cleaning),
+        reliable_share (share of the tracked frames which were reliable)
+    """
+    df = pd.DataFrame({
+        'frames': tracked.sum(axis=0),
+        'unreliable': unreliable.sum(axis=0),
+        'bridged': bridged.sum(axis=0),
+        'interpolated': filled.sum(axis=0),
+        'valid': valid.sum(axis=0),
+    }, index=pd.Index(players, name='player'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['reliable_share'] = 1 - df['unreliable'] / df['frames']
+    return df
@@ -1,10 +1,12 @@
 import pandas as pd
-from datetime import datetime, timedelta
 import numpy as np
-from tqdm import tqdm
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 import xml.etree.ElementTree as ET # parsing XML files
 
+from match import decodeUtc
+
 # parse xml file
 
 class Match_b:
@@ -19,63 +21,15 @@ class Match_b:
         self.phases       = match[2]
         self.frames       = match[3]
 
-path = 'data/tracab/Italy v Wales.xml'
-tree = ET.parse(path).getroot()
-match = Match_b(tree[0])
-
-
-# Now convert to pandas and save
-
-framedict_players = dict()
-framedict_ball = dict()
-path_to_data = 'data/metrica/'
-savepath_pl = path_to_data + "tracking_players.parquet"
-savepath_ph = path_to_data + "tracking_phases.parquet"
-savepath_b = path_to_data + "tracking_ball.parquet"
-i = 0
-j = 0
-for index, frame in enumerate(match.frames):
-  time = datetime.fromisoformat(frame.attrib["utc"][:-1])
-  
-  for id, obj in enumerate(frame[0]):
-    columns = dict()
-    columns['time'] = time
-    columns['frame'] = index
-    if id == 0: #ball
-      for key, value in obj.attrib.items():
-        columns["ball_" + key] = int(value)
-      framedict_ball[j] = columns
-      j = j+1
-      
-    else:
-      for key, value in obj.attrib.items():
-        columns["player_" + key] = int(value)
-      framedict_players[i] = columns
-      i = i+1
-
-phases = dict()
-for index, phase in enumerate(match.phases):
-    phases[index] =  phase.attrib
-
-df_ph = pd.DataFrame.from_dict(phases, orient='index')
-df_ph['start'] = df_ph['start'].apply(lambda x: datetime.fromisoformat(x[:19]))
-df_ph['end'] = df_ph['end'].apply(lambda x: datetime.fromisoformat(x[:19]))
-df_ph.to_parquet(savepath_ph, index = False)
-
-df_p = pd.DataFrame.from_dict(framedict_players, orient='index')
-df_p.to_parquet(savepath_pl, index = False)
-
-df_b = pd.DataFrame.from_dict(framedict_ball, orient='index')
-df_b.to_parquet(savepath_b, index = False)
 
 # just short helpers
-path = 'data/metrica/'
+path_to_data = 'data/metrica/'
 def load_data_pandas(file):
-    return pd.read_parquet(path+file)
+    return pd.read_parquet(path_to_data+file)
 def save_data_pandas(df, file):
-    df.to_parquet(path+file)
+    df.to_parquet(path_to_data+file)
 
-# helper coordinate conversion
+# helper coordinate conversion, works on single values as well as on whole numpy arrays
 def trac_to_metr_x(x):
     return x / 10500.0 + 0.5
 
@@ -86,86 +40,199 @@ def trac_to_metr(x, y):
     return (trac_to_metr_x(x), trac_to_metr_y(y))
 
 
-#load data
-df = load_data_pandas('tracking_players.parquet')
-ball_data = load_data_pandas('tracking_ball.parquet')
-phases = load_data_pandas('tracking_phases.parquet')
-
-
-# get unique player ids
-
-player_ids_1 = df[df['player_type']==0]['player_id'].unique().tolist()
-# I found this necessary for the pitch controll code
-while len(player_ids_1)<14:
-    player_ids_1.append(-1)
-
-player_ids_2= df[df['player_type']==1]['player_id'].unique().tolist()
-# I found this necessary for the pitch controll code
-while len(player_ids_2)<14:
-    player_ids_2.append(-1)
-
-
-# make base skeleton with times and frames
-fd1 = dict()
-
-frame = dict()
-period = dict()
-times = dict()
-start = phases.start[0]
-half = phases.end[0]
-for ind, row in ball_data[['time', 'frame']].drop_duplicates().iterrows():
-    fr = row['frame']
-    frame[fr] = fr
-    times[fr] = np.timedelta64(row['time']-start).astype('timedelta64[ms]').astype('float')/1000
-    period[fr] = int(1 if row['time']<half else 2)
-    
-fd1['Period'] = period
-fd1['Frame'] = frame
-fd1['Time [s]'] = times
-
-fd2 = fd1.copy()
-
-
-#This is not very efficient, but it works so...
-
-#add data for players
-
-for pl_ind, id in enumerate(tqdm(player_ids_1)):
-    pl_x = dict()
-    pl_y = dict()
-    for row_ind, row in df[df['player_id']==id].iterrows():
-        pl_x[row['frame']] = trac_to_metr_x(row['player_x'])
-        pl_y[row['frame']] = trac_to_metr_y(row['player_y'])
-    fd1['Player'+str(pl_ind+1)] = pl_x
-    fd1['Unnamed: '+str(2*pl_ind+4)] = pl_y
-
-for pl_ind, id in enumerate(tqdm(player_ids_2)):
-    pl_x = dict()
-    pl_y = dict()
-    for row_ind, row in df[df['player_id']==id].iterrows():
-        pl_x[row['frame']] = trac_to_metr_x(row['player_x'])
-        pl_y[row['frame']] = trac_to_metr_y(row['player_y'])
-    fd2['Player'+str(pl_ind+2)] = pl_x
-    fd2['Unnamed: '+str(2*pl_ind+4)] = pl_y
-
-
-#add data for ball
-colx = dict()
-coly = dict()
-for ind, row in ball_data.iterrows():
-    fr = row['frame']
-    colx[fr] = trac_to_metr_x(row['ball_x'])
-    coly[fr] = trac_to_metr_y(row['ball_y'])
-fd1['Ball'] = colx
-fd1['Unnamed: '+str(len(fd1))] = coly
-fd2['Ball'] = colx
-fd2['Unnamed: '+str(len(fd2))] = coly
-
-# make dataframes
-df1 = pd.DataFrame(fd1).astype({'Frame':'int', 'Period':'int'})
-df2 = pd.DataFrame(fd2).astype({'Frame':'int', 'Period':'int'})
-
-
-# save files
-save_data_pandas(df1,"tracking_team1.parquet")
-save_data_pandas(df2,"tracking_team2.parquet")
\ No newline at end of file
+def team_player_ids(df, team, min_players=14):
+    """
+    ids of the players of a team in the order they appear in the tracking data
+    @param df: the players dataframe (tracking_players.parquet)
+    @param team: 0 for the home team, 1 for the away team
+    @param min_players: the list is padded with -1 up to this length
+    """
+    player_ids = df.loc[df['player_type'] == team, 'player_id'].unique().tolist()
+    # I found this necessary for the pitch controll code
+    while len(player_ids) < min_players:
+        player_ids.append(-1)
+    return player_ids
+
+
+def metrica_chunks(df, ball_data, phases, chunk_frames=None):
+    """
+    converts the tracking data into the metrica format used by the pitch control code,
+    both teams, the ball and the period labels are done in one pass per chunk of frames
+    @param df: the players dataframe (tracking_players.parquet)
+    @param ball_data: the ball dataframe (tracking_ball.parquet)
+    @param phases: the phases dataframe (tracking_phases.parquet)
+    @param chunk_frames: number of frames per chunk, by default the whole match is one chunk
+    @return: generator of (team 1 dataframe, team 2 dataframe) chunks, indexed by frame
+    """
+    player_ids_1 = team_player_ids(df, 0)
+    player_ids_2 = team_player_ids(df, 1)
+
+    # columns of the x/y arrays: the players of team 1 first, then the ones of team 2
+    n1 = len(player_ids_1)
+    n_players = n1 + len(player_ids_2)
+    lookups = []
+    for offset, team_ids in [(0, player_ids_1), (n1, player_ids_2)]:
+        team_ids = np.array(team_ids)
+        cols = np.flatnonzero(team_ids != -1)
+        order = np.argsort(team_ids[cols], kind='stable')
+        lookups.append((team_ids[cols][order], offset + cols[order]))
+
+    # team 2 starts with 'Player2', kept like this since the pitch control notebook expects it
+    names_1 = ['Period', 'Frame', 'Time [s]']
+    for pl_ind in range(n1):
+        names_1 += ['Player' + str(pl_ind + 1), 'Unnamed: ' + str(2 * pl_ind + 4)]
+    names_1 += ['Ball', 'Unnamed: ' + str(len(names_1) + 1)]
+    names_2 = ['Period', 'Frame', 'Time [s]']
+    for pl_ind in range(len(player_ids_2)):
+        names_2 += ['Player' + str(pl_ind + 2), 'Unnamed: ' + str(2 * pl_ind + 4)]
+    names_2 += ['Ball', 'Unnamed: ' + str(len(names_2) + 1)]
+
+    # make base skeleton with times and frames (ball_data has one row per frame)
+    skeleton = ball_data[['time', 'frame']].drop_duplicates()
+    frames = skeleton['frame'].values.astype(np.int64)
+    start = np.datetime64(phases.start[0], 'ns')
+    half = np.datetime64(phases.end[0], 'ns')
+    times = skeleton['time'].values.astype('datetime64[ns]')
+    seconds = (times - start).astype('timedelta64[ms]').astype('float') / 1000
+    period = np.where(times < half, 1, 2)
+
+    ball = ball_data.drop_duplicates('frame', keep='last').set_index('frame')
+    ball = ball.reindex(frames)
+    ball_x = trac_to_metr_x(ball['ball_x'].values)
+    ball_y = trac_to_metr_y(ball['ball_y'].values)
+
+    # the players are stored in frame order, so a chunk of frames is a contiguous block of rows
+    if not df['frame'].is_monotonic_increasing:
+        df = df.sort_values('frame', kind='stable')
+    pl_frames = df['frame'].values
+
+    if chunk_frames is None:
+        chunk_frames = max(len(frames), 1)
+    for begin in range(0, len(frames), chunk_frames):
+        end = min(begin + chunk_frames, len(frames))
+        rows = slice(np.searchsorted(pl_frames, frames[begin]),
+                     np.searchsorted(pl_frames, frames[end - 1], side='right'))
+        chunk = df.iloc[rows]
+
+        # pivot the players into a frames x players layout
+        ids = chunk['player_id'].values
+        chunk_rows = np.searchsorted(frames[begin:end], chunk['frame'].values)
+        pl_x = trac_to_metr_x(chunk['player_x'].values)
+        pl_y = trac_to_metr_y(chunk['player_y'].values)
+        x = np.full((end - begin, n_players), np.nan)
+        y = np.full((end - begin, n_players), np.nan)
+        for sorted_ids, sorted_cols in lookups:
+            if len(sorted_ids) == 0:
+                continue
+            pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+            known = sorted_ids[pos] == ids
+            x[chunk_rows[known], sorted_cols[pos[known]]] = pl_x[known]
+            y[chunk_rows[known], sorted_cols[pos[known]]] = pl_y[known]
+
+        index = pd.Index(frames[begin:end])
+        base = [period[begin:end], frames[begin:end], seconds[begin:end]]
+        team_dfs = []
+        for names, team_cols in [(names_1, range(n1)), (names_2, range(n1, n_players))]:
+            values = list(base)
+            for col in team_cols:
+                values += [x[:, col], y[:, col]]
+            values += [ball_x[begin:end], ball_y[begin:end]]
+            team_dfs.append(pd.DataFrame(dict(zip(names, values)), index=index))
+        yield team_dfs[0], team_dfs[1]
+
+
+def to_metrica(df, ball_data, phases, chunk_frames=None):
+    """
+    converts the tracking data into the metrica format (see metrica_chunks)
+    @return: (team 1 dataframe, team 2 dataframe)
+    """
+    chunks = list(metrica_chunks(df, ball_data, phases, chunk_frames))
+    df1 = pd.concat([chunk[0] for chunk in chunks])
+    df2 = pd.concat([chunk[1] for chunk in chunks])
+    return df1, df2
+
+
+def save_metrica(df, ball_data, phases, path_1, path_2, chunk_frames=25 * 60 * 10):
+    """
+    converts the tracking data into the metrica format chunk by chunk and appends every chunk
+    to the parquet files in :param path_1 and :param path_2, such that long matches never have
+    to be held in memory in the wide format at once
+    """
+    writers = [None, None]
+    try:
+        for chunk in metrica_chunks(df, ball_data, phases, chunk_frames):
+            for i, path in enumerate([path_1, path_2]):
+                table = pa.Table.from_pandas(chunk[i])
+                if writers[i] is None:
+                    writers[i] = pq.ParquetWriter(path, table.schema)
+                writers[i].write_table(table)
+    finally:
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+
+
+if __name__ == '__main__':
+    path = 'data/tracab/Italy v Wales.xml'
+    tree = ET.parse(path).getroot()
+    match = Match_b(tree[0])
+
+
+    # Now convert to pandas and save
+
+    framedict_players = dict()
+    framedict_ball = dict()
+    savepath_pl = path_to_data + "tracking_players.parquet"
+    savepath_ph = path_to_data + "tracking_phases.parquet"
+    savepath_b = path_to_data + "tracking_ball.parquet"
+    i = 0
+    j = 0
+    utc = []
+    for index, frame in enumerate(match.frames):
+      utc.append(frame.attrib["utc"])
+
+      for id, obj in enumerate(frame[0]):
+        columns = dict()
+        columns['frame'] = index
+        if id == 0: #ball
+          for key, value in obj.attrib.items():
+            columns["ball_" + key] = int(value)
+          framedict_ball[j] = columns
+          j = j+1
+
+        else:
+          for key, value in obj.attrib.items():
+            columns["player_" + key] = int(value)
+          framedict_players[i] = columns
+          i = i+1
+
+    phases = dict()
+    for index, phase in enumerate(match.phases):
+        phases[index] =  phase.attrib
+
+    # timestamps of all frames, decoded at once instead of frame by frame
+    times = decodeUtc(utc).view('datetime64[ns]').astype('datetime64[us]')
+
+    df_ph = pd.DataFrame.from_dict(phases, orient='index')
+    # whole seconds, stored with the microsecond unit of python datetimes like before
+    df_ph['start'] = decodeUtc(df_ph['start']).view('datetime64[ns]').astype('datetime64[s]').astype('datetime64[us]')
+    df_ph['end'] = decodeUtc(df_ph['end']).view('datetime64[ns]').astype('datetime64[s]').astype('datetime64[us]')
+    df_ph.to_parquet(savepath_ph, index = False)
+
+    df_p = pd.DataFrame.from_dict(framedict_players, orient='index')
+    df_p.insert(0, 'time', times[df_p['frame'].values])
+    df_p.to_parquet(savepath_pl, index = False)
+
+    df_b = pd.DataFrame.from_dict(framedict_ball, orient='index')
+    df_b.insert(0, 'time', times[df_b['frame'].values])
+    df_b.to_parquet(savepath_b, index = False)
+
+
+    #load data
+    df = load_data_pandas('tracking_players.parquet')
+    ball_data = load_data_pandas('tracking_ball.parquet')
+    phases = load_data_pandas('tracking_phases.parquet')
+
+    # convert both teams & save files
+    save_metrica(df, ball_data, phases,
+                 path_to_data + "tracking_team1.parquet", path_to_data + "tracking_team2.parquet")
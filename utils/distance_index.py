@@ -0,0 +1,186 @@
+"""
+Prefix-sum index of the distance covered & minutes played by every player of a match.
+
+The kinematics of a match are computed once, the distance and minutes on the pitch of every player
+are summed up per second of playing time and stored as cumulative sums. The distance within any
+window [begin, end] (minutes of playing time) is then one subtraction per player:
+
+    dist[end] - dist[begin]
+
+The index is saved as a small .npz file next to the match so it is built only once.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# bump this whenever the content of the index changes, older files are rebuilt
+INDEX_VERSION = 3
+SUFFIX = '.distindex.npz'
+
+# the usual windows of the running reports, in the form expected by DistanceIndex.windows
+STANDARD_WINDOWS = {
+    'full': {},
+    'first': {'first': True},
+    'second': {'second': True},
+    'regtime': {'regtime': True},
+    'overtime': {'overtime': True},
+}
+
+
+def playing_time(kin, periods):
+    """
+    :return: seconds of playing time (the breaks don't count) at every frame of the kinematics.Kinematics
+    :param kin, measured from the start of every period of the period table :param periods (kin.frames refers
+    to its frames) - by summing up kin.dt if the periods are unknown
+    """
+    times = kin.times.values.astype('datetime64[ns]').astype(np.int64)
+    if not periods:
+        return np.cumsum(np.nan_to_num(kin.dt))
+    firsts = np.array([p['first_frame'] for p in periods])
+    starts = np.array([p['start'] for p in periods], dtype=np.int64)
+    durations = np.array([p['end'] - p['start'] for p in periods], dtype=np.int64)
+    elapsed = np.concatenate([[0], np.cumsum(durations)[:-1]])
+    period = np.maximum(np.searchsorted(firsts, kin.frames, side='right') - 1, 0)
+    return (elapsed[period] + np.clip(times - starts[period], 0, durations[period])) / 1e9
+
+
+class DistanceIndex:
+    """
+    Cumulative distance [km] and minutes on the pitch of every player, per bin of playing time.
+    @param players: the player ids of the columns
+    @param dist: (bins + 1) x players array, distance covered before the start of every bin
+    @param mins: (bins + 1) x players array, minutes on the pitch before the start of every bin
+    @param periods: dict period -> (first bin, last bin + 1)
+    @param resolution: length of a bin in seconds
+    """
+
+    def __init__(self, players, dist, mins, periods, resolution=1.0):
+        self.players = list(players)
+        self.dist = dist
+        self.mins = mins
+        self.periods = periods
+        self.resolution = resolution
+
+    @classmethod
+    def from_kinematics(cls, kin, periods=None, resolution=1.0):
+        """
+        builds the index from the kinematics.Kinematics of a whole match, the playing time is measured
+        from the start of every period if the periods are known, otherwise by summing up kin.dt
+        @param periods: the period table of the match (see periods.py), kin.frames refers to its frames
+        """
+        clock = playing_time(kin, periods)
+        step = np.maximum(np.diff(clock, prepend=0), 0)  # playing time since the previous frame
+        # a frame closes the interval since the previous one, bin k covers (k, k + 1] * resolution
+        bins = np.maximum(np.ceil(clock / resolution).astype(np.int64) - 1, 0)
+        n_bins = int(bins[-1]) + 1 if len(bins) else 0
+        n_players = len(kin.players)
+
+        cells = (bins[:, None] * n_players + np.arange(n_players)).ravel()
+        dist = np.bincount(cells, weights=np.nan_to_num(kin.dist).ravel(), minlength=n_bins * n_players)
+        mins = np.bincount(cells, weights=(kin.on_pitch * step[:, None] / 60).ravel(), minlength=n_bins * n_players)
+        cum_dist = np.zeros((n_bins + 1, n_players))
+        cum_mins = np.zeros((n_bins + 1, n_players))
+        np.cumsum(dist.reshape(n_bins, n_players), axis=0, out=cum_dist[1:])
+        np.cumsum(mins.reshape(n_bins, n_players), axis=0, out=cum_mins[1:])
+
+        period_bins = dict()
+        for period in periods or []:
+            first = np.searchsorted(kin.frames, period['first_frame'])
+            last = np.searchsorted(kin.frames, period['last_frame'], side='right')
+            if last > first:
+                period_bins[period['period']] = (int(np.floor(clock[first] / resolution)),
+                                                 int(np.ceil(clock[last - 1] / resolution)))
+        return cls(kin.players, cum_dist, cum_mins, period_bins, resolution)
+
+    def save(self, path):
+        periods = np.array([[p, first, last] for p, (first, last) in sorted(self.periods.items())],
+                           dtype=np.int64).reshape(-1, 3)
+        with open(path, 'wb') as f:  # np.savez would append .npz to the name otherwise
+            np.savez_compressed(f, version=INDEX_VERSION, players=np.array(self.players, dtype=str),
+                                dist=self.dist, mins=self.mins, periods=periods, resolution=self.resolution)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != INDEX_VERSION:
+                raise ValueError(f'{path} was written by another version of the index')
+            periods = {int(p): (int(first), int(last)) for p, first, last in data['periods']}
+            return cls(data['players'].tolist(), data['dist'], data['mins'], periods, float(data['resolution']))
+
+    @staticmethod
+    def is_current(path, source):
+        """
+        :return: True if the index in :param path exists, is up to date with the match file
+        :param source and was written by this version
+        """
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+            return False
+        with np.load(path) as data:
+            return int(data['version']) == INDEX_VERSION
+
+    def window(self, first=False, second=False, regtime=False, overtime=False, begin=0, end=150):
+        """
+        :return: (first bin, last bin + 1) of a time window, the options are the ones of running_reformat.prep_df
+        """
+        if first or second or regtime or overtime:
+            if first:
+                selected = [self.periods[p] for p in self.periods if p == 1]
+            elif second:
+                selected = [self.periods[p] for p in self.periods if p == 2]
+            elif regtime:
+                selected = [self.periods[p] for p in self.periods if p <= 2]
+            else:
+                selected = [self.periods[p] for p in self.periods if p > 2]
+            if not selected:
+                return 0, 0
+            return min(b[0] for b in selected), max(b[1] for b in selected)
+
+        if not 0 <= begin <= end:
+            raise ValueError('invalid time window')
+        n_bins = len(self.dist) - 1
+        return (min(int(round(begin * 60 / self.resolution)), n_bins),
+                min(int(round(end * 60 / self.resolution)), n_bins))
+
+    def minutes(self, first=False, second=False, regtime=False, overtime=False, begin=0, end=150):
+        """
+        :return: series player -> minutes on the pitch within the window
+        """
+        start, stop = self.window(first, second, regtime, overtime, begin, end)
+        return pd.Series(self.mins[stop] - self.mins[start], index=self.players)
+
+    def distances(self, first=False, second=False, regtime=False, overtime=False, begin=0, end=150, norm=False):
+        """
+        :return: series player -> distance covered [km] within the window, normalized over 90 minutes
+        if :param norm - NaN for players who were not on the pitch
+        """
+        start, stop = self.window(first, second, regtime, overtime, begin, end)
+        dist = self.dist[stop] - self.dist[start]
+        mins = self.mins[stop] - self.mins[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist = np.where(mins > 0, dist * 90 / mins if norm else dist, np.nan)
+        return pd.Series(dist, index=self.players)
+
+    def windows(self, windows, norm=False):
+        """
+        distances & minutes of all players in several windows at once
+        @param windows: dict window name -> the options of window() as a dict (e.g. {'first': True} or
+        {'begin': 39, 'end': 45}) or a (begin, end) tuple of minutes
+        @param norm: if True, the distances are normalized over 90 minutes
+        @return: dataframe indexed by (player, window) with the columns dist [km] and mins,
+        players who were not on the pitch during a window are left out of it
+        """
+        names = list(windows)
+        specs = [windows[name] if isinstance(windows[name], dict)
+                 else {'begin': windows[name][0], 'end': windows[name][1]} for name in names]
+        bounds = np.array([self.window(**spec) for spec in specs], dtype=np.int64).reshape(-1, 2)
+        dist = self.dist[bounds[:, 1]] - self.dist[bounds[:, 0]]
+        mins = self.mins[bounds[:, 1]] - self.mins[bounds[:, 0]]
+        if norm:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dist = dist * 90 / mins
+
+        played = mins.T.ravel() > 0
+        index = pd.MultiIndex.from_product([self.players, names], names=['player', 'window'])
+        df = pd.DataFrame({'dist': dist.T.ravel(), 'mins': mins.T.ravel()}, index=index)
+        return df[played]
@@ -0,0 +1,207 @@
+"""
+Columnar store for TRACAB tracking data.
+
+Instead of collecting a dict of columns per frame and letting pandas sort it out, the
+frames are written straight into preallocated NumPy arrays of shape frames x objects.
+The arrays grow in chunks while parsing, the DataFrame / Arrow table is only assembled
+once at the very end.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from match import decodeUtc, assignPhases
+
+# the attributes of a tracking object, in the order they appear in the TRACAB file
+FIELDS = ['type', 'id', 'x', 'y', 'sampling']
+
+BALL = 'ball'
+BALL_TYPE = 7
+
+
+class FrameStore:
+    """
+    Collects frames in a frames x objects layout.
+
+    Every object (the ball and every player who appeared) gets its own slot, i.e. a column
+    in each of the x, y, type and sampling arrays. Rows are added in chunks of
+    :param chunk frames, slots in chunks of :param slots.
+    """
+
+    def __init__(self, chunk=25 * 60 * 5, slots=32):
+        self.chunk = chunk
+        self.n_frames = 0
+        self.keys = []  # slot -> key of the object (its id, 'ball' for the ball)
+        self.obj_ids = []  # slot -> TRACAB id of the object
+        self.slot = dict()  # key -> slot
+        self.phase = None  # index of the match phase of every frame, set by keep_phases
+
+        self.time = np.empty(chunk, dtype=object)
+        self.ball_in_play = np.empty(chunk, dtype=object)
+        self.ball_possession = np.empty(chunk, dtype=object)
+
+        self.x = np.zeros((chunk, slots), dtype=np.int32)
+        self.y = np.zeros((chunk, slots), dtype=np.int32)
+        self.type = np.zeros((chunk, slots), dtype=np.int8)
+        self.sampling = np.zeros((chunk, slots), dtype=np.int8)
+        self.present = np.zeros((chunk, slots), dtype=bool)
+
+    @classmethod
+    def from_frames(cls, frames, **kwargs):
+        """
+        builds a store from an iterable of utils.match.Frame objects, e.g. a MatchStream
+        """
+        store = cls(**kwargs)
+        for frame in frames:
+            store.append(frame)
+        return store
+
+    def _grow_rows(self):
+        rows = self.time.shape[0] + self.chunk
+        for name in ['time', 'ball_in_play', 'ball_possession']:
+            old = getattr(self, name)
+            new = np.empty(rows, dtype=object)
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+        for name in ['x', 'y', 'type', 'sampling', 'present']:
+            old = getattr(self, name)
+            new = np.zeros((rows, old.shape[1]), dtype=old.dtype)
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+
+    def _grow_slots(self):
+        for name in ['x', 'y', 'type', 'sampling', 'present']:
+            old = getattr(self, name)
+            new = np.zeros((old.shape[0], max(1, 2 * old.shape[1])), dtype=old.dtype)
+            new[:, :old.shape[1]] = old
+            setattr(self, name, new)
+
+    def _get_slot(self, key, obj_id):
+        slot = self.slot.get(key)
+        if slot is None:
+            slot = len(self.keys)
+            if slot == self.x.shape[1]:
+                self._grow_slots()
+            self.slot[key] = slot
+            self.keys.append(key)
+            self.obj_ids.append(obj_id)
+        return slot
+
+    def append(self, frame):
+        """
+        writes a single utils.match.Frame into the next row of the store
+        """
+        row = self.n_frames
+        if row == self.time.shape[0]:
+            self._grow_rows()
+
+        self.time[row] = frame.time
+        self.ball_in_play[row] = frame.ballInPlay
+        self.ball_possession[row] = frame.ballPossession
+        for obj in frame.trackingObjs:
+            obj_id = int(obj.id)
+            slot = self._get_slot(BALL if obj.type == str(BALL_TYPE) else obj_id, obj_id)
+            self.x[row, slot] = obj.x
+            self.y[row, slot] = obj.y
+            self.type[row, slot] = int(obj.type)
+            self.sampling[row, slot] = int(obj.sampling)
+            self.present[row, slot] = True
+
+        self.n_frames += 1
+
+    def times_ns(self):
+        """
+        :return: the frame timestamps as int64 nanoseconds since the epoch (decoded in bulk)
+        """
+        return decodeUtc(self.time[:self.n_frames])
+
+    def times(self):
+        """
+        :return: the frame timestamps as a datetime64 array
+        """
+        return self.times_ns().view('datetime64[ns]')
+
+    def keep_phases(self, phases):
+        """
+        drops all frames which do not lie within one of the utils.match.Phase objects in
+        :param phases (e.g. before the kick-off or during the break) and remembers the phase
+        of every remaining frame in self.phase
+        """
+        phase = assignPhases(self.times_ns(), phases)
+        keep = np.flatnonzero(phase >= 0)
+
+        for name in ['time', 'ball_in_play', 'ball_possession', 'x', 'y', 'type', 'sampling', 'present']:
+            setattr(self, name, getattr(self, name)[keep])
+        self.phase = phase[keep].astype(np.int8)
+        self.n_frames = len(keep)
+
+        # objects which only showed up outside of the phases don't get any columns
+        used = np.flatnonzero(self.present[:, :len(self.keys)].any(axis=0))
+        if len(used) < len(self.keys):
+            for name in ['x', 'y', 'type', 'sampling', 'present']:
+                setattr(self, name, getattr(self, name)[:, used])
+            self.keys = [self.keys[i] for i in used]
+            self.obj_ids = [self.obj_ids[i] for i in used]
+            self.slot = {key: slot for slot, key in enumerate(self.keys)}
+
+    def ids(self):
+        """
+        :return: the TRACAB id of each slot (also for the ball)
+        """
+        return np.array(self.obj_ids, dtype=np.int64)
+
+    def _columns(self, prefix, frame_info):
+        """
+        yields (name, values, mask) for every column of the wide layout
+        mask is None if the column has no missing entries
+        """
+        n = self.n_frames
+        yield 'time', self.times(), None
+        if frame_info:
+            yield 'ball_possession', self.ball_possession[:n], None
+            yield 'ball_in_play', self.ball_in_play[:n], None
+
+        ids = self.ids()
+        for slot, key in enumerate(self.keys):
+            name = BALL if key == BALL else prefix + str(key)
+            present = self.present[:n, slot]
+            mask = None if present.all() else ~present
+            values = {
+                'type': self.type[:n, slot],
+                'id': np.full(n, ids[slot]),
+                'x': self.x[:n, slot],
+                'y': self.y[:n, slot],
+                'sampling': self.sampling[:n, slot],
+            }
+            for field in FIELDS:
+                yield name + '_' + field, values[field], mask
+
+    def to_dataframe(self, prefix='', frame_info=False):
+        """
+        assembles the wide dataframe with one column group <prefix><id>_<field> per object,
+        as produced by utils.tracking_df - entries of frames where an object was not on the
+        pitch are NaN
+        @param prefix: prefix of the player column names, e.g. 'player'
+        @param frame_info: if True, the ball_possession & ball_in_play columns are added
+        """
+        columns = dict()
+        for name, values, mask in self._columns(prefix, frame_info):
+            if values.dtype.kind in 'iu':
+                values = values.astype(np.int64)
+                if mask is not None:
+                    values = values.astype(np.float64)
+                    values[mask] = np.nan
+            columns[name] = values
+        return pd.DataFrame(columns)
+
+    def to_arrow(self, prefix='', frame_info=False):
+        """
+        same layout as to_dataframe, but as a pyarrow table with proper nulls
+        """
+        names, arrays = [], []
+        for name, values, mask in self._columns(prefix, frame_info):
+            if values.dtype.kind in 'iu':
+                values = values.astype(np.int64)
+            names.append(name)
+            arrays.append(pa.array(values, mask=mask))
+        return pa.Table.from_arrays(arrays, names=names)
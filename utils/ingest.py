@@ -0,0 +1,190 @@
+"""
+Batch ingest of TRACAB xml files into one partitioned tournament dataset.
+
+Every match is parsed in its own worker process and written in the long format of
+utils.tracking_schema as hive-style parquet partitions:
+
+    <out_dir>/tracking/match_id=<id>/period=<n>/part-0.parquet
+    <out_dir>/frames/match_id=<id>/period=<n>/part-0.parquet
+
+Alongside, manifest.json records the teams, date, frame count and phase boundaries of every
+ingested match. With --sidecar, the memory-mapped arrays of utils.tracking_mmap are written to
+<out_dir>/arrays/match_id=<id>/ as well, with --codec delta the coordinates are delta encoded
+(see utils.tracking_codec) which makes the archive a lot smaller.
+
+usage:
+    python utils/ingest.py data/tracab/ dataframes/ --processes 8
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+
+import multiprocess as mp
+import numpy as np
+
+from frame_store import FrameStore, BALL
+from match import MatchStream
+from tracking_mmap import write_sidecar
+from tracking_schema import write_long
+
+MANIFEST = 'manifest.json'
+TRACKING = 'tracking'
+FRAMES = 'frames'
+ARRAYS = 'arrays'
+
+
+def match_path(out_dir, match_id, table=TRACKING):
+    """
+    :return: the directory holding all partitions of a match in the :param table dataset
+    """
+    return os.path.join(out_dir, table, f'match_id={match_id}')
+
+
+def partition_path(out_dir, match_id, period, table=TRACKING):
+    """
+    :return: the directory holding one period of a match in the :param table dataset
+    """
+    return os.path.join(match_path(out_dir, match_id, table), f'period={period}')
+
+
+def ingest_match(path, out_dir, sidecar=False, codec=None):
+    """
+    converts a single TRACAB xml file and writes it into the dataset in :param out_dir
+    every period (= TRACAB phase) of the match gets its own partition, the frame numbering
+    runs through the whole match
+    @param path: path to the xml tracking file
+    @param out_dir: root directory of the dataset
+    @param sidecar: if True, the memory-mapped sidecar of the match is written as well
+    @param codec: None or 'delta' to delta encode the coordinates
+    @return: the manifest entry of the match (a dict)
+    """
+    match = MatchStream(path, removeExcess=False)
+    store = FrameStore.from_frames(match)
+    store.keep_phases(match.phases)
+
+    # drop the partitions of an earlier ingest of the same match
+    for table in [TRACKING, FRAMES, ARRAYS]:
+        shutil.rmtree(match_path(out_dir, match.matchID, table), ignore_errors=True)
+    if sidecar:
+        write_sidecar(store, match_path(out_dir, match.matchID, ARRAYS), match)
+
+    phases = []
+    for index, phase in enumerate(match.phases):
+        rows = np.flatnonzero(store.phase == index)
+        period = index + 1
+        if len(rows) == 0:
+            continue
+
+        paths = []
+        for table in [FRAMES, TRACKING]:
+            partition = partition_path(out_dir, match.matchID, period, table)
+            os.makedirs(partition, exist_ok=True)
+            paths.append(os.path.join(partition, 'part-0.parquet'))
+        # the rows of a phase are contiguous, the frames are ordered by time
+        write_long(store, paths[0], paths[1], slice(rows[0], rows[-1] + 1), codec)
+
+        phases.append({
+            'period': period,
+            'start': phase.start,
+            'end': phase.end,
+            'left_team': phase.leftTeamID,
+            'first_frame': int(rows[0]),
+            'last_frame': int(rows[-1]),
+            'frames': len(rows),
+        })
+
+    # players of each team, type 0 is the home team, type 1 the away team
+    teams = {0: [], 1: []}
+    for slot, key in enumerate(store.keys):
+        if key == BALL:
+            continue
+        present = store.present[:store.n_frames, slot]
+        team = int(store.type[:store.n_frames, slot][present][0])
+        if team in teams:
+            teams[team].append(int(key))
+
+    return {
+        'match_id': match.matchID,
+        'match_nr': match.matchNr,
+        'date': match.date,
+        'stadium': match.stadiumName,
+        'home_team': match.phases[0].leftTeamID,
+        'away_team': match.phases[1].leftTeamID,
+        'home_players': teams[0],
+        'away_players': teams[1],
+        'frames': store.n_frames,
+        'phases': phases,
+        'source': os.path.abspath(path),
+    }
+
+
+def _ingest_worker(args):
+    path, out_dir, sidecar, codec = args
+    try:
+        return ingest_match(path, out_dir, sidecar, codec)
+    except Exception as e:
+        return {'source': os.path.abspath(path), 'error': repr(e)}
+
+
+def read_manifest(out_dir):
+    """
+    :return: dict match_id -> manifest entry of all matches ingested into :param out_dir
+    """
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return dict()
+    with open(path) as f:
+        return {entry['match_id']: entry for entry in json.load(f)}
+
+
+def write_manifest(out_dir, entries):
+    """
+    writes the manifest entries (sorted by date) to :param out_dir, replacing the old manifest at once
+    """
+    path = os.path.join(out_dir, MANIFEST)
+    entries = sorted(entries, key=lambda entry: (entry['date'], entry['match_id']))
+    with open(path + '.tmp', 'w') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def ingest_folder(folder, out_dir, processes=None, sidecar=False, codec=None):
+    """
+    converts all TRACAB xml files in :param folder in a process pool and adds them to the
+    dataset in :param out_dir - matches which were already ingested are overwritten
+    @param folder: directory containing the xml tracking files
+    @param out_dir: root directory of the dataset
+    @param processes: number of worker processes, by default one per core
+    @param sidecar: if True, the memory-mapped sidecars are written as well
+    @param codec: None or 'delta' to delta encode the coordinates
+    @return: the manifest (dict match_id -> entry) of the whole dataset
+    """
+    paths = sorted(glob.glob(os.path.join(folder, '*.xml')))
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = read_manifest(out_dir)
+
+    processes = min(processes or mp.cpu_count(), max(len(paths), 1))
+    with mp.Pool(processes) as pool:
+        for entry in pool.imap_unordered(_ingest_worker, [(path, out_dir, sidecar, codec) for path in paths]):
+            if 'error' in entry:
+                print(f"Error: could not ingest {entry['source']}: {entry['error']}")
+                continue
+            manifest[entry['match_id']] = entry
+            print(f"ingested match {entry['match_id']} ({entry['frames']} frames)")
+
+    write_manifest(out_dir, manifest.values())
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='convert a folder of TRACAB xml files into a partitioned dataset')
+    parser.add_argument('folder', help='directory containing the xml tracking files')
+    parser.add_argument('out_dir', help='root directory of the dataset')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--sidecar', action='store_true', help='also write the memory-mapped frame arrays')
+    parser.add_argument('--codec', choices=['delta'], default=None, help='delta encode the coordinates')
+    args = parser.parse_args()
+
+    ingest_folder(args.folder, args.out_dir, args.processes, args.sidecar, args.codec)
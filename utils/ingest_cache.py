@@ -0,0 +1,242 @@
+"""
+Content-hash cache for tracking conversions.
+
+Parsing a TRACAB xml file takes minutes, so the converted dataframes (incl. their attrs such as
+match_id, home_team, away_team, player_map) are kept on disk. The key of an entry is the sha256
+of the source file's content together with the name and version of the converter, i.e. a
+renamed or copied file still hits the cache, an edited file or a changed converter does not.
+
+The cache is capped in size, the least recently used entries are evicted first.
+
+The attrs are stored as json which keeps the types of their keys & values (see encode_attrs): a dict with
+non-string keys such as the player_map {player id: name} comes back with its int keys, numpy scalars come
+back as python numbers. A conversion returns the same attrs on a hit and on a miss.
+"""
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# bump this whenever the output of the converters changes, old entries are ignored afterwards
+CONVERTER_VERSION = 3
+
+DEFAULT_DIRECTORY = os.environ.get('SOCCERANALYTICS_CACHE',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'socceranalytics'))
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+ATTRS_KEY = b'socceranalytics_attrs'
+INDEX = 'hashes.json'
+# tag of the json objects which hold a dict with non-string keys as a list of [key, value] pairs
+ITEMS = '__items__'
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    :return: sha256 hex digest of the content of :param path
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _encode(value):
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: _encode(v) for k, v in value.items()}
+        return {ITEMS: [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_encode(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {ITEMS}:
+            return {_decode(k): _decode(v) for k, v in value[ITEMS]}
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def encode_attrs(attrs):
+    """
+    :return: the json of the dataframe attrs :param attrs, dicts with non-string keys are stored as lists
+    of [key, value] pairs, values json doesn't know (e.g. timestamps) as strings
+    """
+    return json.dumps(_encode(attrs), default=str)
+
+
+def decode_attrs(text):
+    """
+    :return: the attrs encoded by encode_attrs
+    """
+    return _decode(json.loads(text))
+
+
+class IngestCache:
+    """
+    On-disk cache of converted tracking dataframes.
+    @param directory: where the entries are stored
+    @param max_bytes: size cap of all entries together
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    # hashing a whole match takes a moment as well, so the hash of every source file is
+    # remembered together with its size and modification time
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def _write_index(self, index):
+        path = os.path.join(self.directory, INDEX)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(path + '.tmp', path)
+
+    def source_hash(self, path):
+        """
+        :return: the content hash of :param path, only rehashed if the file changed
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        index = self._read_index()
+        entry = index.get(path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry['hash']
+
+        digest = file_hash(path)
+        index[path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest}
+        self._write_index(index)
+        return digest
+
+    def entry_path(self, path, converter, version=CONVERTER_VERSION):
+        """
+        :return: the file which holds (or would hold) the conversion of :param path by :param converter
+        """
+        return os.path.join(self.directory, f'{converter}-v{version}-{self.source_hash(path)}.parquet')
+
+    def get(self, path, converter, version=CONVERTER_VERSION):
+        """
+        :return: the cached dataframe (with its attrs) or None if there is no entry
+        """
+        entry = self.entry_path(path, converter, version)
+        if not os.path.exists(entry):
+            return None
+        table = pq.read_table(entry)
+        df = table.to_pandas()
+        metadata = table.schema.metadata or dict()
+        if ATTRS_KEY in metadata:
+            df.attrs = decode_attrs(metadata[ATTRS_KEY])
+        os.utime(entry)  # mark as recently used
+        return df
+
+    def put(self, path, converter, df, version=CONVERTER_VERSION):
+        """
+        stores the dataframe :param df as the conversion of :param path by :param converter
+        the attrs are stored as json, see encode_attrs
+        """
+        entry = self.entry_path(path, converter, version)
+        # the attrs are only stored in our own encoding, pyarrow's copy would lose their types
+        plain = df.copy(deep=False)
+        plain.attrs = dict()
+        table = pa.Table.from_pandas(plain)
+        metadata = dict(table.schema.metadata or dict())
+        metadata[ATTRS_KEY] = encode_attrs(df.attrs)
+        table = table.replace_schema_metadata(metadata)
+        pq.write_table(table, entry + '.tmp', compression='zstd')
+        os.replace(entry + '.tmp', entry)
+        self.evict()
+
+    def get_or_convert(self, path, converter, convert, version=CONVERTER_VERSION):
+        """
+        returns the cached conversion of :param path, runs convert(path) and caches the result on a miss -
+        its attrs are passed through the json encoding as well, so a miss returns the same attrs as a hit
+        """
+        df = self.get(path, converter, version)
+        if df is None:
+            df = convert(path)
+            self.put(path, converter, df, version)
+            df.attrs = decode_attrs(encode_attrs(df.attrs))
+        return df
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.parquet'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def size(self):
+        """
+        :return: size of all entries in bytes
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        removes the least recently used entries until the cache fits into max_bytes
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def invalidate(self, path=None, converter=None):
+        """
+        removes entries from the cache
+        @param path: source file whose entries are removed, by default the entries of all files
+        @param converter: only remove the entries of this converter, by default of all converters
+        """
+        digest = self.source_hash(path) if path is not None else None
+        for _, _, name in self._entries():
+            name_converter, _, name_hash = name[:-len('.parquet')].rsplit('-', 2)
+            if (digest is None or name_hash == digest) and (converter is None or name_converter == converter):
+                os.remove(os.path.join(self.directory, name))
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    :return: the cache in DEFAULT_DIRECTORY shared by all converters
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = IngestCache()
+    return _default_cache
+
+
+def cached(converter, version=CONVERTER_VERSION):
+    """
+    decorator for converters of the form f(path) -> dataframe, the result is looked up in the
+    default cache first. Pass use_cache=False to bypass the cache.
+    """
+    def decorator(convert):
+        @functools.wraps(convert)
+        def wrapper(path, use_cache=True):
+            if not use_cache:
+                return convert(path)
+            return default_cache().get_or_convert(path, converter, convert, version)
+        return wrapper
+    return decorator
@@ -0,0 +1,131 @@
+"""
+Vectorized kinematics for all players of a match at once.
+
+The positions are held in frames x players arrays (NaN where a player is not on the pitch),
+displacements, velocities, accelerations and distances are then computed column-wise in a
+single pass instead of slicing, filtering and joining a dataframe per player.
+"""
+import numpy as np
+import pandas as pd
+
+from smoothing import smooth
+
+# the quantities of every player, in the column order of running_reformat.prep_df
+ATTRS = ['dx', 'dy', 'mins', 'vx', 'vy', 'v', 'a', 'dist']
+
+
+def displacements(times, x, y):
+    """
+    differences between consecutive frames
+    @param times: datetime64 array of the frames
+    @param x: frames x players array of x coordinates in cm, NaN where a player is missing
+    @param y: frames x players array of y coordinates in cm
+    @return: (dt in seconds, dx, dy) - the first frame is NaN
+    """
+    times = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+    dt = np.full(len(times), np.nan)
+    dt[1:] = np.diff(times) / 1e9
+    dx = np.full(np.shape(x), np.nan)
+    dy = np.full(np.shape(y), np.nan)
+    dx[1:] = np.diff(x, axis=0)
+    dy[1:] = np.diff(y, axis=0)
+    return dt, dx, dy
+
+
+class Kinematics:
+    """
+    Smoothed displacement, velocity, acceleration and distance of every player.
+
+    All quantities are frames x players float arrays, NaN where a player was not on the pitch
+    or where the frame was filtered out (gap of more than max_dt seconds, implausible speed).
+    self.dt holds the seconds since the previous frame, NaN for frames after a gap, self.on_pitch
+    whether a player was tracked in a frame and the one before (regardless of the speed filters).
+    @param times: datetime64 array of the frames
+    @param dt: seconds since the previous frame (see displacements)
+    @param dx: frames x players displacement in x since the previous frame, in cm
+    @param dy: frames x players displacement in y
+    @param players: the player ids of the columns
+    @param window: time window of the filter applied to the displacements (median or savgol)
+    @param max_dt: frames after a longer gap (e.g. the break) are ignored
+    @param v_min: frames with a lower speed [m/s] are treated as standing still and ignored
+    @param v_max: frames with a higher speed [m/s] are treated as tracking errors and ignored
+    @param frames: the frame numbers of the rows within the match, by default 0, 1, ...
+    @param smoothing: name of the filter applied to the displacements, see smoothing.FILTERS
+    @param smoothing_params: further parameters of the filter (see smoothing.py)
+    """
+
+    def __init__(self, times, dt, dx, dy, players, window='2250ms', max_dt=5 * 60, v_min=0.05, v_max=12,
+                 frames=None, smoothing='median', smoothing_params=None):
+        self.times = pd.DatetimeIndex(times)
+        self.players = list(players)
+        self.frames = np.arange(len(self.times)) if frames is None else np.asarray(frames)
+        n_frames, n_players = len(self.times), len(self.players)
+        dt = np.asarray(dt, dtype=np.float64)
+
+        # the frames all players are computed on, the displacements are smoothed within this subset
+        rows = np.flatnonzero((0 < dt) & (dt < max_dt))
+        params = {'window': window} if smoothing in ('median', 'savgol') else dict()
+        params.update(smoothing_params or dict())
+        moves = smooth(np.hstack([dx[rows], dy[rows]]), self.times[rows], smoothing, **params)
+        sx, sy = moves[:, :n_players], moves[:, n_players:]
+        step = dt[rows, None]
+
+        vx = sx / step / 100
+        vy = sy / step / 100
+        v = np.sqrt(vx ** 2 + vy ** 2)
+        keep = (v > v_min) & (v < v_max)
+        v[~keep] = np.nan
+
+        # acceleration: change of the speed since the previous kept frame of the same player
+        previous = pd.DataFrame(v).ffill().shift().to_numpy()
+        a = (v - previous) / step
+
+        self.dt = np.full(n_frames, np.nan)
+        self.dt[rows] = dt[rows]
+        self.on_pitch = np.zeros((n_frames, n_players), dtype=bool)
+        self.on_pitch[rows] = ~np.isnan(dx[rows])
+        mins = np.cumsum(dt[rows]) / 60
+        values = {
+            'dx': sx,
+            'dy': sy,
+            'mins': np.broadcast_to(mins[:, None], sx.shape),
+            'vx': vx,
+            'vy': vy,
+            'v': v,
+            'a': a,
+            'dist': np.sqrt(sx ** 2 + sy ** 2) / 100000,
+        }
+        for attr in ATTRS:
+            full = np.full((n_frames, n_players), np.nan)
+            full[rows] = np.where(keep, values[attr], np.nan)
+            setattr(self, attr, full)
+
+    @classmethod
+    def from_positions(cls, times, x, y, players, **kwargs):
+        """
+        computes the kinematics from frames x players position arrays (in cm)
+        """
+        dt, dx, dy = displacements(times, x, y)
+        return cls(times, dt, dx, dy, players, **kwargs)
+
+    def to_wide(self, extra=None):
+        """
+        :return: dataframe indexed by time with the columns <player>_dx, <player>_dy, <player>_mins,
+        <player>_vx, <player>_vy, <player>_v, <player>_a, <player>_dist for every player
+        @param extra: dict name -> frames x players array of further quantities, added as <player>_<name>
+        """
+        extra = extra or dict()
+        attrs = ATTRS + list(extra)
+        values = np.stack([getattr(self, attr) for attr in ATTRS] + list(extra.values()), axis=-1)
+        columns = [f'{p}_{attr}' for p in self.players for attr in attrs]
+        return pd.DataFrame(values.reshape(len(self.times), len(columns)), index=self.times, columns=columns)
+
+    def to_tidy(self):
+        """
+        :return: dataframe with one row per player and kept frame, columns time, player and ATTRS
+        """
+        frame, col = np.nonzero(~np.isnan(self.v))
+        data = {'time': self.times[frame], 'player': np.asarray(self.players, dtype=object)[col]}
+        for attr in ATTRS:
+            data[attr] = getattr(self, attr)[frame, col]
+        return pd.DataFrame(data)
@@ -0,0 +1,134 @@
+"""
+Live-tail reader for a TRACAB xml file which is still being written (e.g. on matchdays).
+
+Instead of re-parsing the whole file with utils.match.Match on every refresh, MatchTail
+remembers how many bytes it has read and only parses what was appended since. The new
+frames are written into a utils.frame_store.FrameStore and every subscriber is called with
+the rows of the new frames, e.g. to update running metrics or formation windows.
+
+usage:
+    tail = MatchTail('data/tracab/live.xml')
+    tail.subscribe(lambda store, rows: print(store.times()[rows][-1]))
+    tail.follow(interval=1.0)
+"""
+import os
+import time
+import xml.etree.ElementTree as et
+
+from frame_store import FrameStore
+from match import Frame, MatchStream, phaseBounds
+
+
+class MatchTail(MatchStream):
+    """
+    Incremental reader of a growing TRACAB xml file.
+    The match, stadium and phase attributes of MatchStream are available once the header has
+    been written (see ready), all frames read so far are in self.store.
+    @param filePath: path to the xml file
+    @param removeExcess: skip the frames which do not lie within any phase - only use this if
+    the phases of the feed are complete, by default False
+    @param chunk: number of frames the store grows by
+    """
+
+    def __init__(self, filePath, removeExcess=False, chunk=25 * 60 * 5):
+        self.filePath = filePath
+        self.removeExcess = removeExcess
+        self._parser = et.XMLPullParser(events=('start', 'end'))
+        self._events = iter(())
+        self._depth = 0
+        self._children = 0
+        self._frames = None
+        self._bounds = None
+
+        self.phases = []
+        self.offset = 0  # number of bytes of the file parsed so far
+        self.finished = False  # True once the closing frames tag was read
+        self.store = FrameStore(chunk=chunk)
+        self._subscribers = []
+
+    @property
+    def ready(self):
+        """
+        True once the header (match, stadium and phases) was read
+        """
+        return self._bounds is not None
+
+    def subscribe(self, callback):
+        """
+        registers callback(store, rows), it's called after every poll which read new frames
+        with the FrameStore and the slice of its rows holding the new frames
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def poll(self):
+        """
+        parses everything appended to the file since the last call, incomplete frames at the end
+        of the file are kept by the parser until the rest of them was written
+        @return: number of new frames
+        """
+        if os.path.getsize(self.filePath) < self.offset:
+            raise ValueError(f'{self.filePath} shrank, the feed was restarted')
+        with open(self.filePath, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        if not data:
+            return 0
+        self.offset += len(data)
+        self._parser.feed(data)
+        events = self._parser.read_events()
+
+        if not self.ready:
+            # _readHeader stops at the start of the frames element or when the events run out,
+            # its depth counters carry over to the next poll
+            self._events = events
+            self._readHeader()
+            if self._frames is None:
+                return 0
+            self._bounds = phaseBounds(self.phases)
+
+        start = self.store.n_frames
+        self._readFrames(events)
+        stop = self.store.n_frames
+        if stop > start:
+            for callback in list(self._subscribers):
+                callback(self.store, slice(start, stop))
+        return stop - start
+
+    def _readFrames(self, events):
+        for event, elem in events:
+            if event == 'start':
+                self._depth += 1
+                continue
+
+            self._depth -= 1
+            if self._depth == 3:
+                frame = Frame(elem)
+                self._frames.clear()
+                if not self.removeExcess or self.inPhase(frame.time):
+                    self.store.append(frame)
+            elif self._depth == 2:
+                self.finished = True
+
+    def follow(self, interval=1.0, timeout=None):
+        """
+        polls the file until the match is finished
+        @param interval: seconds between two polls
+        @param timeout: stop after this many seconds without new data, by default never
+        @return: the FrameStore with all frames
+        """
+        idle = 0.0
+        while not self.finished:
+            offset = self.offset
+            self.poll()
+            if self.offset > offset:
+                idle = 0.0
+                continue
+            if timeout is not None and idle >= timeout:
+                break
+            time.sleep(interval)
+            idle += interval
+        return self.store
@@ -1,63 +1,396 @@
 #----------------------------------------------------------------------------
 # Created By: Danny Camenisch (dcamenisch)
 # Created Date: 10/03/2022
-# version ='1.1'
+# version ='1.4'
 # ---------------------------------------------------------------------------
-""" 
-Simple module to convert a xml file containing data in TRACAB format to a Match object
+"""
+Simple module to convert a xml file containing data in TRACAB format to a Match object.
+
+For long matches the frames can also be read lazily with MatchStream, which never holds
+more than a single frame of the xml tree in memory. Match(filePath, compact=True) keeps all
+tracking objects in one numpy structured array instead of millions of python objects.
 """
 # ---------------------------------------------------------------------------
 import xml.etree.ElementTree as et
 
-from utils.player import getPlayerInfos
+import numpy as np
 
 class Match:
-    def __init__(self, filePath):
-        match = et.parse(filePath).getroot()[0]
-
-        self.matchID      = int(match.attrib['id'])
-        self.matchNr      = int(match.attrib['matchNumber'])
-        self.date         = match.attrib['dateMatch']
-        self.stadiumID    = int(match[1].attrib['id'])
-        self.stadiumName  = match[1].attrib['name']
-        self.pitchLength  = int(match[1].attrib['pitchLength'])
-        self.pitchWidth   = int(match[1].attrib['pitchWidth'])
-        self.phases       = [Phase(phase) for phase in match[2]]
-        self.frames       = [Frame(frame) for frame in match[3]]
+    """All frames of a TRACAB xml file in memory.
+
+    Parameters
+    ----------
+    filePath : str
+        Path to the xml file
+    compact : bool, optional
+        Store the frames as CompactFrames (one structured array for all tracking objects),
+        the frames are then lightweight views with the same attributes, by default False
+    """
+    def __init__(self, filePath, compact=False):
+        stream = MatchStream(filePath, removeExcess=False)
+
+        self.matchID      = stream.matchID
+        self.matchNr      = stream.matchNr
+        self.date         = stream.date
+        self.stadiumID    = stream.stadiumID
+        self.stadiumName  = stream.stadiumName
+        self.pitchLength  = stream.pitchLength
+        self.pitchWidth   = stream.pitchWidth
+        self.phases       = stream.phases
+        self.frames       = CompactFrames.fromFrames(stream) if compact else list(stream)
+        self.times        = None  # utc of every frame in nanoseconds since the epoch
+        self.framePhases  = None  # index of the phase every frame belongs to
 
         self.removeExcessFrames()
-    
+
     def getPlayers(self, homeTeam):
+        # imported here, the player module scrapes the UEFA website on import
+        from utils.player import getPlayerInfos
         return getPlayerInfos(self.phases[0 if homeTeam else 0].leftTeamID)
 
     def removeExcessFrames(self):
-        keep = []
-        for frame in self.frames:
-            for phase in self.phases:
-                if frame.time >= phase.start and frame.time <= phase.end:
-                    keep.append(frame)
-                    break
+        compact = isinstance(self.frames, CompactFrames)
+        times = decodeUtc(self.frames.utc if compact else [frame.time for frame in self.frames])
+        phases = assignPhases(times, self.phases)
+        keep = np.flatnonzero(phases >= 0)
+
+        self.frames      = self.frames.select(keep) if compact else [self.frames[i] for i in keep]
+        self.times       = times[keep]
+        self.framePhases = phases[keep]
+
+
+class MatchStream:
+    """Read a TRACAB xml file frame by frame.
+
+    The match, stadium and phase information is parsed on construction, iterating over
+    the stream then yields the Frame objects one at a time. Every consumed xml element
+    is cleared right away, so memory stays flat no matter how long the match is.
+    A stream can only be iterated once.
+
+    Parameters
+    ----------
+    filePath : str
+        Path to the xml file
+    removeExcess : bool, optional
+        Skip the frames which do not lie within any phase, by default True
+    """
+    def __init__(self, filePath, removeExcess=True):
+        self.removeExcess = removeExcess
+        self._events      = et.iterparse(filePath, events=('start', 'end'))
+        self._depth       = 0
+        self._children    = 0
+        self._frames      = None
+
+        self.phases = []
+        self._readHeader()
+        self._bounds = phaseBounds(self.phases)
+
+    def __iter__(self):
+        return self.frames()
+
+    def _readHeader(self):
+        # the layout is positional like in Match: root[0] is the match, match[1] the stadium,
+        # match[2] the phases and match[3] the frames
+        for event, elem in self._events:
+            if event == 'start':
+                self._depth += 1
+                if self._depth == 2:
+                    self.matchID      = int(elem.attrib['id'])
+                    self.matchNr      = int(elem.attrib['matchNumber'])
+                    self.date         = elem.attrib['dateMatch']
+                elif self._depth == 3:
+                    self._children += 1
+                    if self._children == 2:
+                        self.stadiumID    = int(elem.attrib['id'])
+                        self.stadiumName  = elem.attrib['name']
+                        self.pitchLength  = int(elem.attrib['pitchLength'])
+                        self.pitchWidth   = int(elem.attrib['pitchWidth'])
+                    elif self._children == 4:
+                        self._frames = elem
+                        return
+            else:
+                if self._depth == 4 and self._children == 3:
+                    self.phases.append(Phase(elem))
+                self._depth -= 1
+
+    def frames(self):
+        """Yield the frames of the match in the order they are stored in the file."""
+        if self._frames is None:
+            return
+
+        for event, elem in self._events:
+            if event == 'start':
+                self._depth += 1
+                continue
+
+            self._depth -= 1
+            if self._depth == 3:
+                frame = Frame(elem)
+                # drop the consumed frame (and everything below it) from the tree
+                self._frames.clear()
+                if not self.removeExcess or self.inPhase(frame.time):
+                    yield frame
+            elif self._depth == 2:
+                break
 
-        self.frames = keep
+        self._frames = None
+
+    def inPhase(self, time):
+        starts, ends, _ = self._bounds
+        time = utcToNs(time)
+        i = np.searchsorted(starts, time, side='right') - 1
+        return i >= 0 and time <= ends[i]
 
 
 class Phase:
+    __slots__ = ('start', 'end', 'leftTeamID', 'startNs', 'endNs')
+
     def __init__(self, phase):
         self.start       = phase.attrib['start']
         self.end         = phase.attrib['end']
         self.leftTeamID  = int(phase.attrib['leftTeamID'])
-        
+        self.startNs     = utcToNs(self.start)
+        self.endNs       = utcToNs(self.end)
+
 class Frame:
+    __slots__ = ('time', 'ballInPlay', 'ballPossession', 'trackingObjs')
+
     def __init__(self, frame):
         self.time            = frame.attrib['utc']
         self.ballInPlay      = frame.attrib['isBallInPlay']
         self.ballPossession  = frame.attrib['ballPossession']
         self.trackingObjs    = [TrackingObj(obj) for obj in frame[0]]
-    
+
+    @classmethod
+    def fromValues(cls, time, ballInPlay, ballPossession, trackingObjs):
+        """Create a frame from already parsed values instead of a xml element."""
+        frame = cls.__new__(cls)
+        frame.time            = time
+        frame.ballInPlay      = ballInPlay
+        frame.ballPossession  = ballPossession
+        frame.trackingObjs    = trackingObjs
+        return frame
+
 class TrackingObj:
+    __slots__ = ('type', 'id', 'x', 'y', 'sampling')
+
     def __init__(self, obj):
         self.type      = obj.attrib['type']
         self.id        = obj.attrib['id']
         self.x         = int(obj.attrib['x'])
         self.y         = int(obj.attrib['y'])
-        self.sampling  = obj.attrib['sampling']
\ No newline at end of file
+        self.sampling  = obj.attrib['sampling']
+
+    @classmethod
+    def fromValues(cls, type, id, x, y, sampling):
+        """Create a tracking object from already parsed values instead of a xml element."""
+        obj = cls.__new__(cls)
+        obj.type      = str(type)
+        obj.id        = str(id)
+        obj.x         = int(x)
+        obj.y         = int(y)
+        obj.sampling  = str(sampling)
+        return obj
+
+
+# one record per tracking object of CompactFrames, 18 bytes instead of a python object per object
+TRACKING_DTYPE = np.dtype([
+    ('type', np.int8),
+    ('id', np.int64),
+    ('x', np.int32),
+    ('y', np.int32),
+    ('sampling', np.int8),
+])
+
+class CompactFrames:
+    """The frames of a match in a few numpy arrays.
+
+    The tracking objects of all frames are stored back to back in one structured array
+    (see TRACKING_DTYPE), offsets[i]:offsets[i + 1] are the objects of frame i. Indexing
+    and iterating return FrameView objects which offer the attributes of Frame, so code
+    like graphics.drawFrame works with both.
+
+    Attributes
+    ----------
+    utc : numpy.ndarray
+        utc attribute of every frame (bytes)
+    ballInPlay, ballPossession : numpy.ndarray
+        isBallInPlay and ballPossession attribute of every frame (bytes)
+    objects : numpy.ndarray
+        structured array of all tracking objects
+    offsets : numpy.ndarray
+        int64 array of length frames + 1, start of the objects of every frame
+    """
+    __slots__ = ('utc', 'ballInPlay', 'ballPossession', 'objects', 'offsets')
+
+    def __init__(self, utc, ballInPlay, ballPossession, objects, offsets):
+        self.utc             = utc
+        self.ballInPlay      = ballInPlay
+        self.ballPossession  = ballPossession
+        self.objects         = objects
+        self.offsets         = offsets
+
+    @classmethod
+    def fromFrames(cls, frames, chunk=7500):
+        """Collect an iterable of Frame objects (e.g. a MatchStream), only one chunk of
+        frames exists as python objects at a time."""
+        utc, ballInPlay, ballPossession, counts, parts = [], [], [], [], []
+        records = []
+        for frame in frames:
+            utc.append(frame.time)
+            ballInPlay.append(frame.ballInPlay)
+            ballPossession.append(frame.ballPossession)
+            counts.append(len(frame.trackingObjs))
+            records.extend((int(obj.type), int(obj.id), obj.x, obj.y, int(obj.sampling))
+                           for obj in frame.trackingObjs)
+            if len(counts) % chunk == 0:
+                parts.append(np.array(records, dtype=TRACKING_DTYPE))
+                records = []
+        parts.append(np.array(records, dtype=TRACKING_DTYPE))
+
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(np.array(utc, dtype=bytes), np.array(ballInPlay, dtype=bytes),
+                   np.array(ballPossession, dtype=bytes), np.concatenate(parts), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [FrameView(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('frame index out of range')
+        return FrameView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield FrameView(self, i)
+
+    def select(self, keep):
+        """Return a new CompactFrames with only the frames at the indices in keep (ordered)."""
+        keep = np.asarray(keep, dtype=np.int64)
+        counts = np.diff(self.offsets)[keep]
+        offsets = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # index of every kept object: the start of its frame plus its position within the frame
+        rows = np.repeat(self.offsets[keep] - offsets[:-1], counts) + np.arange(offsets[-1])
+        return CompactFrames(self.utc[keep], self.ballInPlay[keep], self.ballPossession[keep],
+                             self.objects[rows], offsets)
+
+class FrameView:
+    """A single frame of CompactFrames with the attributes of Frame."""
+    __slots__ = ('_frames', '_index')
+
+    def __init__(self, frames, index):
+        self._frames  = frames
+        self._index   = index
+
+    @property
+    def time(self):
+        return self._frames.utc[self._index].decode()
+
+    @property
+    def ballInPlay(self):
+        return self._frames.ballInPlay[self._index].decode()
+
+    @property
+    def ballPossession(self):
+        return self._frames.ballPossession[self._index].decode()
+
+    @property
+    def trackingObjs(self):
+        objects, offsets = self._frames.objects, self._frames.offsets
+        return [TrackingObjView(objects, i) for i in range(offsets[self._index], offsets[self._index + 1])]
+
+class TrackingObjView:
+    """A single record of CompactFrames.objects with the attributes (and types) of TrackingObj."""
+    __slots__ = ('_objects', '_index')
+
+    def __init__(self, objects, index):
+        self._objects  = objects
+        self._index    = index
+
+    @property
+    def type(self):
+        return str(self._objects['type'][self._index])
+
+    @property
+    def id(self):
+        return str(self._objects['id'][self._index])
+
+    @property
+    def x(self):
+        return int(self._objects['x'][self._index])
+
+    @property
+    def y(self):
+        return int(self._objects['y'][self._index])
+
+    @property
+    def sampling(self):
+        return str(self._objects['sampling'][self._index])
+
+
+def utcToNs(time):
+    """Convert a single TRACAB utc string (e.g. '2021-06-11T19:00:01.04Z') to nanoseconds since the epoch."""
+    return int(np.datetime64(time.rstrip('Z'), 'ns').astype(np.int64))
+
+def decodeUtc(times):
+    """Convert TRACAB utc strings to nanoseconds since the epoch, all at once.
+
+    Strings without milliseconds (which occur for some games) are handled as well.
+
+    Parameters
+    ----------
+    times : sequence of str
+        utc attributes of the frames
+
+    Returns
+    -------
+    numpy.ndarray
+        int64 array of nanoseconds since the epoch
+    """
+    times = np.asarray(times, dtype=str)
+    if times.size == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.char.rstrip(times, 'Z').astype('datetime64[ns]').astype(np.int64)
+
+def phaseBounds(phases):
+    """Sort the phases by their start.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        start and end of the sorted phases in nanoseconds and the original index of each phase
+    """
+    starts = np.array([phase.startNs for phase in phases], dtype=np.int64)
+    ends   = np.array([phase.endNs for phase in phases], dtype=np.int64)
+    order  = np.argsort(starts, kind='stable')
+    return starts[order], ends[order], order
+
+def assignPhases(times, phases):
+    """Find the phase each timestamp lies in with a single sorted search.
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        int64 nanoseconds since the epoch, e.g. from decodeUtc
+    phases : list of Phase
+        Phases of the match
+
+    Returns
+    -------
+    numpy.ndarray
+        index into phases for every timestamp, -1 if it lies outside of all phases
+    """
+    times = np.asarray(times, dtype=np.int64)
+    starts, ends, order = phaseBounds(phases)
+    if len(starts) == 0:
+        return np.full(times.shape, -1, dtype=np.int64)
+
+    i = np.searchsorted(starts, times, side='right') - 1
+    inside = (i >= 0) & (times <= ends[np.maximum(i, 0)])
+    return np.where(inside, order[np.maximum(i, 0)], -1)
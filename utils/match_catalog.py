@@ -0,0 +1,209 @@
+"""
+Catalog of the matches of a tournament: match_id -> file, teams, date and players.
+
+The catalog is built from the metadata the converters store with every match - the manifest.json of
+an ingested dataset (teams, date, players and periods of every match, see utils/ingest.py) and the
+attrs of the wide parquet dataframes (match_id, home_team, away_team, periods, see utils.convert_tracking).
+File names don't matter, a match is found by the ids of its teams.
+
+    catalog = MatchCatalog.build(manifest_dir='dataset/')                   # an ingested dataset
+    catalog = MatchCatalog.build('dataframes/')                             # converted dataframes
+    for entry in catalog.matches(team=66):
+        path = catalog.path(entry)
+
+The running modules work on the wide layout (<id>_x, <id>_y, <id>_sampling columns), for matches
+which are only in the ingested dataset, catalog.path exports it once to <dataset>/wide/.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from match import utcToNs
+from tracking_schema import read_frames, read_grid, HOME, AWAY
+
+CATALOG = 'catalog.json'
+MANIFEST = 'manifest.json'  # the manifest of utils/ingest.py
+TRACKING = 'tracking'  # the tables of the ingested dataset, see utils/ingest.py
+FRAMES = 'frames'
+WIDE = 'wide'
+PANDAS_ATTRS = b'PANDAS_ATTRS'
+
+
+def _attrs(path):
+    # the df.attrs of a parquet dataframe, without reading its data
+    try:
+        metadata = pq.read_schema(path).metadata or dict()
+    except Exception:
+        return None
+    if PANDAS_ATTRS not in metadata:
+        return None
+    return json.loads(metadata[PANDAS_ATTRS])
+
+
+def _date(periods):
+    # date of the kick-off from the period table (ns since the epoch)
+    if not periods:
+        return None
+    return str(np.datetime64(int(periods[0]['start']), 'ns').astype('datetime64[D]'))
+
+
+def _partition(dataset, table, match_id):
+    return os.path.join(dataset, table, f'match_id={match_id}')
+
+
+def export_wide(dataset, entry, path):
+    """
+    writes a match of an ingested dataset in the wide layout of utils.convert_tracking (time, <id>_x, <id>_y,
+    <id>_sampling for every player of both teams) with the attrs match_id, home_team, away_team & periods
+    @param dataset: root directory of the dataset
+    @param entry: the manifest entry of the match
+    @param path: the parquet file to write
+    """
+    match_id = entry['match_id']
+    frames = read_frames(_partition(dataset, FRAMES, match_id))
+    n_frames = int(frames['frame'].max()) + 1 if len(frames) else 0
+    players, x, y, sampling = read_grid(_partition(dataset, TRACKING, match_id), teams=(HOME, AWAY), n_frames=n_frames)
+
+    rows = frames['frame'].to_numpy()
+    columns = {'time': frames['time'].to_numpy()}
+    for i, p in enumerate(players):
+        columns[f'{p}_x'] = x[rows, i]
+        columns[f'{p}_y'] = y[rows, i]
+        columns[f'{p}_sampling'] = np.where(sampling[rows, i] == 255, np.nan, sampling[rows, i])
+    df = pd.DataFrame(columns)
+    df.attrs['match_id'] = match_id
+    df.attrs['home_team'] = entry['home_team']
+    df.attrs['away_team'] = entry['away_team']
+    df.attrs['periods'] = [{'period': p['period'], 'first_frame': p['first_frame'], 'last_frame': p['last_frame'],
+                            'start': utcToNs(p['start']), 'end': utcToNs(p['end'])} for p in entry['phases']]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+class MatchCatalog:
+    """
+    The matches of a tournament.
+    @param entries: dict match_id -> entry, an entry is a dict with the keys
+        match_id, path (the wide parquet dataframe, None if it's only in an ingested dataset),
+        dataset (root directory of the ingested dataset holding the match, or None),
+        home_team, away_team (team ids), date (YYYY-MM-DD or None),
+        home_players, away_players (lists of player ids, None if unknown)
+    """
+
+    def __init__(self, entries):
+        self.entries = dict(entries)
+
+    @classmethod
+    def build(cls, directory=None, manifest_dir=None, pattern='*'):
+        """
+        catalogs all matches in the manifest of the ingested dataset in :param manifest_dir and all parquet
+        dataframes in :param directory which carry the attrs of a converted match, other files (e.g. distance
+        indices) are skipped - a match in both is one entry
+        @param directory: directory of the dataframes
+        @param manifest_dir: root directory of an ingested dataset
+        @param pattern: glob pattern of the file names within :param directory
+        @return: a MatchCatalog
+        """
+        if directory is None and manifest_dir is None:
+            raise ValueError('pass the directory of the dataframes and/or of an ingested dataset')
+
+        entries = dict()
+        if manifest_dir is not None:
+            if not os.path.exists(os.path.join(manifest_dir, MANIFEST)):
+                raise FileNotFoundError(f'{manifest_dir} has no {MANIFEST}, see utils/ingest.py')
+            with open(os.path.join(manifest_dir, MANIFEST)) as f:
+                for ingested in json.load(f):
+                    match_id = str(ingested['match_id'])
+                    entries[match_id] = {
+                        'match_id': match_id,
+                        'path': None,
+                        'dataset': os.path.abspath(manifest_dir),
+                        'home_team': ingested['home_team'],
+                        'away_team': ingested['away_team'],
+                        'date': (ingested.get('date') or '')[:10] or None,
+                        'home_players': ingested.get('home_players'),
+                        'away_players': ingested.get('away_players'),
+                    }
+
+        for path in sorted(glob.glob(os.path.join(directory, pattern))) if directory is not None else []:
+            attrs = _attrs(path) if os.path.isfile(path) else None
+            if attrs is None or 'match_id' not in attrs:
+                continue
+            match_id = str(attrs['match_id'])
+            ingested = entries.get(match_id, dict())
+            entries[match_id] = {
+                'match_id': match_id,
+                'path': os.path.abspath(path),
+                'dataset': ingested.get('dataset'),
+                'home_team': attrs.get('home_team', ingested.get('home_team')),
+                'away_team': attrs.get('away_team', ingested.get('away_team')),
+                'date': ingested.get('date') or _date(attrs.get('periods')),
+                'home_players': ingested.get('home_players'),
+                'away_players': ingested.get('away_players'),
+            }
+        return cls(entries)
+
+    def path(self, entry):
+        """
+        :return: the wide parquet dataframe of the match :param entry, matches which are only in an ingested
+        dataset are exported to <dataset>/wide/match_id=<id>.parquet first (again if the manifest is newer)
+        """
+        if entry.get('path') is not None:
+            return entry['path']
+        dataset = entry['dataset']
+        path = os.path.join(dataset, WIDE, f"match_id={entry['match_id']}.parquet")
+        manifest = os.path.join(dataset, MANIFEST)
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(manifest):
+            with open(manifest) as f:
+                ingested = {str(e['match_id']): e for e in json.load(f)}[entry['match_id']]
+            export_wide(dataset, dict(ingested, match_id=entry['match_id']), path)
+        return path
+
+    def save(self, path):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(sorted(self.entries.values(), key=lambda e: (e['date'] or '', e['match_id'])), f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls({entry['match_id']: entry for entry in json.load(f)})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, match_id):
+        return self.entries[str(match_id)]
+
+    def matches(self, team=None):
+        """
+        :return: the entries of all matches (of the team with id :param team), ordered by date
+        raises a ValueError if the catalog has no match of :param team
+        """
+        entries = [e for e in self.entries.values()
+                   if team is None or str(team) in (str(e['home_team']), str(e['away_team']))]
+        if team is not None and not entries:
+            raise ValueError(f'the catalog has no matches of team {team}')
+        return sorted(entries, key=lambda e: (e['date'] or '', e['match_id']))
+
+    @staticmethod
+    def is_home(entry, team):
+        """
+        :return: True if the team with id :param team was the home team of the match :param entry
+        """
+        return str(entry['home_team']) == str(team)
+
+    @staticmethod
+    def label(entry, names=None):
+        """
+        :return: a label like 'ITA - WAL' (home - away) of the match :param entry
+        @param names: dict team id -> short name, by default the team ids are used
+        """
+        names = names or dict()
+        home, away = entry['home_team'], entry['away_team']
+        return f'{names.get(home, home)} - {names.get(away, away)}'
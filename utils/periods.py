@@ -0,0 +1,126 @@
+"""
+Period segmentation of a match (1st half, 2nd half, extra time), done once per match.
+
+A period table is a list of dicts, one per period:
+
+    {'period': 1, 'first_frame': 0, 'last_frame': 67512, 'start': <ns>, 'end': <ns>}
+
+first_frame/last_frame are the (inclusive) row indices of the period within the match's frames,
+start/end its wall-clock bounds in nanoseconds since the epoch - the TRACAB phase bounds if the
+phases are known, the first/last frame otherwise. The table is stored in df.attrs['periods'] by the
+converters (and thereby in the parquet files they write), time windows are then integer slices.
+"""
+import json
+
+import numpy as np
+import pyarrow.parquet as pq
+
+# without phases, gaps between two frames longer than this (in seconds) separate two periods
+BREAK_GAP = 4 * 60
+
+ATTRS_KEY = 'periods'
+PANDAS_ATTRS = b'PANDAS_ATTRS'
+
+
+def _ns(times):
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype('datetime64[ns]').astype(np.int64)
+    return times.astype(np.int64)
+
+
+def segment(times, phase=None, phases=None):
+    """
+    splits the frames of a match into periods
+    @param times: time of every frame (datetime64 or int64 nanoseconds), sorted
+    @param phase: index of the phase of every frame (e.g. FrameStore.phase), -1 outside of all phases -
+    without it, the periods are separated by gaps longer than BREAK_GAP
+    @param phases: the utils.match.Phase objects :param phase refers to, for the wall-clock bounds
+    @return: the period table
+    """
+    times = _ns(times)
+    periods = []
+    if phase is not None:
+        phase = np.asarray(phase)
+        for index in np.unique(phase[phase >= 0]):
+            rows = np.flatnonzero(phase == index)
+            start, end = int(times[rows[0]]), int(times[rows[-1]])
+            if phases is not None:
+                start, end = phases[index].startNs, phases[index].endNs
+            periods.append({'period': int(index) + 1, 'first_frame': int(rows[0]), 'last_frame': int(rows[-1]),
+                            'start': start, 'end': end})
+        return periods
+
+    if len(times) == 0:
+        return periods
+    firsts = np.concatenate([[0], np.flatnonzero(np.diff(times) > BREAK_GAP * 1e9) + 1])
+    lasts = np.append(firsts[1:] - 1, len(times) - 1)
+    for period, (first, last) in enumerate(zip(firsts, lasts)):
+        periods.append({'period': period + 1, 'first_frame': int(first), 'last_frame': int(last),
+                        'start': int(times[first]), 'end': int(times[last])})
+    return periods
+
+
+def read_periods(source):
+    """
+    :return: the period table of a tracking dataframe, parquet file or pyarrow table - read from its
+    attrs if it was stored by a converter, otherwise segmented from its time column
+    """
+    if hasattr(source, 'attrs'):  # a pandas dataframe
+        if ATTRS_KEY in source.attrs:
+            return source.attrs[ATTRS_KEY]
+        return segment(source['time'].values)
+
+    schema = source.schema if hasattr(source, 'schema') else pq.read_schema(source)
+    metadata = schema.metadata or dict()
+    if PANDAS_ATTRS in metadata:
+        attrs = json.loads(metadata[PANDAS_ATTRS])
+        if ATTRS_KEY in attrs:
+            return attrs[ATTRS_KEY]
+    times = source.column('time') if hasattr(source, 'column') else pq.read_table(source, columns=['time']).column('time')
+    return segment(times.to_numpy())
+
+
+def _minute_row(periods, times, minute, side):
+    # row of the frame at :param minute of playing time, the breaks don't count
+    elapsed = 0
+    for period in periods:
+        duration = (period['end'] - period['start']) / 6e10
+        if minute <= elapsed + duration:
+            first, last = period['first_frame'], period['last_frame'] + 1
+            time = period['start'] + (minute - elapsed) * 6e10
+            return first + int(np.searchsorted(times[first:last], time, side=side))
+        elapsed += duration
+    return periods[-1]['last_frame'] + 1 if periods else 0
+
+
+def window_rows(periods, times, first=False, second=False, regtime=False, overtime=False, begin=0, end=150):
+    """
+    translates a time window into a slice of frames
+    @param periods: the period table of the match
+    @param times: time of every frame (datetime64 or int64 nanoseconds)
+    @param first: the 1st half only
+    @param second: the 2nd half only
+    @param regtime: the regular time (both halves incl. stoppage time)
+    @param overtime: the extra time only, an empty slice if there was none
+    @param begin: otherwise the window starts at this minute of playing time (breaks don't count)...
+    @param end: ...and ends at this minute
+    @return: slice of the frames within the window
+    """
+    if first or second or regtime or overtime:
+        if first:
+            selected = [p for p in periods if p['period'] == 1]
+        elif second:
+            selected = [p for p in periods if p['period'] == 2]
+        elif regtime:
+            selected = [p for p in periods if p['period'] <= 2]
+        else:
+            selected = [p for p in periods if p['period'] > 2]
+        if not selected:
+            return slice(0, 0)
+        return slice(selected[0]['first_frame'], selected[-1]['last_frame'] + 1)
+
+    if not 0 <= begin <= end:
+        raise ValueError('invalid time window')
+    times = _ns(times)
+    return slice(_minute_row(periods, times, begin, 'left'), _minute_row(periods, times, end, 'right'))
@@ -0,0 +1,225 @@
+"""
+Memoization of the running computations (prep_df, distPlayer, ...).
+
+A result is keyed by the function, the identity of the match file (absolute path, size and modification
+time) and all other arguments (players, time window, filter settings). The results are kept in memory
+up to a byte budget, the least recently used ones are dropped first. With a directory, evicted and new
+results are pickled to disk as well (a second, larger tier, again capped in size), so they survive
+a restart of the notebook.
+
+    @memoized('prep_df')
+    def prep_df(players, path, ...):
+        ...
+
+    prep_df(players, path)                   # computed
+    prep_df(players, path)                   # returned from the cache
+    prep_df(players, path, use_cache=False)  # computed again
+"""
+import collections
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# bump this whenever the results of the memoized functions change, old disk entries are ignored afterwards
+RESULT_VERSION = 2
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+DEFAULT_DISK_MAX_BYTES = 4 * 1024 ** 3
+# set to a directory to enable the disk tier of the default cache
+DEFAULT_DIRECTORY = os.environ.get('SOCCERANALYTICS_RESULT_CACHE')
+
+
+def nbytes(value):
+    """
+    :return: (approximate) size of :param value in memory in bytes
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        size = value.memory_usage(deep=True)
+        return int(size.sum()) if isinstance(value, pd.DataFrame) else int(size)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(nbytes(k) + nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    return len(pickle.dumps(value))
+
+
+def file_identity(path):
+    """
+    :return: (absolute path, size, modification time in ns) of :param path
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _copy(value):
+    # the cached objects must not be changed by the callers
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray, dict, list)):
+        return value.copy()
+    return value
+
+
+class ResultCache:
+    """
+    Two-tier LRU cache of computation results.
+    @param max_bytes: budget of the results kept in memory
+    @param directory: where the disk tier is stored, None for a memory-only cache
+    @param disk_max_bytes: size cap of the disk tier
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=None, disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = collections.OrderedDict()  # key -> (value, size), least recently used first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(name, *parts):
+        """
+        :return: the key of the result of the function :param name for the arguments :param parts
+        """
+        return hashlib.sha256(repr((RESULT_VERSION, name) + parts).encode()).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        """
+        :return: (True, a copy of the result) if :param key is cached, (False, None) otherwise
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, _copy(self._entries[key][0])
+        if self.directory is not None and os.path.exists(self._disk_path(key)):
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+            else:
+                os.utime(self._disk_path(key))  # mark as recently used
+                self._remember(key, value)
+                self.hits += 1
+                return True, _copy(value)
+        self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        """
+        stores (a copy of) :param value under :param key, in memory and on disk
+        """
+        value = _copy(value)
+        self._remember(key, value)
+        if self.directory is not None:
+            path = self._disk_path(key)
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+            self._evict_disk()
+
+    def _remember(self, key, value):
+        size = nbytes(value)
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def _evict_disk(self):
+        # removes the least recently used files until the disk tier fits into disk_max_bytes
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def size(self):
+        """
+        :return: size of the results in memory in bytes
+        """
+        return self._bytes
+
+    def clear(self, disk=False):
+        """
+        drops all results from memory (and from the disk tier if :param disk)
+        """
+        self._entries.clear()
+        self._bytes = 0
+        if disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, name))
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    :return: the cache shared by all memoized functions of a process
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache(directory=DEFAULT_DIRECTORY)
+    return _default_cache
+
+
+def configure(max_bytes=DEFAULT_MAX_BYTES, directory=None, disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+    """
+    replaces the default cache, e.g. to change its budget or to enable the disk tier
+    @return: the new default cache
+    """
+    global _default_cache
+    _default_cache = ResultCache(max_bytes, directory, disk_max_bytes)
+    return _default_cache
+
+
+def memoized(name, path_arg='path'):
+    """
+    decorator memoizing a function in the default cache, the argument :param path_arg is the match file
+    whose identity (see file_identity) is part of the key. Pass use_cache=False to bypass the cache.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, use_cache=True, **kwargs):
+            if not use_cache:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            identity = file_identity(arguments.pop(path_arg))
+            key = ResultCache.key(name, identity, sorted((k, repr(v)) for k, v in arguments.items()))
+
+            cache = default_cache()
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -1,115 +1,200 @@
-from datetime import datetime
 import multiprocess as mp
+from multiprocess import shared_memory
 import numpy as np
 import pandas as pd
 import pyarrow.parquet as pa
-import scipy.signal as signal
 
-start_time = pd.Timestamp('1970-01-01 02:00:00')
+from periods import read_periods, window_rows
+from result_cache import memoized
+from smoothing import smooth
 
-# a global dictionary with entries of form: {'player.id':<distance covered>}
-# for all the players passed as list of ids to distTeam()/distPlayer() functions
-plrs = mp.Manager().dict()
 
-# global variables used across the file
-global table, normalized, start, stop
-normalized = False
-start = 0
-stop = 150
+class SharedMatch:
+    """
+    the coordinates of some players of a match in shared memory: the parent process reads the
+    parquet file once, the workers attach to the arrays by name instead of getting them pickled
 
+    Parameters
+    ----------
+    path: path to the dataframe file (in .parquet format, see distPlayer for the column names)
+    players: list of IDs of the players, players without columns in the file are left out
+
+    use it as a context manager, the shared memory is released on exit
+    """
 
-def distTeam(players, path, begin=0, end=150, norm=False):
+    def __init__(self, path, players):
+        names = pa.read_schema(path).names
+        self.players = [p for p in players if (str(p) + '_x') in names]
+        columns = [str(p) + suffix for p in self.players for suffix in ['_x', '_y', '_sampling']]
+        table = pa.read_table(path, columns=['time'] + columns)
+        self.periods = read_periods(table)
+        df = table.to_pandas()
+
+        arrays = {'time': df['time'].values.astype('datetime64[ns]').astype(np.int64)}
+        for suffix in ['x', 'y', 'sampling']:
+            arrays[suffix] = df[[str(p) + '_' + suffix for p in self.players]].to_numpy(dtype=np.float64)
+
+        self.times = arrays['time']
+        self._blocks = []
+        self._spec = dict()
+        for name, values in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+            self._blocks.append(block)
+            self._spec[name] = (block.name, values.shape, values.dtype.str)
+
+    def spec(self):
+        """
+        :return: dict array name -> (shared memory name, shape, dtype), all a worker needs to attach
+        """
+        return dict(self._spec)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _dist_worker(args):
+    # attaches to the shared arrays and computes the distance of the player in column i
+    spec, i, rows, norm = args
+    blocks = {name: shared_memory.SharedMemory(name=block) for name, (block, _, _) in spec.items()}
+    try:
+        arrays = {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+                  for name, (_, shape, dtype) in spec.items()}
+        time = arrays['time'][rows].view('datetime64[ns]').copy()
+        x, y, sampling = (arrays[name][rows, i].copy() for name in ['x', 'y', 'sampling'])
+        del arrays
+    finally:
+        for block in blocks.values():
+            block.close()
+    return playerDistance(time, x, y, sampling, norm)
+
+
+def distTeam(players, path, begin=0, end=150, norm=False, pool=None):
     """
     computes distance [in km rounded to 3 decimal places] covered by every Player p whose id
-    is passed in :param players by running :distPlayer(p.id) on it
-    and stores it in the global plrs dictionary
+    is passed in :param players
 
-    to speed things up, some concurrency is incorporated
+    the coordinates are read once and shared with the worker processes, every worker
+    computes the distance of one player at a time (see playerDistance)
     Parameters
     ----------
     players: list of IDs of the players
     path: path to the dataframe file (in .parquet format, assumes the column names match the necessary
     format seen in distPlayer function
-    begin: minute of the match where you start considering the distances covered
+    begin: minute of playing time (the breaks don't count) where you start considering the distances covered
     end: minute of the match after which you don't further consider the distances covered
     default values of begin and end result in considering the whole game
+    norm: if True, the distances are normalized over 90 minutes
+    pool: a multiprocess Pool to run the workers in, e.g. to reuse it for all games of a tournament -
+    by default a new pool is started for this call
     Returns
     -------
-    None - the function updates the global dictionary plrs with entries of
-    form {'p.id':<distance_covered_by_player_p>}
+    dict of form {p.id: <distance_covered_by_player_p>}, players who didn't play are left out
     """
     if begin >= end:
-        return
-    global table, normalized, start, stop
-    table = pa.read_table(path)
-    start = begin
-    stop = end
-    if norm:
-        normalized = True
-    plrs.clear()  # clear plrs, so that only data of players from one list is kept there at a time
-    with mp.Pool(mp.cpu_count()) as pool:
-        pool.map(distPlayer, players)
+        return dict()
 
-    # reset the global parameters to the default values
-    normalized = False
-    start = 0
-    stop = 150
+    with SharedMatch(path, players) as shared:
+        rows = matchWindow(shared.periods, shared.times, begin, end)
+        tasks = [(shared.spec(), i, rows, norm) for i in range(len(shared.players))]
+        if pool is None:
+            with mp.Pool(mp.cpu_count()) as pool:
+                distances = pool.map(_dist_worker, tasks)
+        else:
+            distances = pool.map(_dist_worker, tasks)
+    return dict(zip(shared.players, distances))
 
 
-def distPlayer(id):
+def distMatch(players, path, begin=0, end=150, norm=False):
     """
-    computes distance covered during the game by a single player
-    based on the reliable samplings
+    same as distTeam, but all players are computed in the calling process - e.g. in a worker of a pool
+    which goes over many games at once (see running_global.dists_team)
+    Returns
+    -------
+    dict of form {p.id: <distance_covered_by_player_p>}, players who didn't play are left out
+    """
+    if begin >= end:
+        return dict()
+
+    names = pa.read_schema(path).names
+    players = [p for p in players if (str(p) + '_x') in names]
+    columns = [str(p) + suffix for p in players for suffix in ['_x', '_y', '_sampling']]
+    table = pa.read_table(path, columns=['time'] + columns)
+    df = table.to_pandas()
+    time = df['time'].values.astype('datetime64[ns]')
+    rows = matchWindow(read_periods(table), time, begin, end)
+    return {p: playerDistance(time[rows], df[str(p) + '_x'].values[rows], df[str(p) + '_y'].values[rows],
+                              df[str(p) + '_sampling'].values[rows], norm) for p in players}
 
-    does some basic filtering of errors/weird results
+
+@memoized('distPlayer')
+def distPlayer(id, path, begin=0, end=150, norm=False):
+    """
+    computes distance covered during the game by a single player
+    based on the reliable samplings, the result is cached (see result_cache.py) - pass use_cache=False
+    to compute it again
 
     Parameters
     ----------
     id: id of a player, given by UEFA
+    path: path to the dataframe file (in .parquet format) with the columns time,
+    <id>_x, <id>_y and <id>_sampling
+    begin, end, norm: see distTeam
     Returns
     -------
-    distance covered by the player (in km). Based on the values of global parameters,
-    the result is taken within a certain time window and could also be normalized (over 90min)
-    the result is stored in plrs dictionary
+    distance covered by the player (in km), 0 if the player has no columns in the file
     """
-
-    if (str(id) + '_x') not in table.column_names:
+    if (str(id) + '_x') not in pa.read_schema(path).names:
         return 0
+    table = pa.read_table(path, columns=['time', str(id) + '_x', str(id) + '_y', str(id) + '_sampling'])
+    df = table.to_pandas()
+    rows = matchWindow(read_periods(table), df['time'].values, begin, end)
+    return playerDistance(df['time'].values[rows], df[str(id) + '_x'].values[rows], df[str(id) + '_y'].values[rows],
+                          df[str(id) + '_sampling'].values[rows], norm)
 
-    # pick the columns of the player & drop unreliable samplings
-    df = table.select(['time', str(id) + '_x', str(id) + '_y',
-                       str(id) + '_sampling', str(id) + '_type']).to_pandas()
-    df = df.loc[(df[str(id) + '_sampling'] != 2)]
 
-    # prepare the df for computations
-    dist_delta = pd.DataFrame({'dx': df[str(id) + '_x'].diff(),
-                               'dy': df[str(id) + '_y'].diff(),
-                               'dt': df['time'].diff().map(lambda x: x.total_seconds()),
-                               'time': df['time']})
+def matchWindow(periods, times, begin, end):
+    """
+    :return: slice of the frames from minute :param begin up to the end of minute :param end
+    of playing time (see periods.window_rows)
+    """
+    return window_rows(periods, times, begin=begin, end=end + 1)
 
-    # set the time window according to global parameters start and stop
-    scnd_half_start = df['time'].loc[df['time'].diff().map(lambda x: x.total_seconds()) > 14 * 60]
-    last_fst_half = df['time'].loc[df['time'] < scnd_half_start.iloc[0]].iloc[-1]
-    break_time = (scnd_half_start - last_fst_half).iloc[0].total_seconds() / 60
-    first_half_dur = (last_fst_half - dist_delta['time'].iloc[0]).total_seconds() / 60
-    second_half_dur = dist_delta['time'].iloc[-1] - scnd_half_start
-    global start, stop
-    if start > first_half_dur:
-        start += break_time
-    if stop > first_half_dur:
-        stop += break_time
-
-    start_match = dist_delta['time'].iloc[0] - start_time
-    end_match = dist_delta['time'].iloc[-1] - start_time
-    dist_delta = dist_delta.set_index('time')
 
-    window_begin = max(datetime.fromtimestamp(start_match.total_seconds() + 60 * start),
-                       datetime.fromtimestamp(start_match.total_seconds()))
+def playerDistance(time, x, y, sampling, norm=False):
+    """
+    computes distance covered from the coordinates of a single player
 
-    window_end = min(datetime.fromtimestamp(start_match.total_seconds() + 60 * (stop + 1)),
-                     datetime.fromtimestamp(end_match.total_seconds()))
-    dist_delta = dist_delta.loc[((dist_delta.index - window_begin).total_seconds() / 60 >= 0)
-                                & ((window_end - dist_delta.index).total_seconds() / 60 > 0)]
+    does some basic filtering of errors/weird results
+
+    Parameters
+    ----------
+    time: datetime64 array of the frames within the time window (see matchWindow)
+    x, y: coordinates of the player in every frame (NaN if the player was not on the pitch)
+    sampling: TRACAB sampling flags of the player, frames with sampling 2 are not reliable
+    norm: if True, the distance is normalized over 90 minutes
+    Returns
+    -------
+    distance covered by the player (in km) within the given frames, could also be normalized (over 90min)
+    """
+    df = pd.DataFrame({'time': time, 'x': x, 'y': y, 'sampling': sampling})
+    df = df.loc[(df['sampling'] != 2)]
+
+    # prepare the df for computations
+    dist_delta = pd.DataFrame({'dx': df['x'].diff(),
+                               'dy': df['y'].diff(),
+                               'dt': df['time'].diff().dt.total_seconds(),
+                               'time': df['time']})
+    dist_delta = dist_delta.set_index('time')
 
     # add velocity vectors for each timestamp
     dist_delta['vx'] = dist_delta['dx'] / dist_delta['dt'] / 100
@@ -121,15 +206,13 @@ def distPlayer(id):
                                 & (np.sqrt(dist_delta['vx'] ** 2 + dist_delta['vy'] ** 2) > 0.05)]
 
     # smooth out the results - if the results are not satisfying, one can play around with the
-    # sizes of the moving windows of the filters
+    # sizes of the moving windows of the filters (or pick another filter, see smoothing.py)
     #
     # distances smoothed using rolling median (moving time window of size 2.8s)
     # velocities smoothed using Savitzky-Golay filter (of linear order, window of size 25 entries ~ 1s)
-    dist_delta['dx'] = dist_delta['dx'].rolling('2800ms').median()
-    dist_delta['dy'] = dist_delta['dy'].rolling('2800ms').median()
-    if not pd.isnull(dist_delta['vx']).all():
-        dist_delta['vx'] = signal.savgol_filter(dist_delta['vx'], 25, 1)
-        dist_delta['vy'] = signal.savgol_filter(dist_delta['vy'], 25, 1)
+    dist_delta[['dx', 'dy']] = smooth(dist_delta[['dx', 'dy']].to_numpy(), dist_delta.index, 'median',
+                                      window='2800ms')
+    dist_delta[['vx', 'vy']] = smooth(dist_delta[['vx', 'vy']].to_numpy(), dist_delta.index, 'savgol', window=25)
 
     # total velocity & acceleration
     # cumulative distance covered & cumulative minutes played (counting from 'start' parameter)
@@ -141,13 +224,9 @@ def distPlayer(id):
     distance = dist_delta['c_dist'].max()
     mins_played = dist_delta['mins'].max()
 
-    if normalized:
+    if norm:
         distance = round(distance * 90 / mins_played, 3)
     else:
         distance = round(distance, 3)
 
-    plrs[id] = distance
-
     return distance
-
-
@@ -1,22 +1,30 @@
-import glob
 from player import *
 from running import *
+from match_catalog import MatchCatalog
 
 
-def dists_team(team, players, norm=False, start=0, end=150, save=False, path=None):
+def _match_worker(args):
+    # distances of the players in one game, the games of a team are spread over the workers
+    players, path, start, end, norm = args
+    return distMatch(players, path, start, end, norm)
+
+
+def dists_team(team, players, catalog, norm=False, start=0, end=150, save=False, path=None, names=None):
     """
-    goes over all dataframes in the directory and for each filename incl. param: team in its' name computes
+    goes over all games of param: team in the match catalog and for each game computes
     the distances covered for each player from param: players
     Parameters
     ----------
-    team: name of the team; e.x. "italy" - make sure that all the dataframe files for the games of your team are of
-            format "<opponent_team>vteam" or "teamv<opponent_team> !!!
+    team: UEFA's teamID of the team, e.x. 66 for italy
     players: a list of player ids
+    catalog: the match_catalog.MatchCatalog of the tournament, the games are found by the ids of their teams
     norm: if True, the resulting dataframe contains normalized distances (over 90 min) - by default False (computes
             total distances)
     start: minute of the match where you start considering the distances covered
     end: minute of the match after which you don't further consider the distances covered
     default values of start and end result in considering the whole game
+    the games are computed in parallel, one game per worker process
+    names: dict team id -> short name for the labels of the games (e.x. {66: 'ITA'}), by default the ids are used
     Returns
     -------
     a dataframe with player ids as indices, game as columns and distances as entries. A sample how it's structured:
@@ -30,28 +38,25 @@ def dists_team(team, players, norm=False, start=0, end=150, save=False, path=Non
     250012942      9.332      9.796      9.155      9.216
     ...
     """
-    directory = '/home/igor/PycharmProjects/socceranalytics/dataframes/'
-    df = pd.DataFrame({'id': players}).set_index('id')
-    for filename in glob.iglob(f'{directory}*'):
-        if team.lower() in filename.lower():
-            isHome = (filename[len(directory):len(directory + team)] == team)
+    entries = catalog.matches(team)
+    # games only in an ingested dataset are exported (once) in the parent, before the workers start
+    paths = [catalog.path(entry) for entry in entries]
+    with mp.Pool(min(mp.cpu_count(), len(paths))) as pool:
+        results = pool.map(_match_worker, [(players, p, start, end, norm) for p in paths])
 
-            distTeam(players, filename, start, end, norm)
-            if isHome:
-                label = team[0:3].upper() + ' - ' + filename[(len(directory) + len(team) + 1):(len(directory) + len(team) + 4)].upper()
-            else:
-                label = filename[(len(directory)):(len(directory) + 3)].upper() + ' - ' + team[0:3].upper()
-
-            temp = pd.DataFrame.from_dict(plrs, orient='index', columns={label})
-            df = df.join(temp)
+    df = pd.DataFrame({'id': players}).set_index('id')
+    for entry, dists in zip(entries, results):
+        temp = pd.DataFrame.from_dict(dists, orient='index', columns=[catalog.label(entry, names)])
+        df = df.join(temp)
     if save:
-        path += team
+        path += str(team)
         if norm:
             path += 'Norm'
         df.to_parquet(path + '.parquet', index=True)
     return df
 
 
+# catalog = MatchCatalog.build('/home/igor/PycharmProjects/socceranalytics/dataframes/')
 # italy = getPlayerInfos(66)
 # ids_it = []
 # names = {}
@@ -60,8 +65,8 @@ def dists_team(team, players, norm=False, start=0, end=150, save=False, path=Non
 #     names[player.id] = player.name
 #
 # print('Italy:')
-# print(dists_team('italy', ids_it, True))
-# print(dists_team('italy', ids_it, False))
+# print(dists_team(66, ids_it, catalog, True))
+# print(dists_team(66, ids_it, catalog, False))
 #
 # wales = getPlayerInfos(144)
 # ids_wal = []
@@ -71,8 +76,8 @@ def dists_team(team, players, norm=False, start=0, end=150, save=False, path=Non
 #     names[player.id] = player.name
 #
 # print('Wales')
-# print(dists_team('wales', ids_wal, True))
-# print(dists_team('wales', ids_wal, False))
+# print(dists_team(144, ids_wal, catalog, True))
+# print(dists_team(144, ids_wal, catalog, False))
 #
 
 # poland = getPlayerInfos(109)
@@ -83,4 +88,4 @@ def dists_team(team, players, norm=False, start=0, end=150, save=False, path=Non
 #     names[player.id] = player.name
 #
 #
-# print(dists_team('poland', ids_pl, True, 0, 130))
\ No newline at end of file
+# print(dists_team(109, ids_pl, catalog, True, 0, 130))
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+High-intensity running metrics on top of kinematics.Kinematics.
+
+Everything is computed on the frames x players arrays of a match at once: distances per speed
+zone via one weighted bincount, sprints and accelerations via run-length detection on the
+boolean threshold masks, peak intensities via prefix sums and a sorted search of the window starts.
+
+The metabolic power follows the energy cost model of di Prampero et al. (2005) and Osgnach et al. (2010):
+accelerated running on flat ground costs the same as running uphill at constant speed on the
+equivalent slope ES = a / g, its cost per metre is a polynomial of ES scaled by the equivalent body
+mass EM = sqrt((a / g)^2 + 1).
+"""
+import numpy as np
+import pandas as pd
+
+# lower bounds of the speed zones in m/s, the last zone is open-ended
+SPEED_ZONES = {
+    'walking': 0.0,
+    'jogging': 2.0,
+    'running': 4.0,
+    'high_speed': 5.5,
+    'sprinting': 7.0,
+}
+
+SPRINT_SPEED = 7.0  # m/s
+SPRINT_DURATION = 1.0  # s
+ACCELERATION = 3.0  # m/s^2
+ACCELERATION_DURATION = 0.5  # s
+PEAK_MINUTES = (1, 5)
+
+GRAVITY = 9.81  # m/s^2
+TERRAIN = 1.29  # energy cost factor of running on grass compared to a treadmill
+FLAT_COST = 3.6  # J/kg/m, energy cost of running at constant speed on flat ground
+MAX_SLOPE = 0.45  # the energy cost polynomial is only fitted up to this equivalent slope
+
+
+def energy_cost(a):
+    """
+    :return: energy cost of running [J/kg/m] at the acceleration :param a [m/s^2], element-wise
+    """
+    es = np.clip(a / GRAVITY, -MAX_SLOPE, MAX_SLOPE)
+    em = np.sqrt(es ** 2 + 1)
+    return (155.4 * es ** 5 - 30.4 * es ** 4 - 43.3 * es ** 3 + 46.3 * es ** 2 + 19.5 * es + FLAT_COST) * em * TERRAIN
+
+
+def metabolic_power(kin):
+    """
+    metabolic power & mechanical load of every player in every frame
+    @param kin: kinematics.Kinematics
+    @return: dict name -> frames x players array, NaN where kin.v is NaN:
+        power (metabolic power in W/kg), energy (J/kg spent since the previous frame),
+        eq_dist (equivalent distance in m, the distance at constant speed costing the same energy),
+        acc_load (absolute change of the speed since the previous frame in m/s)
+    """
+    a = np.where(np.isnan(kin.v), np.nan, np.nan_to_num(kin.a))
+    power = energy_cost(a) * kin.v
+    energy = power * kin.dt[:, None]
+    return {
+        'power': power,
+        'energy': energy,
+        'eq_dist': energy / (FLAT_COST * TERRAIN),
+        'acc_load': np.abs(a) * kin.dt[:, None],
+    }
+
+
+def load_per_minute(kin):
+    """
+    metabolic & mechanical load of every player per minute of playing time (counted from the start of
+    the kinematics, gaps longer than its max_dt don't count)
+    @param kin: kinematics.Kinematics
+    @return: dataframe indexed by (player, minute) with the columns
+        secs (seconds of kept frames), energy (J/kg), power (mean metabolic power in W/kg),
+        eq_dist (m), acc_load (m/s) - minutes without kept frames of a player are left out
+    """
+    loads = metabolic_power(kin)
+    minute = (np.cumsum(np.nan_to_num(kin.dt)) // 60).astype(np.int64)
+    n_minutes = int(minute[-1]) + 1 if len(minute) else 0
+    n_players = len(kin.players)
+
+    frame, player = np.nonzero(~np.isnan(kin.v))
+    cells = player * n_minutes + minute[frame]
+    sums = {'secs': np.bincount(cells, weights=kin.dt[frame], minlength=n_players * n_minutes)}
+    for name in ['energy', 'eq_dist', 'acc_load']:
+        sums[name] = np.bincount(cells, weights=loads[name][frame, player], minlength=n_players * n_minutes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sums['power'] = sums['energy'] / sums['secs']
+
+    index = pd.MultiIndex.from_product([kin.players, range(n_minutes)], names=['player', 'minute'])
+    df = pd.DataFrame(sums, index=index)[['secs', 'energy', 'power', 'eq_dist', 'acc_load']]
+    return df[df['secs'] > 0]
+
+
+def runs(mask):
+    """
+    run-length detection on every column of a boolean array
+    @param mask: frames x players boolean array
+    @return: (player, start, stop) - column, first frame and frame after the last frame of every run
+    of True values, ordered by player and start
+    """
+    padded = np.zeros((mask.shape[0] + 2, mask.shape[1]), dtype=np.int8)
+    padded[1:-1] = mask
+    edges = np.diff(padded, axis=0).T
+    player, start = np.nonzero(edges == 1)
+    _, stop = np.nonzero(edges == -1)
+    return player, start, stop
+
+
+def _prefix(values):
+    # prefix sums along the frames, NaN counts as 0: sum of rows start:stop = p[stop] - p[start]
+    prefix = np.zeros((values.shape[0] + 1,) + values.shape[1:])
+    np.cumsum(np.nan_to_num(values), axis=0, out=prefix[1:])
+    return prefix
+
+
+def zone_distances(kin, zones=SPEED_ZONES):
+    """
+    :return: players x zones array of the distance [km] covered within every speed zone
+    """
+    bounds = np.array(list(zones.values()))
+    valid = ~np.isnan(kin.v)
+    frame, player = np.nonzero(valid)
+    zone = np.searchsorted(bounds, kin.v[valid], side='right') - 1
+    inside = zone >= 0
+    n_players = len(kin.players)
+    sums = np.bincount(zone[inside] * n_players + player[inside], weights=kin.dist[valid][inside],
+                       minlength=len(bounds) * n_players)
+    return sums.reshape(len(bounds), n_players).T
+
+
+def threshold_runs(kin, mask, min_duration):
+    """
+    runs of frames where :param mask holds, lasting at least :param min_duration seconds
+    @return: (player, start, stop, duration in s, distance in km) of every run
+    """
+    player, start, stop = runs(mask)
+    dt = _prefix(kin.dt)
+    duration = dt[stop] - dt[start]
+    dist = _prefix(kin.dist)
+    distance = dist[stop, player] - dist[start, player]
+    keep = duration >= min_duration
+    return player[keep], start[keep], stop[keep], duration[keep], distance[keep]
+
+
+def peak_intensity(kin, minutes):
+    """
+    :return: the highest distance covered within any :param minutes long time window for every player, in m/min
+    """
+    times = kin.times.values.astype('datetime64[ns]').astype(np.int64)
+    dist = _prefix(kin.dist)
+    first = np.searchsorted(times, times - int(minutes * 6e10), side='right')
+    window = dist[1:] - dist[first]
+    if len(window) == 0:
+        return np.zeros(len(kin.players))
+    return window.max(axis=0) * 1000 / minutes
+
+
+def running_profile(kin, zones=SPEED_ZONES, sprint_speed=SPRINT_SPEED, sprint_duration=SPRINT_DURATION,
+                    acceleration=ACCELERATION, acceleration_duration=ACCELERATION_DURATION,
+                    peak_minutes=PEAK_MINUTES):
+    """
+    summarizes the running performance of every player in :param kin
+    @param kin: the kinematics.Kinematics of a match (or a time window of it)
+    @param zones: dict zone name -> lower speed bound in m/s
+    @param sprint_speed: a sprint is a run above this speed [m/s]...
+    @param sprint_duration: ...lasting at least this many seconds
+    @param acceleration: accelerations/decelerations are runs above/below +-this value [m/s^2]...
+    @param acceleration_duration: ...lasting at least this many seconds
+    @param peak_minutes: lengths of the windows of the peak intensities in minutes
+    @return: a dataframe indexed by player with the columns
+        dist (total distance in km), dist_<zone> (distance in km per speed zone),
+        sprints (count), sprint_time (s), sprint_dist (km), accels, decels (counts),
+        peak_<n>min (highest distance covered within n minutes, in m/min),
+        energy (J/kg), eq_dist (equivalent distance in km), acc_load (m/s), see metabolic_power
+    """
+    n_players = len(kin.players)
+    df = pd.DataFrame(index=pd.Index(kin.players, name='player'))
+    df['dist'] = np.nansum(kin.dist, axis=0)
+    for name, dist in zip(zones, zone_distances(kin, zones).T):
+        df['dist_' + name] = dist
+
+    with np.errstate(invalid='ignore'):
+        sprint_mask = kin.v >= sprint_speed
+        accel_mask = kin.a >= acceleration
+        decel_mask = kin.a <= -acceleration
+    player, _, _, duration, distance = threshold_runs(kin, sprint_mask, sprint_duration)
+    df['sprints'] = np.bincount(player, minlength=n_players)
+    df['sprint_time'] = np.bincount(player, weights=duration, minlength=n_players)
+    df['sprint_dist'] = np.bincount(player, weights=distance, minlength=n_players)
+    df['accels'] = np.bincount(threshold_runs(kin, accel_mask, acceleration_duration)[0], minlength=n_players)
+    df['decels'] = np.bincount(threshold_runs(kin, decel_mask, acceleration_duration)[0], minlength=n_players)
+
+    for minutes in peak_minutes:
+        df[f'peak_{minutes}min'] = peak_intensity(kin, minutes)
+
+    loads = metabolic_power(kin)
+    df['energy'] = np.nansum(loads['energy'], axis=0)
+    df['eq_dist'] = np.nansum(loads['eq_dist'], axis=0) / 1000
+    df['acc_load'] = np.nansum(loads['acc_load'], axis=0)
+    return df
@@ -1,22 +1,104 @@
 import math
+import os
 import sys
-from datetime import datetime
 import numpy as np
 import pandas as pd
 import pyarrow.parquet as pa
 import glob
 from matplotlib import pyplot as plt
+import multiprocess as mp
 
 from player import *
-
-start_time = pd.Timestamp('1970-01-01 02:00:00')
-
+from kinematics import Kinematics, displacements
+from cleaning import clean
+from periods import read_periods, window_rows
+from running_metrics import running_profile, metabolic_power, load_per_minute
+from distance_index import DistanceIndex, SUFFIX, STANDARD_WINDOWS, playing_time
+from match_catalog import MatchCatalog
+from result_cache import memoized
 
 # this module is supposed to replace both running.py and running_global.py
 # it will be more efficient & offer some more functionality
 
 
-def prep_df(players, path, first=False, second=False, regtime=False, overtime=False, begin=0, end=150):
+def _read_positions(players, path, max_gap=None):
+    # reads & cleans the coordinates of the players (see cleaning.py), players without columns are left out
+    # @return: (period table, times, players, x, y, quality summary)
+    names = pa.read_schema(path).names
+    players = [p for p in players if (str(p) + '_x') in names]
+    table = pa.read_table(path, columns=['time'] + [str(p) + c for p in players for c in ['_x', '_y', '_sampling']])
+    df_init = table.to_pandas()
+    times = df_init['time'].values
+    x, y, summary = clean(times, df_init[[str(p) + '_x' for p in players]].to_numpy(dtype=np.float64),
+                          df_init[[str(p) + '_y' for p in players]].to_numpy(dtype=np.float64),
+                          df_init[[str(p) + '_sampling' for p in players]].to_numpy(dtype=np.float64),
+                          players, max_gap)
+    return read_periods(table), times, players, x, y, summary
+
+
+def match_kinematics(players, path, first=False, second=False, regtime=False, overtime=False, begin=0, end=150,
+                     smoothing='median', smoothing_params=None, max_gap=None):
+    """
+    computes the smoothed displacements, velocities, accelerations & distances of the players of a single game
+    within the given time window, all players at once (see kinematics.py)
+    @param players, path, first, second, regtime, overtime, begin, end, smoothing, smoothing_params, max_gap:
+    see prep_df
+    @return: a kinematics.Kinematics object, players without data within the window are left out
+    """
+    # prepare the base for calculating the distances, velocities & accelerations
+    # of the players from the 'raw' dataframe of the whole game - the unreliable samplings
+    # are masked for the affected player only
+    periods, times, players, x, y, _ = _read_positions(players, path, max_gap)
+
+    # the time window as a slice of frames, based on the periods of the match (see periods.py)
+    window = window_rows(periods, times, first, second, regtime, overtime, begin, end)
+
+    # compute the differences of all coordinates at once
+    dt, dx, dy = displacements(times, x, y)
+    rows = np.arange(len(times))[window]
+
+    # players without any data within the window are left out
+    present = ~np.isnan(dx[rows]).all(axis=0)
+    players = [p for p, pres in zip(players, present) if pres]
+
+    # distances, velocities, accelerations of all players in one pass
+    return Kinematics(times[rows], dt[rows], dx[rows][:, present], dy[rows][:, present], players,
+                      frames=rows, smoothing=smoothing, smoothing_params=smoothing_params)
+
+
+def match_quality(players, path, max_gap=None):
+    """
+    tracking data quality of the players of a single game
+    @param players: a list of player ids of the players you're interested in
+    @param path: a path to the parquet dataframe with 'raw' tracking data for every player
+    @param max_gap: see prep_df
+    @return: a dataframe indexed by player with the frames tracked, unreliable, interpolated & valid after
+    the cleaning (see cleaning.quality_summary)
+    """
+    return _read_positions(players, path, max_gap)[-1]
+
+
+def distance_index(path, rebuild=False):
+    """
+    the prefix-sum distance index of all players of a single game (see distance_index.py), built on first use
+    and saved next to the dataframe file
+    @param path: a path to the parquet dataframe with 'raw' tracking data for every player
+    @param rebuild: build the index again even if it's up to date
+    @return: a DistanceIndex
+    """
+    index_path = path + SUFFIX
+    if not rebuild and DistanceIndex.is_current(index_path, path):
+        return DistanceIndex.load(index_path)
+
+    players = [col[:-len('_x')] for col in pa.read_schema(path).names if col.endswith('_x') and 'ball' not in col]
+    index = DistanceIndex.from_kinematics(match_kinematics(players, path, end=math.inf), read_periods(path))
+    index.save(index_path)
+    return index
+
+
+@memoized('prep_df')
+def prep_df(players, path, first=False, second=False, regtime=False, overtime=False, begin=0, end=150,
+            smoothing='median', smoothing_params=None, load=False, max_gap=None):
     """
     The function prepares a dataframe containing distances, velocities, accelerations of every player from a single game,
     within the given time window
@@ -27,208 +109,211 @@ def prep_df(players, path, first=False, second=False, regtime=False, overtime=Fa
     @param regtime: a bool var -> if True, the considered time window is the regular (+incl. stoppage) time only
      (by default set to False)
     @param overtime: a bool var -> if True, the considered time window is the overtime only (by default set to False)
-    @param begin: a minute where your start window begins
+    @param begin: a minute where your start window begins (minutes of playing time, the breaks don't count)
     @param end: a minute where your start window ends
+    @param smoothing: the filter applied to the displacements - 'median' (default), 'savgol' or 'kalman'
+    (see smoothing.py)
+    @param smoothing_params: a dict of further parameters of the filter, e.g. {'window': '1s'}
+    @param max_gap: unreliable samplings are replaced for the affected player only, by interpolating between
+    their reliable samples around them - if max_gap is given, all other gaps of at most max_gap seconds in the
+    coordinates of a player are interpolated as well (see cleaning.py)
+    @param load: if True, the metabolic power & mechanical load of every frame are added as the columns
+    <playerID>_power, <playerID>_energy, <playerID>_eq_dist, <playerID>_acc_load (see running_metrics.metabolic_power)
+    the result is cached (see result_cache.py), pass use_cache=False to compute it again
     @return: a dataframe with columns of form ['106737_dx', '106737_dy', '106737_mins', '106737_vx', '106737_vy',
        '106737_v', '106737_a', '106737_dist'...] (<playerID>_<attr>)
     """
-    # prepare the base for calculating the distances, velocities & accelerations
-    # of the players from the 'raw' dataframe of the whole game
-    table = pa.read_table(path)
-    df_init = table.select(['time'] + [col for col in table.column_names if ('ball' not in col) and
-                                       (('_x' in col) or ('_y' in col) or ('_sampling' in col))]).to_pandas()
-    samplings = [col for col in table.column_names if ('ball' not in col) and ('_sampling' in col)]
-    for col in samplings:
-        df_init = df_init.loc[df_init[col] != 2]  # remove all unreliable samplings
-
-    # drop the sampling columns(not needed anymore)
-    # & compute the differences for each column
-    df_init = df_init.drop(samplings, axis=1).diff()
-    df_init.rename(columns={'time': 'dt'}, inplace=True)
-    df_init['dt'] = df_init['dt'].map(lambda x: x.total_seconds())
-    df_init['time'] = table.select(['time']).to_pandas()  # we'll need the original 'time' column for the future
-
-    # match the column names of the dataframe with the players we're focusing on
-    coords = list(map((lambda x: x + '_x'), players)) + list(map((lambda x: x + '_y'), players))
-    teamCoords = list(set(coords) & set(df_init.columns))  # list of the column names of the players we're interested in
-    df = df_init[['time', 'dt'] + teamCoords]
-
-    # do some magic with the time objects in order to obtain the right time window
-
-    # start and end match timestamps
-    start_match = df['time'].iloc[0] - start_time
-    end_match = df['time'].iloc[-1] - start_time
-
-    # first recorded frame of the 2nd half & last recorded frame of the 1st half
-    scnd_first_frame = df['time'].loc[df['time'].diff().map(lambda x: x.total_seconds()) > 14 * 60]
-    fst_last_frame = df['time'].loc[df['time'] < scnd_first_frame.iloc[0]].iloc[-1]
-
-    # duration of the break & 1st half
-    break_dur = (scnd_first_frame - fst_last_frame).iloc[0].total_seconds()
-    fst_dur = (fst_last_frame - df['time'].iloc[0]).total_seconds()
-
-    # distinguish whether there was an overtime in the game or not and get info about the 2nd half based on that
-    # (+potentially about the overtime as well)
-    # Note that it might not work correctly if there were some longer interruptions during the game.
-    # In our case (Italy, Wales), everything worked fine
-    if (((end_match - start_match).total_seconds() - break_dur) / 60) < 120:
-        scnd_dur = (end_match - start_match).total_seconds() - fst_dur - break_dur
-    else:
-        ot_first_frame = df['time'].loc[(df['time'].diff().map(lambda x: x.total_seconds()) < 14 * 60)
-                                        & (df['time'].diff().map(lambda x: x.total_seconds()) > 4 * 60)]
-
-        scnd_last_frame = df['time'].loc[df['time'] < ot_first_frame.iloc[0]].iloc[-1]
-        scnd_dur = (scnd_last_frame - scnd_first_frame.iloc[0]).total_seconds()
-
-    # start of the 2nd half timestamp
-    start_scnd = scnd_first_frame.iloc[0] - start_time
-
-    # consider the passed parameters
-    if first:
-        start = start_match.total_seconds()
-        stop = start_match.total_seconds() + fst_dur
-    elif second:
-        start = start_scnd.total_seconds()
-        stop = start_match.total_seconds() + fst_dur + scnd_dur + break_dur
-    elif regtime:
-        start = start_match.total_seconds()
-        stop = start_match.total_seconds() + fst_dur + scnd_dur + break_dur
-    elif overtime:
-        if (((end_match - start_match).total_seconds() - break_dur) / 60) < 120:
-            start = -1
-            stop = -1 # the game had no overtime
-        else:
-            # start of the overtime timestamp
-            start_ot = (ot_first_frame - start_time).iloc[0]
-            start = start_ot.total_seconds()
-            stop = end_match.total_seconds()
-    else:  # apply your custom time window
-        if not 0 <= begin <= end:
-            raise ValueError('invalid time window')
-
-        # potentially 'shift' the window by the duration of the break to make up
-        # for the 'time hole' in the dataframe caused by the break between the two halves
-        if begin > fst_dur / 60:
-            begin += break_dur / 60
-        if end > fst_dur / 60:
-            end += break_dur / 60
-
-        start = begin * 60 + start_match.total_seconds()
-        stop = end * 60 + start_match.total_seconds()
-
-    # set the time window
-    window_begin = datetime.fromtimestamp(start)
-    window_end = datetime.fromtimestamp(stop)
-    df = df.set_index('time')
-    df = df.loc[((df.index - window_begin).total_seconds() >= 0)
-                & ((window_end - df.index).total_seconds() >= 0)].dropna(axis=1, how='all')
-
-    combined = pd.DataFrame(index=df.index)
-
-    # compute distances, velocities, accelerations for each player & join the resulting dfs together
-    for p in players:
-        if (p + '_x') in df.columns:
-            df_p = df.loc[(0 < df['dt']) & (df['dt'] < 5 * 60), [(p + '_x'), (p + '_y')]]
-            df_p = df_p.rolling('2250ms').median()
-            df_p['dt'] = df['dt']
-            df_p[p + '_mins'] = df_p['dt'].cumsum() / 60
-
-            df_p[p + '_vx'] = df_p[(p + '_x')] / df_p['dt'] / 100
-            df_p[p + '_vy'] = df_p[(p + '_y')] / df_p['dt'] / 100
-
-            df_p = df_p.loc[(np.sqrt(df_p[p + '_vx'] ** 2 + df_p[p + '_vy'] ** 2) < 12)
-                            & (np.sqrt(df_p[p + '_vx'] ** 2 + df_p[p + '_vy'] ** 2) > 0.05)]
-
-            df_p[p + '_v'] = np.sqrt(df_p[p + '_vx'] ** 2 + df_p[p + '_vy'] ** 2)
-            df_p[p + '_a'] = df_p[p + '_v'].diff() / df_p['dt']
-            df_p[p + '_dist'] = np.sqrt(df_p[p + '_x'] ** 2 + df_p[p + '_y'] ** 2) / 100000
-
-            df_p.rename(columns={(p + '_x'): (p + '_dx'), (p + '_y'): (p + '_dy')}, inplace=True)
-            combined = combined.join(df_p.drop(['dt'], axis=1))
+    kin = match_kinematics(players, path, first, second, regtime, overtime, begin, end, smoothing, smoothing_params,
+                           max_gap)
+    combined = kin.to_wide(metabolic_power(kin) if load else None)
+    combined.index.name = 'time'
 
     return combined
 
 
+def _profile_worker(args):
+    path, players, window, kwargs = args
+    return running_profile(match_kinematics(players, path, **window), **kwargs)
+
+
+def profile_matches(paths, players, processes=None, first=False, second=False, regtime=False, overtime=False,
+                    begin=0, end=150, **kwargs):
+    """
+    speed zones, sprints, accelerations & peak intensities (see running_metrics.running_profile)
+    of the players in several games, every game is processed by its own worker
+    @param paths: list of paths to the parquet dataframes with 'raw' tracking data (see prep_df)
+    @param players: a list of player ids of the players you're interested in (e.g. of both teams)
+    @param processes: number of worker processes, by default one per core
+    @param first, second, regtime, overtime, begin, end: the time window, see prep_df
+    @param kwargs: thresholds passed on to running_metrics.running_profile
+    @return: a dataframe indexed by (match, player), the match is the file name without extension
+    """
+    window = {'first': first, 'second': second, 'regtime': regtime, 'overtime': overtime, 'begin': begin, 'end': end}
+    tasks = [(path, players, window, kwargs) for path in paths]
+    processes = min(processes or mp.cpu_count(), max(len(paths), 1))
+    with mp.Pool(processes) as pool:
+        profiles = pool.map(_profile_worker, tasks)
+    labels = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if not profiles:
+        return pd.DataFrame()
+    return pd.concat(profiles, keys=labels, names=['match', 'player'])
+
+
+def _load_worker(args):
+    path, players, window = args
+    return load_per_minute(match_kinematics(players, path, **window))
+
+
+def load_matches(paths, players, processes=None, first=False, second=False, regtime=False, overtime=False,
+                 begin=0, end=150):
+    """
+    metabolic power, equivalent distance & acceleration load per minute (see running_metrics.load_per_minute)
+    of the players in several games, every game is processed by its own worker
+    @param paths, players, processes, first, second, regtime, overtime, begin, end: see profile_matches
+    @return: a dataframe indexed by (match, player, minute), the minutes are counted from the start of the window
+    """
+    window = {'first': first, 'second': second, 'regtime': regtime, 'overtime': overtime, 'begin': begin, 'end': end}
+    tasks = [(path, players, window) for path in paths]
+    processes = min(processes or mp.cpu_count(), max(len(paths), 1))
+    with mp.Pool(processes) as pool:
+        loads = pool.map(_load_worker, tasks)
+    labels = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if not loads:
+        return pd.DataFrame()
+    return pd.concat(loads, keys=labels, names=['match', 'player', 'minute'])
+
+
+def _index_worker(path):
+    distance_index(path)
+
+
+def distsWindows(paths, players, windows=STANDARD_WINDOWS, norm=False, processes=None):
+    """
+    distances covered by the players in several games and several time windows at once
+    every game is only processed once (see distance_index), all windows are answered from its index
+    @param paths: list of paths to the parquet dataframes with 'raw' tracking data (see prep_df)
+    @param players: list of player ids you're interested in
+    @param windows: dict window name -> window, e.g.
+        {'1st': {'first': True}, 'before_goal': (0, 39), 'after_goal': {'begin': 39, 'end': 45}}
+        see distance_index.DistanceIndex.windows, by default the full game, halves, regular & extra time
+    @param norm: if True, the distances are normalized over 90 minutes
+    @param processes: number of processes building the indices of games which haven't been processed yet
+    @return: a dataframe indexed by (player, match, window) with the columns dist [km] and mins,
+    the match is the file name without extension
+    """
+    missing = [path for path in paths if not DistanceIndex.is_current(path + SUFFIX, path)]
+    if len(missing) > 1:
+        with mp.Pool(min(processes or mp.cpu_count(), len(missing))) as pool:
+            pool.map(_index_worker, missing)
+
+    players = [str(p) for p in players]
+    frames = []
+    for path in paths:
+        df = distance_index(path).windows(windows, norm)
+        df = df[df.index.get_level_values('player').isin(players)]
+        frames.append(df.assign(match=os.path.splitext(os.path.basename(path))[0]))
+    if not frames:
+        return pd.DataFrame(columns=['dist', 'mins'])
+    df = pd.concat(frames).set_index('match', append=True)
+    return df.reorder_levels(['player', 'match', 'window']).sort_index()
+
+
 #  & return
-def distsTournament(team, players, first=False, second=False, regtime=False, overtime=False, begin=0, end=150, norm=False, save=False, path=""):
+def distsTournament(team, players, catalog, first=False, second=False, regtime=False, overtime=False, begin=0, end=150,
+                    norm=False, save=False, path="", names=None, processes=None):
     """
     go over all team's games during the tournament and compute distances covered by every player in the team
-    @param team: name of the team
+    @param team: UEFA's teamID of the team
     @param players: list of player ids of the team you're interested in
+    @param catalog: the match_catalog.MatchCatalog of the tournament
     @param first, second, regtime, overtime, begin, end: choose the period of the games you're interested in
     @param save: set to True if you want to store the dataframe
+    @param names: dict team id -> short name for the labels of the games (e.g. {66: 'ITA'}), by default the ids
+    @param processes: number of processes building the indices of games which haven't been processed yet
     @return: a df which contains distances covered by every team member in each game
     """
-    pass
-    directory = '/home/igor/PycharmProjects/socceranalytics/dataframes/'
+    entries = catalog.matches(team)
+    paths = [catalog.path(entry) for entry in entries]
+    # the kinematics of a game are only computed once (in parallel), every window is a lookup in its index
+    missing = [p for p in paths if not DistanceIndex.is_current(p + SUFFIX, p)]
+    if len(missing) > 1:
+        with mp.Pool(min(processes or mp.cpu_count(), len(missing))) as pool:
+            pool.map(_index_worker, missing)
+
+    # the index knows the players by the str ids of the columns, the result keeps the ids of :param players
+    ids = {str(p): p for p in players}
     df = pd.DataFrame({'id': players}).set_index('id')
-    for filename in glob.iglob(f'{directory}*'):
-        if team.lower() in filename.lower():
-            temp = prep_df(players, filename, first, second, regtime, overtime, begin, end)
-
-            dists = [col for col in temp.columns if 'dist' in col]
-            mins = [col for col in temp.columns if 'mins' in col]
-
-            isHome = (filename[len(directory):len(directory + team)] == team)
-            if isHome:
-                label = team[0:3].upper() + ' - ' + filename[(len(directory) + len(team) + 1):(
-                            len(directory) + len(team) + 4)].upper()
-            else:
-                label = filename[(len(directory)):(len(directory) + 3)].upper() + ' - ' + team[0:3].upper()
-
-            temp2 = pd.DataFrame(temp[dists].sum(), columns={label})
-            temp2.index = temp2.index.map(lambda x: x.strip('_dist'))
-            if norm:
-                temp3 = temp[mins].max() - temp[mins].min()
-                temp3.index = temp3.index.map(lambda x: x.strip('_mins'))
-                temp2 = temp2.div(temp3, axis=0) * 90
-            df = df.join(temp2)
+    for entry, filename in zip(entries, paths):
+        dists = distance_index(filename).distances(first, second, regtime, overtime, begin, end, norm)
+        dists = dists[dists.index.isin(list(ids))].rename(index=ids)
+        temp2 = pd.DataFrame({catalog.label(entry, names): dists})
+        df = df.join(temp2)
     if save:
         df.to_parquet(path, index=True)
     return df
 
 
-def minToMin(playersA, playersB, match_path):
+def minToMin(playersA, playersB, match_path, resolution=1):
     """
     minute by minute distance covered comparison of two teams (based on the whole game)
+    the kinematics of both teams are computed in one pass, the distances of every frame are then binned
+    into minutes of playing time (the breaks don't count, see distance_index.playing_time)
     @param playersA: a list of home team's players' ids
     @param playersB: a list of away team's players' ids
     @param match_path: a path to the parquet dataframe with 'raw' tracking data for every player (see snippet @422)
-    @return: a dataframe of form:
-                  total_A    total_B
+    @param resolution: length of the bins in minutes
+    @return: a dataframe of the cumulative distances [km] at the end of every bin, of form:
+             total_A    total_B
     min
-    0.000667     0.000239   0.000326
+    1.0     0.133548   0.130328
     ...          ...        ...
-    93.018667  101.266587  98.302286
+    94.0  101.266587  98.302286
     """
+    kin = match_kinematics(list(playersA) + list(playersB), match_path, end=math.inf)
+    clock = playing_time(kin, read_periods(match_path)) / 60
+    # a frame closes the interval since the previous one, bin k covers (k, k + 1] * resolution
+    bins = np.maximum(np.ceil(clock / resolution).astype(np.int64) - 1, 0)
+    n_bins = int(bins[-1]) + 1 if len(bins) else 0
 
-    # prepare the distance dataframe for both teams
-    df_A = prep_df(playersA, match_path)
-    df_B = prep_df(playersB, match_path)
+    home = np.isin([str(p) for p in kin.players], [str(p) for p in playersA])
+    df_total = pd.DataFrame(index=pd.Index((np.arange(n_bins) + 1) * resolution, name='min'))
+    for column, team in [('total_A', home), ('total_B', ~home)]:
+        dists = np.nansum(kin.dist[:, team], axis=1)
+        df_total[column] = np.cumsum(np.bincount(bins, weights=dists, minlength=n_bins))
+    return df_total
 
-    t = pd.DataFrame(df_A.index)
-    t.set_index(df_A.index, inplace=True)
-    t['time'] = t['time'].diff().map(lambda x: x.total_seconds())
-    t['time'] = t.loc[t['time'] < 5 * 60, ['time']].cumsum() / 60  # filter out the break(s) - might not always work,
-                                                                   # but it was sufficient in our case
 
-    dists_A = [col for col in df_A.columns if 'dist' in col]
-    df_A = df_A[dists_A]
+def _teamIds(teamid):
+    return [player.id for player in getPlayerInfos(teamid)]
 
-    dists_B = [col for col in df_B.columns if 'dist' in col]
-    df_B = df_B[dists_B]
 
-    df_A['total_A'] = df_A.sum(axis=1).cumsum()
+def _minToMinWorker(args):
+    return minToMin(*args)
 
-    df_A['min'] = t
-    df_A.set_index('min', inplace=True)
-    df_B['min'] = t
-    df_B.set_index('min', inplace=True)
-    df_B['total_B'] = df_B.sum(axis=1).cumsum()
 
-    df_total = df_A.loc[:, ['total_A']].join(df_B.loc[:, ['total_B']])
+def _plotMinByMin(ax, df, teamAname, teamBname, goalsA=[], goalsB=[], redA=[], redB=[]):
+    # draws the minute by minute comparison of a single game (see minToMin) into :param ax
+    if df.index[-1] >= 120:
+        tick = 10
+    else:
+        tick = 5
+    x_t = list(range(0, math.ceil(df.index[-1] + 5), tick))
+    y_t = list(range(0, math.ceil(max(df['total_A'].iloc[-1], df['total_B'].iloc[-1]) + 5), 10))
+    df['total_A'].plot(kind='line', xticks=x_t, yticks=y_t, label=teamAname + ' dist', ax=ax)
+    df['total_B'].plot(kind='line', xticks=x_t, yticks=y_t, label=teamBname + ' dist', color='#e50000', ax=ax)
+    ax.set_title(teamAname + ' - ' + teamBname)
+    ax.set_ylabel('distance covered by teams [km]')
+    ax.grid(True)
+    for event in goalsA:
+        ax.axvline(x=event, linestyle='dashed', label=teamAname + ' goal')
+    for event in goalsB:
+        ax.axvline(x=event, linestyle='dashed', label=teamBname + ' goal', color='#e50000')
 
-    return df_total[df_total.index.notnull()]
+    for event in redA:
+        ax.axvline(x=event, linestyle='dotted', label=teamAname + ' red card')
+    for event in redB:
+        ax.axvline(x=event, linestyle='dotted', label=teamBname + ' red card', color='#e50000')
+    ax.legend()
 
 
 # it - 66
@@ -248,41 +333,35 @@ def plotMinByMin(path, teamidA, teamidB, teamAname, teamBname, goalsA=[], goalsB
     @param redB: list of timestamps(in minutes) where away team got a red card
     @param savepath: a path to directory where you want to save the plot (by default the plot is not saved)
     """
-    plrsA = getPlayerInfos(teamidA)
-    ids_A = []
-    for player in plrsA:
-        ids_A.append(player.id)
-
-    plrsB = getPlayerInfos(teamidB)
-    ids_B = []
-    for player in plrsB:
-        ids_B.append(player.id)
-
-    df = minToMin(ids_A, ids_B, path)
-    if df.index[-1] >= 120:
-        tick = 10
-    else:
-        tick = 5
-    x_t = list(range(0, math.ceil(df.index[-1] + 5), tick))
-    y_t = list(range(0, math.ceil(max(df['total_A'].iloc[-1], df['total_B'].iloc[-1]) + 5), 10))
-    df['total_A'].plot(kind='line', xticks=x_t, yticks=y_t, label=teamAname + ' dist')
-    df['total_B'].plot(kind='line', xticks=x_t, yticks=y_t, label=teamBname + ' dist', color='#e50000')
-    plt.title("Minute by minute teams' distance covered")
-    plt.ylabel('distance covered by teams [km]')
-    plt.grid(True)
-    for event in goalsA:
-        plt.axvline(x=event, linestyle='dashed', label=teamAname + ' goal')
-    for event in goalsB:
-        plt.axvline(x=event, linestyle='dashed', label=teamBname + ' goal', color='#e50000')
+    df = minToMin(_teamIds(teamidA), _teamIds(teamidB), path)
+    fig, ax = plt.subplots()
+    _plotMinByMin(ax, df, teamAname, teamBname, goalsA, goalsB, redA, redB)
+    ax.set_title("Minute by minute teams' distance covered")
+    if savepath is not None:
+        plt.savefig(savepath + teamAname.lower() + '-' + teamBname.lower() + '_minByMin.png', dpi=300)
+    plt.show()
 
-    for event in redA:
-        plt.axvline(x=event, linestyle='dotted', label=teamAname + ' red card')
-    for event in redB:
-        plt.axvline(x=event, linestyle='dotted', label=teamBname + ' red card', color='#e50000')
 
-    plt.legend()
+def plotMatchesMinByMin(matches, savepath=None, processes=None):
+    """
+    plot the minute by minute distance comparisons of several games side by side (sharing the y axis)
+    @param matches: a list of dicts with the parameters of plotMinByMin (except savepath) for every game, e.g.
+    [{'path': 'italyvwales.pq', 'teamidA': 66, 'teamidB': 144, 'teamAname': 'ITA', 'teamBname': 'WAL', 'goalsA': [39]}]
+    @param savepath: a path to directory where you want to save the plot (by default the plot is not saved)
+    @param processes: number of processes computing the games, by default one per core
+    """
+    tasks = [(_teamIds(m['teamidA']), _teamIds(m['teamidB']), m['path']) for m in matches]
+    with mp.Pool(min(processes or mp.cpu_count(), max(len(tasks), 1))) as pool:
+        dfs = pool.map(_minToMinWorker, tasks)
+
+    fig, axes = plt.subplots(1, len(matches), figsize=(6.4 * len(matches), 4.8), sharey=True, squeeze=False)
+    for ax, m, df in zip(axes[0], matches, dfs):
+        _plotMinByMin(ax, df, m['teamAname'], m['teamBname'], m.get('goalsA', []), m.get('goalsB', []),
+                      m.get('redA', []), m.get('redB', []))
+    fig.suptitle("Minute by minute teams' distance covered")
     if savepath is not None:
-        plt.savefig(savepath + teamAname.lower() + '-' + teamBname.lower() + '_minByMin.png', dpi=300)
+        names = '_'.join(m['teamAname'].lower() + '-' + m['teamBname'].lower() for m in matches)
+        plt.savefig(savepath + names + '_minByMin.png', dpi=300)
     plt.show()
 
 
@@ -291,12 +370,12 @@ def plotMinByMin(path, teamidA, teamidB, teamAname, teamBname, goalsA=[], goalsB
 # plotMinByMin('italyvwales.pq', 66, 144, 'ITA', 'WAL', goalsA=[39], redB=[55], savepath='dashed')
 # plotMinByMin('italyvspain.pq', 66, 122, 'ITA', 'SPA', goalsA=[60], goalsB=[80], savepath='dashed_')
 
-dict = {}
+player_names = {}
 plrsA = getPlayerInfos(66)
 ids_A = []
 for player in plrsA:
     # print(player.name)
-    dict[player.id] = player.name
+    player_names[player.id] = player.name
     ids_A.append(player.id)
 
 plrsB = getPlayerInfos(144)
@@ -304,45 +383,46 @@ ids_B = []
 for player in plrsB:
     ids_B.append(player.id)
 
-# distsTournament('italy', ids_A, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy.parquet')
-# distsTournament('italy', ids_A, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm.parquet')
+# catalog = MatchCatalog.build('/home/igor/PycharmProjects/socceranalytics/dataframes/')
+# distsTournament(66, ids_A, catalog, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy.parquet')
+# distsTournament(66, ids_A, catalog, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm.parquet')
 #
-# distsTournament('italy', ids_A, first=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_1st.parquet')
-# distsTournament('italy', ids_A, first=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_1st.parquet')
+# distsTournament(66, ids_A, catalog, first=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_1st.parquet')
+# distsTournament(66, ids_A, catalog, first=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_1st.parquet')
 #
-# distsTournament('italy', ids_A, second=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_2nd.parquet')
-# distsTournament('italy', ids_A, second=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_2nd.parquet')
+# distsTournament(66, ids_A, catalog, second=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_2nd.parquet')
+# distsTournament(66, ids_A, catalog, second=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_2nd.parquet')
 #
-# distsTournament('italy', ids_A, overtime=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_overtime.parquet')
-# distsTournament('italy', ids_A, overtime=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_overtime.parquet')
+# distsTournament(66, ids_A, catalog, overtime=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_overtime.parquet')
+# distsTournament(66, ids_A, catalog, overtime=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_overtime.parquet')
 #
-# distsTournament('italy', ids_A, regtime=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_regtime.parquet')
-# distsTournament('italy', ids_A, regtime=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_regtime.parquet')
+# distsTournament(66, ids_A, catalog, regtime=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italy_regtime.parquet')
+# distsTournament(66, ids_A, catalog, regtime=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_regtime.parquet')
 #
-# distsTournament('italy', ids_A, end=39, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_before_goal.parquet')
-# distsTournament('italy', ids_A, begin=39, end=45, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_after_goal_imm.parquet')
+# distsTournament(66, ids_A, catalog, end=39, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_before_goal.parquet')
+# distsTournament(66, ids_A, catalog, begin=39, end=45, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_after_goal_imm.parquet')
 #
 #
-# distsTournament('italy', ids_A, end=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_before_red.parquet')
-# distsTournament('italy', ids_A, begin=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_after_red.parquet')
+# distsTournament(66, ids_A, catalog, end=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_before_red.parquet')
+# distsTournament(66, ids_A, catalog, begin=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/italyNorm_after_red.parquet')
 #
 #
-# print(distsTournament('wales', ids_B, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales.parquet'))
-# distsTournament('wales', ids_B, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm.parquet')
+# print(distsTournament(144, ids_B, catalog, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales.parquet'))
+# distsTournament(144, ids_B, catalog, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm.parquet')
 #
-# distsTournament('wales', ids_B, first=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales_1st.parquet')
-# distsTournament('wales', ids_B, first=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_1st.parquet')
+# distsTournament(144, ids_B, catalog, first=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales_1st.parquet')
+# distsTournament(144, ids_B, catalog, first=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_1st.parquet')
 #
-# distsTournament('wales', ids_B, second=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales_2nd.parquet')
-# distsTournament('wales', ids_B, second=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_2nd.parquet')
+# distsTournament(144, ids_B, catalog, second=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales_2nd.parquet')
+# distsTournament(144, ids_B, catalog, second=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_2nd.parquet')
 #
-# distsTournament('wales', ids_B, regtime=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales_regtime.parquet')
-# distsTournament('wales', ids_B, regtime=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_regtime.parquet')
+# distsTournament(144, ids_B, catalog, regtime=True, save=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/wales_regtime.parquet')
+# distsTournament(144, ids_B, catalog, regtime=True, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_regtime.parquet')
 #
-# distsTournament('wales', ids_B, end=39, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_before_goal.parquet')
-# distsTournament('wales', ids_B, begin=39, end=45, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_after_goal_imm.parquet')
+# distsTournament(144, ids_B, catalog, end=39, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_before_goal.parquet')
+# distsTournament(144, ids_B, catalog, begin=39, end=45, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_after_goal_imm.parquet')
 #
 #
-# distsTournament('wales', ids_B, end=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_before_red.parquet')
-# distsTournament('wales', ids_B, begin=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_after_red.parquet')
+# distsTournament(144, ids_B, catalog, end=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_before_red.parquet')
+# distsTournament(144, ids_B, catalog, begin=55, save=True, norm=True, path='/home/igor/PycharmProjects/socceranalytics/newDists/walesNorm_after_red.parquet')
 #
@@ -0,0 +1,279 @@
+"""
+Smoothing filters for frames x players arrays of tracking data (positions, displacements, velocities).
+
+Every filter takes the whole array of a match at once and is selected by name via smooth():
+
+    median  - rolling median over a time window, NaN values are skipped
+    savgol  - Savitzky-Golay filter over a fixed number of frames, NaN gaps are bridged by
+              linear interpolation before filtering
+    kalman  - constant-velocity Kalman filter with a Rauch-Tung-Striebel backward pass,
+              NaN values are treated as missing measurements
+
+The filters keep the gaps: the result is NaN wherever the input is NaN.
+"""
+import numpy as np
+import pandas as pd
+import scipy.signal as signal
+
+# tracking data is sampled at 25 Hz
+FRAME_RATE = 25
+
+
+def _frames(window, times):
+    # length of :param window (a number of frames or a time offset like '2250ms') in frames
+    if isinstance(window, (int, np.integer)):
+        return int(window)
+    times = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+    steps = np.diff(times)
+    step = np.median(steps[steps > 0]) / 1e9 if (steps > 0).any() else 1 / FRAME_RATE
+    return int(round(pd.Timedelta(window).total_seconds() / step))
+
+
+def median(values, times, window='2250ms'):
+    """
+    rolling median of every column over the frames within the preceding :param window
+    @param values: frames x columns float array
+    @param times: datetime64 array of the frames, sorted
+    @param window: time offset (e.g. '2250ms') or number of frames
+    @return: the smoothed array
+    """
+    df = pd.DataFrame(values, index=pd.DatetimeIndex(times))
+    if isinstance(window, (int, np.integer)):
+        smoothed = df.rolling(int(window), min_periods=1).median().to_numpy()
+    else:
+        smoothed = df.rolling(window).median().to_numpy()
+    return np.where(np.isnan(values), np.nan, smoothed)
+
+
+def savgol(values, times, window=25, order=1):
+    """
+    Savitzky-Golay filter of every column, assumes a fixed frame rate
+    @param values: frames x columns float array
+    @param times: datetime64 array of the frames, only used to convert a time offset :param window into frames
+    @param window: number of frames (made odd) or time offset
+    @param order: order of the fitted polynomials
+    @return: the smoothed array
+    """
+    values = np.asarray(values, dtype=np.float64)
+    length = _frames(window, times) // 2 * 2 + 1
+    length = min(length, len(values) - (len(values) + 1) % 2)
+    if length <= order:
+        return values.copy()
+
+    missing = np.isnan(values)
+    filled = values.copy()
+    rows = np.arange(len(values))
+    for col in np.flatnonzero(missing.any(axis=0) & ~missing.all(axis=0)):
+        valid = ~missing[:, col]
+        filled[missing[:, col], col] = np.interp(rows[missing[:, col]], rows[valid], values[valid, col])
+    smoothed = signal.savgol_filter(filled, length, order, axis=0)
+    return np.where(missing, np.nan, smoothed)
+
+
+def _affine_scan(maps, initial, width=256):
+    """
+    all states of the recursion s_k = M_k s_k-1 + b_k with a 2 x 2 matrix M_k & a vector b_k per frame and column,
+    the frames are split into blocks of :param width frames: the maps from the start of every block to each of
+    its frames are composed for all blocks at once, then the states at the starts of the blocks are chained
+    @param maps: (m00, m01, m10, m11, b0, b1), frames x columns arrays
+    @param initial: (s0, s1), the state of every column before the first frame
+    @return: (s0, s1) after every frame, frames x columns arrays
+    """
+    n_frames, n_cols = maps[0].shape
+    n_blocks = -(-n_frames // width)
+    pad = n_blocks * width - n_frames
+    identity = (1, 0, 0, 1, 0, 0)
+    # width x blocks x columns, i.e. the w-th frame of all blocks is contiguous
+    m00, m01, m10, m11, b0, b1 = (np.concatenate([c, np.full((pad, n_cols), e, dtype=np.float64)])
+                                  .reshape(n_blocks, width, n_cols).transpose(1, 0, 2).copy()
+                                  for c, e in zip(maps, identity))
+    for w in range(1, width):
+        # the map of frame w after the maps of the frames before it within the block
+        a00, a01, a10, a11 = m00[w].copy(), m01[w].copy(), m10[w].copy(), m11[w].copy()
+        m00[w] = a00 * m00[w - 1] + a01 * m10[w - 1]
+        m10[w] = a10 * m00[w - 1] + a11 * m10[w - 1]
+        m01[w] = a00 * m01[w - 1] + a01 * m11[w - 1]
+        m11[w] = a10 * m01[w - 1] + a11 * m11[w - 1]
+        b0[w] += a00 * b0[w - 1] + a01 * b1[w - 1]
+        b1[w] += a10 * b0[w - 1] + a11 * b1[w - 1]
+
+    starts = np.empty((2, n_blocks, n_cols))
+    s0, s1 = initial
+    for block in range(n_blocks):
+        starts[0, block], starts[1, block] = s0, s1
+        s0, s1 = (m00[-1, block] * s0 + m01[-1, block] * s1 + b0[-1, block],
+                  m10[-1, block] * s0 + m11[-1, block] * s1 + b1[-1, block])
+    s0 = m00 * starts[0] + m01 * starts[1] + b0
+    s1 = m10 * starts[0] + m11 * starts[1] + b1
+    return (s0.transpose(1, 0, 2).reshape(-1, n_cols)[:n_frames],
+            s1.transpose(1, 0, 2).reshape(-1, n_cols)[:n_frames])
+
+
+def _covariances(dts, updates, starts, q, r):
+    """
+    covariances (p00, p01, p11) of the predicted & of the filtered states and the gains of the constant-velocity
+    Kalman filter, they don't depend on the values of the measurements
+
+    within a run of frames with the same time step & the same columns updated, the covariances of the updated
+    columns reach a fixed point after a few hundred frames - the rest of the run is filled in, the covariances of
+    the columns which are only predicted follow in closed form
+    @param dts: time step of every frame in seconds
+    @param updates: frames x columns mask of the measurements which update the state of their column
+    @param starts: frames x columns mask of the first measurement of every column
+    @return: (cov_pred, cov, gains) - frames x 3 x columns, frames x 3 x columns & frames x 2 x columns arrays
+    """
+    n_frames, n_cols = updates.shape
+    cov = np.empty((n_frames, 3, n_cols))
+    cov_pred = np.empty((n_frames, 3, n_cols))
+    gains = np.zeros((n_frames, 2, n_cols))
+
+    # the prediction is linear: F P F^T + Q with F = [[1, dt], [0, 1]]
+    models = dict()
+    for dt in np.unique(dts):
+        models[dt] = (np.array([[1, 2 * dt, dt ** 2], [0, 1, dt], [0, 0, 1]]),
+                      np.array([[q * dt ** 4 / 4], [q * dt ** 3 / 2], [q * dt ** 2]]))
+
+    # a frame with a start is a run of its own
+    change = np.ones(n_frames + 1, dtype=bool)
+    change[1:-1] = ((dts[1:] != dts[:-1]) | (updates[1:] != updates[:-1]).any(axis=1)
+                    | starts[1:].any(axis=1) | starts[:-1].any(axis=1))
+    bounds = np.flatnonzero(change)
+
+    any_start = starts.any(axis=1)
+    p = np.zeros((3, n_cols))
+    for begin, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        dt = dts[begin]
+        transition, noise = models[dt]
+        update = updates[begin]
+        i = begin
+        while i < end:
+            previous = p
+            p = transition @ p + noise if dt else p.copy()
+            cov_pred[i] = p
+            gain = gains[i]
+            np.divide(p[:2], p[0] + r, out=gain, where=update)
+            p[2] -= gain[1] * p[1]
+            p[:2] *= 1 - gain[0]
+            if any_start[i]:
+                p[:, starts[i]] = [[r], [0], [100 * r]]
+            cov[i] = p
+            i += 1
+            if i - begin > 1 and np.array_equal(p[:, update], previous[:, update]):
+                break
+        if i == end:
+            continue
+
+        # the fixed point for the updated columns, k more predictions for the others
+        cov_pred[i:end] = cov_pred[i - 1]
+        cov[i:end] = p
+        gains[i:end] = gains[i - 1]
+        other = ~update
+        k = np.arange(1, end - i + 1)[:, None]
+        p00, p01, p11 = p[:, other]
+        rest = np.stack([p00 + 2 * k * dt * p01 + (k * dt) ** 2 * p11 + q * dt ** 4 * (k ** 3 / 3 - k / 12),
+                         p01 + k * dt * p11 + q * dt ** 3 * k ** 2 / 2,
+                         p11 + q * dt ** 2 * k], axis=1)
+        cov_pred[i:end, :, other] = rest
+        cov[i:end, :, other] = rest
+        p = cov[end - 1].copy()
+    return cov_pred, cov, gains
+
+
+def kalman(values, times, process_noise=1.0, measurement_noise=1.0, block=16384):
+    """
+    constant-velocity Kalman filter & smoother of every column
+
+    the covariances & gains don't depend on the measurements (see _covariances), with them the filtered &
+    the smoothed states are affine recursions which are computed for all frames of a block at once
+    (see _affine_scan). A whole match takes a few seconds, up to twice as long if the gaps of the columns
+    change every few frames.
+    @param values: frames x columns float array of measurements
+    @param times: datetime64 array of the frames, the time steps of the motion model
+    @param process_noise: variance of the unmodelled acceleration, per second squared
+    @param measurement_noise: variance of the measurements
+    @param block: number of frames whose states are computed at once, limits the memory
+    @return: the smoothed array
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_frames, n_cols = values.shape
+    times = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+    dts = np.zeros(n_frames)
+    dts[1:] = np.maximum(np.diff(times) / 1e9, 0)
+
+    # the first measurement of a column initializes its state, every later one updates it
+    seen = ~np.isnan(values)
+    tracked = np.logical_or.accumulate(seen, axis=0)
+    before = np.zeros_like(seen)
+    before[1:] = tracked[:-1]
+    starts = seen & ~before
+    updates = seen & before
+    cov_pred, cov, gains = _covariances(dts, updates, starts, process_noise, measurement_noise)
+
+    # filtered state (position, velocity): the prediction F s followed by the update s + g (z - s[0]),
+    # the first measurement of a column sets its position
+    pos, vel = np.empty((n_frames, n_cols)), np.empty((n_frames, n_cols))
+    state = (np.zeros(n_cols), np.zeros(n_cols))
+    for first in range(0, n_frames, block):
+        rows = slice(first, min(first + block, n_frames))
+        dt = dts[rows, None]
+        g0, g1 = gains[rows, 0], gains[rows, 1]
+        z = np.where(updates[rows], values[rows], 0)
+        maps = [1 - g0, (1 - g0) * dt, -g1, 1 - g1 * dt, g0 * z, g1 * z]
+        start = starts[rows]
+        for m, value in zip(maps, [0, 0, 0, 0, values[rows][start], 0]):
+            m[start] = value
+        pos[rows], vel[rows] = _affine_scan(maps, state)
+        state = (pos[rows.stop - 1], vel[rows.stop - 1])
+    del gains
+
+    # Rauch-Tung-Striebel backward pass: s = x + C (s_next - x_pred_next) with C = P F^T G^-1 where a column
+    # has a filtered state & a successor, the others keep their filtered state
+    smoothed = pos.copy()
+    state = (pos[-1], vel[-1])
+    for last in range(n_frames - 1, 0, -block):
+        rows, next_rows = slice(max(last - block, 0), last), slice(max(last - block, 0) + 1, last + 1)
+        f00, f01, f11 = cov[rows].transpose(1, 0, 2)
+        g00, g01, g11 = cov_pred[next_rows].transpose(1, 0, 2)
+        dt = dts[next_rows, None]
+        det = g00 * g11 - g01 ** 2
+        invalid = ~tracked[rows] | ~(det > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a00, a10 = f00 + dt * f01, f01 + dt * f11
+            c00, c01 = (a00 * g11 - f01 * g01) / det, (f01 * g00 - a00 * g01) / det
+            c10, c11 = (a10 * g11 - f11 * g01) / det, (f11 * g00 - a10 * g01) / det
+        for c in (c00, c01, c10, c11):
+            c[invalid] = 0
+        # the prediction of the next frame from the filtered state
+        d0 = pos[rows] + dt * vel[rows]
+        d0[invalid] = 0
+        d1 = vel[rows]
+        maps = [c00, c01, c10, c11, pos[rows] - c00 * d0 - c01 * d1, vel[rows] - c10 * d0 - c11 * d1]
+        s0, s1 = _affine_scan([m[::-1] for m in maps], state)
+        smoothed[rows] = s0[::-1]
+        state = (s0[-1], s1[-1])
+    return np.where(np.isnan(values), np.nan, smoothed)
+
+
+FILTERS = {
+    'median': median,
+    'savgol': savgol,
+    'kalman': kalman,
+}
+
+
+def smooth(values, times, method='median', **params):
+    """
+    smooths every column of :param values with the filter called :param method (see FILTERS)
+    @param values: frames x columns float array, NaN where there's no data
+    @param times: datetime64 array of the frames
+    @param params: parameters of the filter, e.g. window='2250ms'
+    @return: the smoothed array, NaN where :param values is NaN
+    """
+    if method not in FILTERS:
+        raise ValueError(f'unknown smoothing filter {method}, choose one of {", ".join(FILTERS)}')
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values.copy()
+    squeeze = values.ndim == 1
+    smoothed = FILTERS[method](values[:, None] if squeeze else values, times, **params)
+    return smoothed[:, 0] if squeeze else smoothed
@@ -0,0 +1,106 @@
+"""
+Delta codec for the x/y columns of the long tracking format (utils.tracking_schema).
+
+At 25 Hz a player moves a few centimetres from one frame to the next, so instead of the
+positions the codec stores the difference to the previous row of the same player as int8.
+The few steps which don't fit (the first row of every player, jumps after gaps, long balls)
+go into a nullable int32 patch column which is null everywhere else:
+
+    x        int8   step to the previous row of the player, 0 where a patch is set
+    x_patch  int32  absolute value at the first row of a player, large steps, null otherwise
+
+Runs of small integers and nulls compress far better than the positions themselves. Decoding
+is one cumulative sum over the whole column.
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+CODEC_KEY = b'codec'
+CODEC = 'delta-v1'
+PATCH = '_patch'
+
+DELTA_TYPE = np.int8
+PATCH_TYPE = pa.int32()
+
+
+def _block_lengths(starts, n):
+    return np.diff(np.append(starts, n))
+
+
+def delta_encode(values, starts):
+    """
+    delta encodes the concatenated blocks (players) of :param values
+    @param values: integer array, e.g. the x column of a tracking table
+    @param starts: sorted row of the first value of every block, has to start with 0
+    @return: (deltas, patches, patched) - the int8 steps, the int32 patches and the bool mask
+    where a patch is set
+    """
+    values = np.asarray(values, dtype=np.int64)
+    steps = np.diff(values, prepend=0)
+    steps[starts] = values[starts]
+
+    info = np.iinfo(DELTA_TYPE)
+    patched = (steps < info.min) | (steps > info.max)
+    patched[starts] = True
+    deltas = np.where(patched, 0, steps).astype(DELTA_TYPE)
+    patches = np.where(patched, steps, 0).astype(np.int32)
+    return deltas, patches, patched
+
+
+def delta_decode(deltas, patches, patched, starts):
+    """
+    inverse of delta_encode, all blocks are decoded at once
+    @return: int64 array of the values
+    """
+    steps = np.where(patched, patches, deltas).astype(np.int64)
+    if len(steps) == 0:
+        return steps
+    total = np.cumsum(steps)
+    # the running sum of the previous blocks is subtracted from every block
+    before = np.concatenate([[0], total[np.asarray(starts[1:]) - 1]])
+    return total - np.repeat(before, _block_lengths(starts, len(steps)))
+
+
+def is_encoded(table_or_schema):
+    """
+    :return: True if the table (or schema) was written with encode_table
+    """
+    schema = getattr(table_or_schema, 'schema', table_or_schema)
+    return (schema.metadata or dict()).get(CODEC_KEY) == CODEC.encode()
+
+
+def encode_table(table, starts, columns=('x', 'y')):
+    """
+    replaces :param columns of :param table by their delta encoding
+    @param starts: first row of every block (player), see utils.tracking_schema.read_player_index
+    @return: the encoded table, its metadata is kept and marked with the codec
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    for column in columns:
+        i = table.schema.get_field_index(column)
+        deltas, patches, patched = delta_encode(table.column(column).to_numpy(), starts)
+        table = table.set_column(i, column, pa.array(deltas))
+        table = table.add_column(i + 1, column + PATCH, pa.array(patches, type=PATCH_TYPE, mask=~patched))
+    metadata = dict(table.schema.metadata or dict())
+    metadata[CODEC_KEY] = CODEC
+    return table.replace_schema_metadata(metadata)
+
+
+def decode_table(table, starts, columns=('x', 'y'), dtype=pa.int16()):
+    """
+    inverse of encode_table, columns of the table which are not encoded are left alone
+    @param dtype: type of the decoded columns
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    for column in columns:
+        if column not in table.column_names or column + PATCH not in table.column_names:
+            continue
+        patch = table.column(column + PATCH)
+        values = delta_decode(table.column(column).to_numpy(),
+                              pc.fill_null(patch, 0).to_numpy(),
+                              pc.is_valid(patch).to_numpy(zero_copy_only=False),
+                              starts)
+        table = table.set_column(table.schema.get_field_index(column), column, pa.array(values).cast(dtype))
+        table = table.remove_column(table.schema.get_field_index(column + PATCH))
+    return table
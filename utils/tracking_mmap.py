@@ -0,0 +1,180 @@
+"""
+Memory-mapped sidecar files for random access to single frames or short frame ranges.
+
+A sidecar is a directory next to the match data holding
+    positions.npy  int16 array of shape frames x objects x 2 (x, y in cm, MISSING if not on the pitch)
+    sampling.npy   uint8 array of shape frames x objects with the TRACAB sampling flags
+    times.npy      int64 utc of every frame in nanoseconds since the epoch
+    index.json     the objects (ball & players) of the columns, the periods with their frame offsets
+
+Opening a sidecar only maps the files, asking for frames 57000-57500 touches just those pages.
+This makes scrubbing through a match (animations, pitch control, graphics.drawFrame) nearly instant.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from frame_store import FrameStore, BALL, FIELDS
+from match import Frame, MatchStream, TrackingObj
+
+MISSING = np.iinfo(np.int16).min
+
+POSITIONS = 'positions.npy'
+SAMPLING = 'sampling.npy'
+TIMES = 'times.npy'
+INDEX = 'index.json'
+
+
+def write_sidecar(store, directory, match=None, chunk=25 * 60 * 5):
+    """
+    writes the frames of a utils.frame_store.FrameStore into a sidecar directory
+    @param store: FrameStore, keep_phases should have been called to get the periods
+    @param directory: the sidecar directory (created if necessary)
+    @param match: optional MatchStream/Match of the store, its id and pitch size are stored as well
+    @param chunk: number of frames written at once
+    """
+    os.makedirs(directory, exist_ok=True)
+    n, n_objs = store.n_frames, len(store.keys)
+
+    positions = np.lib.format.open_memmap(os.path.join(directory, POSITIONS), mode='w+',
+                                          dtype=np.int16, shape=(n, n_objs, 2))
+    for begin in range(0, n, chunk):
+        end = min(begin + chunk, n)
+        present = store.present[begin:end, :n_objs]
+        for axis, values in enumerate([store.x, store.y]):
+            values = values[begin:end, :n_objs]
+            if len(values) and (values.min() <= MISSING or values.max() > np.iinfo(np.int16).max):
+                raise ValueError('coordinates do not fit into int16')
+            positions[begin:end, :, axis] = np.where(present, values, MISSING)
+    positions.flush()
+    del positions
+
+    np.save(os.path.join(directory, SAMPLING), store.sampling[:n, :n_objs].astype(np.uint8))
+    np.save(os.path.join(directory, TIMES), store.times_ns())
+
+    # type of every object: the type of its first appearance
+    types = []
+    for slot in range(n_objs):
+        present = store.present[:n, slot]
+        types.append(int(store.type[:n, slot][present][0]) if present.any() else -1)
+
+    periods = []
+    if store.phase is not None:
+        for phase in np.unique(store.phase):
+            rows = np.flatnonzero(store.phase == phase)
+            periods.append({'period': int(phase) + 1, 'first_frame': int(rows[0]), 'last_frame': int(rows[-1])})
+
+    index = {
+        'keys': [key if key == BALL else int(key) for key in store.keys],
+        'ids': [int(i) for i in store.ids()],
+        'types': types,
+        'periods': periods,
+    }
+    if match is not None:
+        index.update({'match_id': match.matchID, 'pitch_length': match.pitchLength, 'pitch_width': match.pitchWidth})
+    with open(os.path.join(directory, INDEX), 'w') as f:
+        json.dump(index, f)
+
+
+def build_sidecar(path, directory):
+    """
+    parses the TRACAB xml file in :param path and writes its sidecar into :param directory
+    @return: the opened TrackingArrays
+    """
+    match = MatchStream(path, removeExcess=False)
+    store = FrameStore.from_frames(match)
+    store.keep_phases(match.phases)
+    write_sidecar(store, directory, match)
+    return TrackingArrays(directory)
+
+
+class TrackingArrays:
+    """
+    Random access to the frames of a sidecar directory (see write_sidecar), nothing is read
+    before it's needed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.positions = np.load(os.path.join(directory, POSITIONS), mmap_mode='r')
+        self.sampling = np.load(os.path.join(directory, SAMPLING), mmap_mode='r')
+        self.times = np.load(os.path.join(directory, TIMES), mmap_mode='r')
+        with open(os.path.join(directory, INDEX)) as f:
+            self.index = json.load(f)
+        self.keys = self.index['keys']
+        self.ids = self.index['ids']
+        self.types = self.index['types']
+        self.slot = {key: slot for slot, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return self.positions.shape[0]
+
+    def frames(self, start, stop):
+        """
+        :return: float array of shape (stop - start) x objects x 2 with the positions in cm,
+        NaN if an object was not on the pitch
+        """
+        positions = np.asarray(self.positions[start:stop], dtype=np.float64)
+        positions[self.positions[start:stop] == MISSING] = np.nan
+        return positions
+
+    def player(self, key, start=0, stop=None):
+        """
+        :return: positions (frames x 2) of a single object ('ball' or a player id) between start and stop
+        """
+        return self.frames(start, len(self) if stop is None else stop)[:, self.slot[key]]
+
+    def frame_at(self, time):
+        """
+        :return: index of the last frame at or before :param time (datetime64, Timestamp or utc nanoseconds)
+        """
+        if not isinstance(time, (int, np.integer)):
+            time = pd.Timestamp(time).value
+        return max(int(np.searchsorted(self.times, time, side='right')) - 1, 0)
+
+    def period_frames(self, period):
+        """
+        :return: (first frame, last frame + 1) of a period, e.g. 2 for the second half
+        """
+        for entry in self.index['periods']:
+            if entry['period'] == period:
+                return entry['first_frame'], entry['last_frame'] + 1
+        raise ValueError(f'no period {period} in {self.directory}')
+
+    def frame(self, i):
+        """
+        :return: frame :param i as a utils.match.Frame, e.g. for graphics.drawFrame
+        the ball possession & ball in play flags are not part of the sidecar and are None
+        """
+        time = np.datetime_as_string(np.datetime64(int(self.times[i]), 'ns'), unit='ms') + 'Z'
+        objs = []
+        for slot, (x, y) in enumerate(self.positions[i]):
+            if x == MISSING:
+                continue
+            objs.append(TrackingObj.fromValues(self.types[slot], self.ids[slot], x, y, self.sampling[i, slot]))
+        return Frame.fromValues(time, None, None, objs)
+
+    def to_dataframe(self, start, stop, prefix=''):
+        """
+        the frames between start and stop in the wide layout of utils.tracking_df,
+        e.g. to render a clip with utils.save_frames
+        """
+        positions = self.frames(start, stop)
+        columns = {'time': np.asarray(self.times[start:stop]).view('datetime64[ns]')}
+        for slot, key in enumerate(self.keys):
+            name = BALL if key == BALL else prefix + str(key)
+            missing = np.isnan(positions[:, slot, 0])
+            values = {
+                'type': np.full(len(positions), self.types[slot], dtype=np.float64),
+                'id': np.full(len(positions), self.ids[slot], dtype=np.float64),
+                'x': positions[:, slot, 0],
+                'y': positions[:, slot, 1],
+                'sampling': np.asarray(self.sampling[start:stop, slot], dtype=np.float64),
+            }
+            for field in FIELDS:
+                column = values[field]
+                column[missing] = np.nan
+                columns[name + '_' + field] = column if missing.any() else column.astype(np.int64)
+        return pd.DataFrame(columns, index=pd.RangeIndex(start, stop))
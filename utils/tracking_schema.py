@@ -0,0 +1,253 @@
+"""
+Compact long-format schema for tracking data.
+
+Instead of one <playerId>_x/_y/_type/_sampling/_id column group per player (mostly nulls for
+substitutes, everything int64), a match is stored as two tables:
+
+    frames:   frame (int32), period (int8), time (timestamp[ns]), ball_possession, ball_in_play
+    tracking: frame (int32), period (int8), player (dictionary-encoded id), team (int8),
+              x (int16), y (int16), sampling (uint8)
+
+The tracking rows are sorted by player and frame, the offset and length of every player's
+rows are stored in the file metadata. Readers therefore get per-player arrays by slicing,
+without scanning any column names. For archives, x/y can be stored with the delta codec of
+utils.tracking_codec (codec='delta'), the readers decode such files transparently.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from frame_store import BALL
+from tracking_codec import decode_table, encode_table, is_encoded, PATCH
+
+# team codes are the TRACAB object types: 0 home team, 1 away team, 7 ball
+HOME = 0
+AWAY = 1
+BALL_TEAM = 7
+
+FRAMES_SCHEMA = pa.schema([
+    ('frame', pa.int32()),
+    ('period', pa.int8()),
+    ('time', pa.timestamp('ns')),
+    ('ball_possession', pa.dictionary(pa.int8(), pa.string())),
+    ('ball_in_play', pa.int8()),
+])
+
+TRACKING_SCHEMA = pa.schema([
+    ('frame', pa.int32()),
+    ('period', pa.int8()),
+    ('player', pa.dictionary(pa.int16(), pa.int64())),
+    ('team', pa.int8()),
+    ('x', pa.int16()),
+    ('y', pa.int16()),
+    ('sampling', pa.uint8()),
+])
+
+INDEX_KEY = b'player_index'
+
+# parquet settings of the tracking files: the frame numbers of a player block increase steadily,
+# the low cardinality columns are dictionary (run length) encoded
+TRACKING_WRITE_OPTIONS = dict(
+    compression='zstd',
+    use_dictionary=['period', 'player', 'team', 'sampling'],
+    column_encoding={'frame': 'DELTA_BINARY_PACKED'},
+)
+
+
+def _int16(values):
+    if len(values) and (values.min() < np.iinfo(np.int16).min or values.max() > np.iinfo(np.int16).max):
+        raise ValueError('coordinates do not fit into int16')
+    return values.astype(np.int16)
+
+
+def long_tables(store, rows=None):
+    """
+    converts a utils.frame_store.FrameStore into the frames and tracking tables
+    @param store: a FrameStore, keep_phases should have been called to get the periods
+    @param rows: slice of the store's frames to convert, by default all of them
+    @return: (frames table, tracking table)
+    """
+    if rows is None:
+        rows = slice(0, store.n_frames)
+    frame = np.arange(store.n_frames, dtype=np.int32)[rows]
+    if store.phase is not None:
+        period = (store.phase[rows] + 1).astype(np.int8)
+    else:
+        period = np.ones(len(frame), dtype=np.int8)
+
+    frames = pa.Table.from_arrays([
+        pa.array(frame),
+        pa.array(period),
+        pa.array(store.times_ns()[rows].view('datetime64[ns]')),
+        pa.array(store.ball_possession[rows].astype(str)).dictionary_encode().cast(FRAMES_SCHEMA.field('ball_possession').type),
+        pa.array(store.ball_in_play[rows].astype(np.int8)),
+    ], schema=FRAMES_SCHEMA)
+
+    # one block of rows per object, sorted by player and frame
+    ids = store.ids()
+    parts = {name: [] for name in ['frame', 'period', 'player', 'team', 'x', 'y', 'sampling']}
+    index = dict()
+    offset = 0
+    for slot, key in enumerate(store.keys):
+        present = store.present[rows, slot]
+        n = int(present.sum())
+        if n == 0:
+            continue
+        team = store.type[rows, slot][present]
+        parts['frame'].append(frame[present])
+        parts['period'].append(period[present])
+        parts['player'].append(np.full(n, slot, dtype=np.int16))
+        parts['team'].append(team.astype(np.int8))
+        parts['x'].append(store.x[rows, slot][present])
+        parts['y'].append(store.y[rows, slot][present])
+        parts['sampling'].append(store.sampling[rows, slot][present].astype(np.uint8))
+        index[str(ids[slot]) if key != BALL else BALL] = [offset, n, int(team[0]), int(ids[slot])]
+        offset += n
+
+    def cat(name, dtype):
+        return np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=dtype)
+
+    player = pa.DictionaryArray.from_arrays(pa.array(cat('player', np.int16)), pa.array(ids))
+    tracking = pa.Table.from_arrays([
+        pa.array(cat('frame', np.int32)),
+        pa.array(cat('period', np.int8)),
+        player,
+        pa.array(cat('team', np.int8)),
+        pa.array(_int16(cat('x', np.int32))),
+        pa.array(_int16(cat('y', np.int32))),
+        pa.array(cat('sampling', np.uint8)),
+    ], schema=TRACKING_SCHEMA)
+    tracking = tracking.replace_schema_metadata({INDEX_KEY: json.dumps(index)})
+
+    return frames, tracking
+
+
+def _block_starts(index):
+    return np.sort([offset for offset, _, _, _ in index.values()]).astype(np.int64)
+
+
+def write_long(store, frames_path, tracking_path, rows=None, codec=None):
+    """
+    writes the frames and tracking tables of :param store (see long_tables) as parquet files
+    @param codec: None or 'delta' to delta encode x/y (see utils.tracking_codec)
+    """
+    frames, tracking = long_tables(store, rows)
+    if codec == 'delta':
+        index = json.loads(tracking.schema.metadata[INDEX_KEY])
+        tracking = encode_table(tracking, _block_starts(index))
+    elif codec is not None:
+        raise ValueError(f'unknown codec {codec}')
+    pq.write_table(frames, frames_path, compression='zstd')
+    pq.write_table(tracking, tracking_path, **TRACKING_WRITE_OPTIONS)
+
+
+def _files(path):
+    # a single file or a (partitioned) directory, sorted such that the periods come in order
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True))
+    return [path]
+
+
+def read_player_index(path):
+    """
+    :return: dict player -> (offset, length, team, id) of a single tracking file, read from the
+    metadata only ('ball' is the key of the ball)
+    """
+    metadata = pq.read_schema(path).metadata
+    return {key: tuple(value) for key, value in json.loads(metadata[INDEX_KEY]).items()}
+
+
+def read_tracking(path, columns=None):
+    """
+    reads a single tracking file, delta encoded files are decoded
+    @param columns: the columns to read, by default all of them
+    @return: pyarrow table in TRACKING_SCHEMA (restricted to :param columns)
+    """
+    schema = pq.read_schema(path)
+    if not is_encoded(schema):
+        return pq.read_table(path, columns=columns)
+
+    names = [name for name in schema.names if not name.endswith(PATCH)] if columns is None else list(columns)
+    extra = [name + PATCH for name in names if name + PATCH in schema.names]
+    table = pq.read_table(path, columns=names + extra)
+    index = {key: tuple(value) for key, value in json.loads(schema.metadata[INDEX_KEY]).items()}
+    return decode_table(table, _block_starts(index)).select(names)
+
+
+def read_players(path, players=None, columns=('frame', 'x', 'y', 'sampling')):
+    """
+    reads the tracking data of single players
+    @param path: a tracking file or a directory of tracking partitions (e.g. of one match)
+    @param players: list of player ids (or 'ball'), by default every object
+    @param columns: the columns to return for every player
+    @return: dict player id -> dict column -> numpy array, ordered by frame
+    """
+    result = dict()
+    for file in _files(path):
+        index = read_player_index(file)
+        keys = index.keys() if players is None else [str(p) for p in players if str(p) in index]
+        if not keys:
+            continue
+        table = read_tracking(file, columns=list(columns))
+        for key in keys:
+            offset, length, _, _ = index[key]
+            block = table.slice(offset, length)
+            player = key if key == BALL else int(key)
+            arrays = {c: block.column(c).to_numpy() for c in columns}
+            if player in result:
+                arrays = {c: np.concatenate([result[player][c], arrays[c]]) for c in columns}
+            result[player] = arrays
+    return result
+
+
+def read_teams(path):
+    """
+    :return: dict player id -> team code (HOME, AWAY or BALL_TEAM) of all players in :param path
+    """
+    teams = dict()
+    for file in _files(path):
+        for key, (_, _, team, _) in read_player_index(file).items():
+            teams[key if key == BALL else int(key)] = team
+    return teams
+
+
+def read_grid(path, players=None, teams=None, n_frames=None):
+    """
+    reads the tracking data into a frames x players layout
+    @param path: a tracking file or a directory of tracking partitions (e.g. of one match)
+    @param players: list of player ids, by default every player of :param teams
+    @param teams: team codes to consider if no players are given, by default both teams
+    @param n_frames: number of frames of the match, by default the last frame + 1
+    @return: (player ids, x, y, sampling) - x and y are float arrays of shape frames x players
+    in cm with NaN where a player was not on the pitch, sampling is uint8 (255 if not on the pitch)
+    """
+    if players is None:
+        teams = (HOME, AWAY) if teams is None else teams
+        players = [p for p, team in read_teams(path).items() if team in teams]
+    players = [p if p == BALL else int(p) for p in players]
+    data = read_players(path, players)
+    players = [p for p in players if p in data]
+
+    if n_frames is None:
+        n_frames = max([int(data[p]['frame'].max()) + 1 for p in players], default=0)
+    x = np.full((n_frames, len(players)), np.nan)
+    y = np.full((n_frames, len(players)), np.nan)
+    sampling = np.full((n_frames, len(players)), 255, dtype=np.uint8)
+    for i, p in enumerate(players):
+        frame = data[p]['frame']
+        x[frame, i] = data[p]['x']
+        y[frame, i] = data[p]['y']
+        sampling[frame, i] = data[p]['sampling']
+    return players, x, y, sampling
+
+
+def read_frames(path):
+    """
+    :return: the frames table(s) in :param path as a pandas dataframe, ordered by frame
+    """
+    tables = [pq.read_table(file) for file in _files(path)]
+    return pa.concat_tables(tables).to_pandas().sort_values('frame').reset_index(drop=True)
@@ -11,62 +11,59 @@ from bokeh.models import Range1d
 from math import pi
 import imageio
 import match as m
-from datetime import datetime
+from frame_store import FrameStore
+from ingest_cache import cached
+from periods import segment
 #https://github.com/znstrider/PyFootballPitch/blob/master/Football_Pitch_Bokeh.py#L6
 
 
-def tracking_to_parquet(path, save=False, save_path=None):
+@cached('tracking_df')
+def convert_tracking(path):
     """
     credit Bojan
-    converts tracking data to pandas dataframe
-    saves in parquet if save == True
-    saves to current directory
+    converts tracking data to pandas dataframe, the result is cached (see ingest_cache),
+    pass use_cache=False to parse the xml file again
     params path: str, path to xml tracking file
-    params save: Bool: whether or not to save
-    params savepath: str path to save dataframe
     return: pandas dataframe with tracking data
     """
-    match = m.Match(path)
+    # frames are streamed, only the current frame of the xml file is kept in memory
+    match = m.MatchStream(path, removeExcess=False)
     match_id = match.matchID
 
-    framedict = dict()
-
-    for index, frame in enumerate(match.frames):
-        # time is stored as datetime objects - makes it easier to do operations/comparisons on it
-        time = frame.time.replace('Z', '').replace('T', ' ')
-        columns = dict()
-        if '.' not in time:
-            time += '.0'
-        columns['time'] = datetime.strptime(time, '%Y-%m-%d %H:%M:%S.%f')
-
-        for i, obj in enumerate(frame.trackingObjs):
-            if obj.type == '7':
-                for key, value in obj.__dict__.items():
-                    columns["ball_" + key] = int(value)
-            else:
-                # Each player with id Q, who played during the match gets their own columns:
-                # "playerQ_type", "playerQ_id"*, "playerQ_x", "playerQ_y" with the respective data.
-                # In case the player got subbed on/off at some point, the entries corresponding to
-                # the time the player was off the pitch have value <null>
-                for key, value in obj.__dict__.items():
-                    #  *since we encode players' IDs in the columns' names, you might  want to avoid
-                    #   some data redundancy and skip the ID columns, depending on the application
-                    # if key == 'id':
-                    #     continue
-
-                    columns[str(obj.id) + "_" + key] = int(value)
-
-        framedict[index] = columns
-
-    # convert into pandas dataframe & export as parquet file
-    df = pd.DataFrame.from_dict(framedict, orient='index')
+    # Each player with id Q, who played during the match gets their own columns:
+    # "Q_type", "Q_id", "Q_x", "Q_y", "Q_sampling" with the respective data, the ball gets "ball_<...>".
+    # In case the player got subbed on/off at some point, the entries corresponding to
+    # the time the player was off the pitch have value <null>
+    # The columns are filled frame by frame into preallocated numpy arrays
+    store = FrameStore.from_frames(match)
+    store.keep_phases(match.phases)  # only keep the frames sampled during the actual game
+
+    # convert into pandas dataframe
+    df = store.to_dataframe()
     df.attrs['match_id'] = match_id
+    df.attrs['periods'] = segment(store.times_ns(), store.phase, match.phases)  # see periods.py
     df.attrs['home_team'] = match.phases[0].leftTeamID
     df.attrs['away_team'] = match.phases[1].leftTeamID
     df.attrs['player_map'] = get_playermap(df.attrs['home_team'], df.attrs['away_team'])
+    return df
+
+
+def tracking_to_parquet(path, save=False, save_path=None, use_cache=True):
+    """
+    credit Bojan
+    converts tracking data to pandas dataframe
+    saves in parquet if save == True
+    saves to current directory
+    params path: str, path to xml tracking file
+    params save: Bool: whether or not to save
+    params savepath: str path to save dataframe
+    params use_cache: Bool: whether or not to reuse an earlier conversion of the same file
+    return: pandas dataframe with tracking data
+    """
+    df = convert_tracking(path, use_cache=use_cache)
     if save:
         df.to_parquet(save_path, index=False)
-    return
+    return df
 
 
 def create_pitch(length, width, linecolor, bounds = 15):
@@ -263,7 +260,7 @@ def create_gif(images_path, gif_path):
         images.append(img)
     imageio.mimsave(gif_path, images, fps=10) # Save gif
 
-def tracking_df(path, save=False, save_path=None):
+def tracking_df(path, save=False, save_path=None, use_cache=True):
     """
     credit Bojan
     converts tracking data to pandas dataframe
@@ -272,51 +269,15 @@ def tracking_df(path, save=False, save_path=None):
     params path: str, path to xml tracking file
     params save: Bool: whether or not to save
     params savepath: str path to save dataframe
+    params use_cache: Bool: whether or not to reuse an earlier conversion of the same file
     return: pandas dataframe with tracking data
     """
-    match = m.Match(path)
-    match_id = match.matchID
-
-    framedict = dict()
-
-    for index, frame in enumerate(match.frames):
-        # time is stored as datetime objects - makes it easier to do operations/comparisons on it
-        time = frame.time.replace('Z', '').replace('T', ' ')
-        columns = dict()
-        if '.' not in time:
-            time += '.0'
-        columns['time'] = datetime.strptime(time, '%Y-%m-%d %H:%M:%S.%f')
-
-        for i, obj in enumerate(frame.trackingObjs):
-            if obj.type == '7':
-                for key, value in obj.__dict__.items():
-                    columns["ball_" + key] = int(value)
-            else:
-                # Each player with id Q, who played during the match gets their own columns:
-                # "playerQ_type", "playerQ_id"*, "playerQ_x", "playerQ_y" with the respective data.
-                # In case the player got subbed on/off at some point, the entries corresponding to
-                # the time the player was off the pitch have value <null>
-                for key, value in obj.__dict__.items():
-                    #  *since we encode players' IDs in the columns' names, you might  want to avoid
-                    #   some data redundancy and skip the ID columns, depending on the application
-                    # if key == 'id':
-                    #     continue
-
-                    columns[str(obj.id) + "_" + key] = int(value)
-
-        framedict[index] = columns
-
-    # convert into pandas dataframe & export as parquet file
-    df = pd.DataFrame.from_dict(framedict, orient='index')
-    df.attrs['match_id'] = match_id
-    df.attrs['home_team'] = match.phases[0].leftTeamID
-    df.attrs['away_team'] = match.phases[1].leftTeamID
-    df.attrs['player_map'] = get_playermap(df.attrs['home_team'], df.attrs['away_team'])
+    df = convert_tracking(path, use_cache=use_cache)
     if save:
         with pd.HDFStore(save_path) as store:
             store.put('df', df)
             store.get_storer('df').attrs.my_attribute = df.attrs
-    return
+    return df
 
 #%%
 